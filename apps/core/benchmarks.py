@@ -0,0 +1,184 @@
+"""
+Shared helpers for the performance management commands (bench_*, check_*).
+
+Fixtures are created with bulk_create so that user signals (automatic
+profile creation, verification notifications) do not run, and every
+benchmark runs inside ``rollback()`` so nothing is left in the database.
+"""
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.gis.geos import Point
+from django.db import transaction
+
+# Bounding box around Yaoundé used for synthetic positions
+YAOUNDE_BBOX = (3.80, 11.45, 3.92, 11.58)  # (min_lat, min_lon, max_lat, max_lon)
+
+
+class _Rollback(Exception):
+    pass
+
+
+@contextmanager
+def rollback(using=None):
+    """Run the block in a transaction that is always rolled back"""
+    try:
+        with transaction.atomic(using=using):
+            yield
+            raise _Rollback()
+    except _Rollback:
+        pass
+
+
+def random_position(rng=random, bbox=YAOUNDE_BBOX):
+    min_lat, min_lon, max_lat, max_lon = bbox
+    return (
+        round(rng.uniform(min_lat, max_lat), 6),
+        round(rng.uniform(min_lon, max_lon), 6),
+    )
+
+
+def time_calls(fn, repeat):
+    """Call fn() `repeat` times and return timing stats in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'calls': repeat,
+        'mean_ms': statistics.fmean(samples),
+        'p50_ms': samples[len(samples) // 2],
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'total_s': sum(samples) / 1000,
+    }
+
+
+def format_timing(label, stats):
+    return (
+        f"{label:<28} mean={stats['mean_ms']:.3f}ms p50={stats['p50_ms']:.3f}ms "
+        f"p95={stats['p95_ms']:.3f}ms ({stats['calls']} appels)"
+    )
+
+
+def make_users(prefix, count, user_type, **extra):
+    from apps.users.models import User
+
+    users = [
+        User(
+            email=f'{prefix}{i}@bench.quickdeliver.cm',
+            first_name=prefix.capitalize(),
+            last_name=str(i),
+            user_type=user_type,
+            is_approved=True,
+            password='!',
+            **extra
+        )
+        for i in range(count)
+    ]
+    User.objects.bulk_create(users, batch_size=500)
+    return list(User.objects.filter(email__startswith=prefix, email__endswith='@bench.quickdeliver.cm').order_by('id'))
+
+
+def make_restaurants(count, rng=random, bbox=YAOUNDE_BBOX):
+    from apps.restaurants.models import Restaurant
+
+    users = make_users('bench-resto-', count, 'RESTAURANT')
+    restaurants = []
+    for user in users:
+        lat, lon = random_position(rng, bbox)
+        restaurants.append(Restaurant(
+            user=user,
+            commercial_name=f'Restaurant {user.last_name}',
+            legal_name=f'Restaurant {user.last_name} SARL',
+            full_address='Yaoundé',
+            latitude=lat,
+            longitude=lon,
+            position=Point(lon, lat, srid=4326),
+        ))
+    Restaurant.objects.bulk_create(restaurants, batch_size=500)
+    return list(Restaurant.objects.filter(user__in=users).order_by('id'))
+
+
+def make_livreurs(count, rng=random, bbox=YAOUNDE_BBOX, status='EN_LIGNE'):
+    from apps.livreurs.models import Livreur
+
+    users = make_users('bench-livreur-', count, 'LIVREUR')
+    livreurs = []
+    for user in users:
+        lat, lon = random_position(rng, bbox)
+        livreurs.append(Livreur(
+            user=user,
+            vehicle_type='MOTO',
+            vehicle_brand='Bench',
+            vehicle_model='Bench',
+            vehicle_year=2020,
+            vehicle_plate=f'BENCH-{user.id}',
+            vehicle_color='Noir',
+            status=status,
+            current_latitude=lat,
+            current_longitude=lon,
+            current_position=Point(lon, lat, srid=4326),
+        ))
+    Livreur.objects.bulk_create(livreurs, batch_size=500)
+    return list(Livreur.objects.filter(user__in=users).order_by('id'))
+
+
+def make_commandes(count, client, restaurants, status='PRETE', rng=random, **fields):
+    from apps.orders.models import Commande
+    import uuid
+
+    commandes = []
+    for _ in range(count):
+        restaurant = rng.choice(restaurants)
+        commandes.append(Commande(
+            numero=f'CMD-{uuid.uuid4().hex[:8].upper()}',
+            client=client,
+            restaurant=restaurant,
+            delivery_address_text='Yaoundé',
+            status=status,
+            products_amount=Decimal('2500'),
+            delivery_fee=Decimal('500'),
+            livreur_earnings=Decimal('375'),
+            total_amount=Decimal('3000'),
+            **fields
+        ))
+    return Commande.objects.bulk_create(commandes, batch_size=500)
+
+
+def make_produits(restaurants, per_restaurant=3):
+    from apps.products.models import Produit
+
+    produits = [
+        Produit(restaurant=restaurant, name=f'Plat {restaurant.id}-{i}', price=Decimal('1250'))
+        for restaurant in restaurants
+        for i in range(per_restaurant)
+    ]
+    return Produit.objects.bulk_create(produits, batch_size=500)
+
+
+def make_lignes(commandes, produits, per_commande=2, rng=random):
+    """Add items to orders, each with a produit of the order's restaurant when possible"""
+    from apps.orders.models import LigneCommande
+
+    by_restaurant = {}
+    for produit in produits:
+        by_restaurant.setdefault(produit.restaurant_id, []).append(produit)
+
+    lignes = []
+    for commande in commandes:
+        choices = by_restaurant.get(commande.restaurant_id) or produits
+        for _ in range(per_commande):
+            produit = rng.choice(choices)
+            lignes.append(LigneCommande(
+                commande=commande,
+                produit=produit,
+                quantity=2,
+                unit_price=produit.price,
+                line_total=produit.price * 2,
+            ))
+    return LigneCommande.objects.bulk_create(lignes, batch_size=500)
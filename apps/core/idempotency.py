@@ -0,0 +1,340 @@
+"""
+Idempotency keys for POST endpoints that must not run twice.
+
+A client that retries a request sends the same ``Idempotency-Key``
+header. The first request with a key claims it in the store (fingerprint
+of the body, random token, in-flight lease of IDEMPOTENCY_LOCK_SECONDS),
+runs the view and stores the status and body for IDEMPOTENCY_TTL_SECONDS.
+A retry gets that stored response back, with ``Idempotent-Replayed:
+true``, without running the view again; a retry arriving while the first
+is still in flight polls the store for up to IDEMPOTENCY_WAIT_SECONDS and
+then answers 409. Reusing a key with a different body is a 422.
+
+Keys are scoped by endpoint and user. 4xx answers are stored whether
+the view returns them or raises a DRF APIException. 5xx responses and
+other exceptions release the claim so the client can try again, unless
+the view called mark_side_effect first (order committed, USSD prompt
+sent): past that point a failure is stored as the answer, since running
+the view again would repeat the effect. Requests without the header are
+not affected.
+
+Storage follows IDEMPOTENCY_STORE: the IdempotencyKey table ('db', the
+default), Redis ('redis', SET NX with expiry) or a per-process dict
+('local', single worker only).
+"""
+import functools
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+SIDE_EFFECT_ERROR = 'Erreur interne après le début du traitement; contactez le support avant de réessayer.'
+
+# status_code is None while the first request is in flight
+Entry = namedtuple('Entry', 'fingerprint token status_code data')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class LocalIdempotencyStore:
+    """Per-process store; fine for a single worker and for tests"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        item = self._entries.get(key)
+        if item is not None and item[1] <= time.monotonic():
+            del self._entries[key]
+            return None
+        return item
+
+    def claim(self, key, fingerprint, token, lease_seconds):
+        """Take the key (return None) unless it is held or answered (return its Entry)"""
+        with self._lock:
+            item = self._live(key)
+            if item is not None:
+                return item[0]
+            self._entries[key] = (Entry(fingerprint, token, None, None), time.monotonic() + lease_seconds)
+            return None
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key)
+            return item[0] if item else None
+
+    def complete(self, key, token, status_code, data, ttl_seconds):
+        with self._lock:
+            item = self._live(key)
+            if item is not None and item[0].token == token:
+                entry = item[0]._replace(status_code=status_code, data=data)
+                self._entries[key] = (entry, time.monotonic() + ttl_seconds)
+
+    def release(self, key, token):
+        with self._lock:
+            item = self._live(key)
+            if item is not None and item[0].token == token:
+                del self._entries[key]
+
+    def purge(self):
+        with self._lock:
+            expired = [key for key, (_, expires_at) in self._entries.items() if expires_at <= time.monotonic()]
+            for key in expired:
+                del self._entries[key]
+        return len(expired)
+
+
+class DatabaseIdempotencyStore:
+    """IdempotencyKey rows, shared by all workers; the primary key arbitrates concurrent claims"""
+
+    def claim(self, key, fingerprint, token, lease_seconds):
+        from apps.core.models import IdempotencyKey
+
+        now = timezone.now()
+        values = {
+            'fingerprint': fingerprint, 'token': token, 'status_code': None, 'response': None,
+            'expires_at': now + timedelta(seconds=lease_seconds),
+        }
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(key=key, **values)
+            return None
+        except IntegrityError:
+            pass
+        # An answer past its TTL or a lease whose request died can be taken over
+        if IdempotencyKey.objects.filter(key=key, expires_at__lte=now).update(**values):
+            return None
+        return self.get(key) or self.claim(key, fingerprint, token, lease_seconds)
+
+    def get(self, key):
+        from apps.core.models import IdempotencyKey
+
+        row = IdempotencyKey.objects.filter(key=key, expires_at__gt=timezone.now()).values_list(
+            'fingerprint', 'token', 'status_code', 'response'
+        ).first()
+        return Entry(*row) if row else None
+
+    def complete(self, key, token, status_code, data, ttl_seconds):
+        from apps.core.models import IdempotencyKey
+
+        IdempotencyKey.objects.filter(key=key, token=token).update(
+            status_code=status_code, response=data,
+            expires_at=timezone.now() + timedelta(seconds=ttl_seconds),
+        )
+
+    def release(self, key, token):
+        from apps.core.models import IdempotencyKey
+
+        IdempotencyKey.objects.filter(key=key, token=token).delete()
+
+    def purge(self):
+        from apps.core.models import IdempotencyKey
+
+        deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+class RedisIdempotencyStore:
+    """One JSON string per key, created with SET NX; Redis expires answers and dead leases"""
+
+    def __init__(self, url, prefix):
+        import redis
+
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url)
+
+    def _key(self, key):
+        return f'{self.prefix}:{key}'
+
+    @staticmethod
+    def _dump(entry):
+        return json.dumps(entry._asdict(), cls=DjangoJSONEncoder)
+
+    def claim(self, key, fingerprint, token, lease_seconds):
+        value = self._dump(Entry(fingerprint, token, None, None))
+        if self._redis.set(self._key(key), value, nx=True, ex=lease_seconds):
+            return None
+        return self.get(key) or self.claim(key, fingerprint, token, lease_seconds)
+
+    def get(self, key):
+        raw = self._redis.get(self._key(key))
+        return Entry(**json.loads(raw)) if raw else None
+
+    def _replace(self, key, token, value, ttl_seconds):
+        import redis
+
+        with self._redis.pipeline() as pipeline:
+            try:
+                pipeline.watch(self._key(key))
+                raw = pipeline.get(self._key(key))
+                if raw is None or json.loads(raw)['token'] != token:
+                    return
+                pipeline.multi()
+                if value is None:
+                    pipeline.delete(self._key(key))
+                else:
+                    pipeline.set(self._key(key), value, ex=ttl_seconds)
+                pipeline.execute()
+            except redis.WatchError:
+                # Taken over after our lease expired: the newer request owns the key
+                pass
+
+    def complete(self, key, token, status_code, data, ttl_seconds):
+        entry = self.get(key)
+        if entry is not None:
+            self._replace(key, token, self._dump(entry._replace(status_code=status_code, data=data)), ttl_seconds)
+
+    def release(self, key, token):
+        self._replace(key, token, None, None)
+
+    def purge(self):
+        return 0
+
+
+def _build_store():
+    backend = _setting('IDEMPOTENCY_STORE', 'db')
+    if backend == 'redis':
+        return RedisIdempotencyStore(
+            _setting('IDEMPOTENCY_REDIS_URL', settings.CELERY_BROKER_URL),
+            _setting('IDEMPOTENCY_REDIS_KEY', 'quickdeliver:idempotency'),
+        )
+    if backend == 'local':
+        return LocalIdempotencyStore()
+    return DatabaseIdempotencyStore()
+
+
+idempotency_store = _build_store()
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def _error(message, code, **headers):
+    response = Response({'error': message}, status=code)
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def _replay(entry):
+    response = Response(entry.data, status=entry.status_code)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def mark_side_effect(request):
+    """Call just before an effect outside the transaction (order saved, USSD prompt sent)
+
+    From then on the key is never released: a failure later in the view is
+    stored and replayed like any answer, so a retry cannot repeat the effect.
+    """
+    request.idempotency_side_effect = True
+
+
+def _side_effect(request):
+    return getattr(request, 'idempotency_side_effect', False)
+
+
+def _complete(store, key, token, status_code, data):
+    data = json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+    store.complete(key, token, status_code, data, _setting('IDEMPOTENCY_TTL_SECONDS', 86400))
+
+
+def idempotent(scope):
+    """Run the view at most once per Idempotency-Key; decorate a view function or a viewset method
+
+    Goes under @api_view/@permission_classes, so the user is authenticated
+    by the time the key is claimed.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            request = args[0] if isinstance(args[0], Request) else args[1]
+            client_key = request.headers.get(HEADER)
+            if not client_key:
+                return view(*args, **kwargs)
+            if len(client_key) > MAX_KEY_LENGTH:
+                return _error(f'{HEADER} trop long ({MAX_KEY_LENGTH} caractères au plus).', status.HTTP_400_BAD_REQUEST)
+
+            key = hashlib.sha256(f'{scope}\n{request.user.pk}\n{client_key}'.encode()).hexdigest()
+            fingerprint = request_fingerprint(request)
+            token = uuid.uuid4().hex
+            store = idempotency_store
+
+            entry = store.claim(key, fingerprint, token, _setting('IDEMPOTENCY_LOCK_SECONDS', 300))
+            if entry is not None:
+                if entry.fingerprint != fingerprint:
+                    return _error(
+                        f'{HEADER} déjà utilisée pour une autre requête.', status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                deadline = time.monotonic() + _setting('IDEMPOTENCY_WAIT_SECONDS', 15)
+                delay = 0.05
+                # The first request is in flight: wait for its answer rather than running the view again
+                while entry is not None and entry.status_code is None and time.monotonic() < deadline:
+                    time.sleep(delay)
+                    delay = min(delay * 2, 0.5)
+                    entry = store.get(key)
+                if entry is None:
+                    # The first request failed and released the key: this retry runs the view
+                    return wrapper(*args, **kwargs)
+                if entry.status_code is None:
+                    return _error(
+                        'La même requête est encore en cours de traitement.', status.HTTP_409_CONFLICT,
+                        **{'Retry-After': '1'}
+                    )
+                logger.debug(f"[IDEMPOTENCY] {scope}: replayed {entry.status_code}")
+                return _replay(entry)
+
+            try:
+                response = view(*args, **kwargs)
+            except APIException as exc:
+                # A 4xx raised by the view (validation, permission) is an answer like a returned one
+                if exc.status_code < 500 or _side_effect(request):
+                    handled = api_settings.EXCEPTION_HANDLER(exc, {'request': request, 'view': None})
+                    _complete(store, key, token, handled.status_code, handled.data)
+                else:
+                    store.release(key, token)
+                raise
+            except Exception:
+                if _side_effect(request):
+                    _complete(store, key, token, status.HTTP_500_INTERNAL_SERVER_ERROR, {'error': SIDE_EFFECT_ERROR})
+                else:
+                    store.release(key, token)
+                raise
+            data = getattr(response, 'data', None)
+            if (response.status_code >= 500 or not hasattr(response, 'data')) and not _side_effect(request):
+                store.release(key, token)
+            else:
+                _complete(store, key, token, response.status_code, data)
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_expired():
+    """Delete stored answers and leases past their expiry (no-op for Redis)"""
+    return idempotency_store.purge()
@@ -0,0 +1,85 @@
+"""
+Benchmark of the commandes_disponibles lookup: spatialite Distance queries
+(previous implementation) against the in-memory pickup index.
+Usage: python manage.py bench_commandes_disponibles --orders 2000 --restaurants 300
+"""
+import random
+
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
+from django.core.management.base import BaseCommand
+
+from apps.core.benchmarks import (
+    format_timing, make_commandes, make_restaurants, make_users,
+    random_position, rollback, time_calls,
+)
+
+
+class Command(BaseCommand):
+    help = 'Compare the spatialite query path and the pickup index for commandes_disponibles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--restaurants', type=int, default=300)
+        parser.add_argument('--lookups', type=int, default=200)
+        parser.add_argument('--radius', type=float, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        from apps.livreurs.spatial_index import PickupSpatialIndex
+        from apps.orders.models import Commande
+
+        rng = random.Random(options['seed'])
+        radius = options['radius']
+
+        with rollback():
+            client = make_users('bench-client-', 1, 'CLIENT')[0]
+            restaurants = make_restaurants(options['restaurants'], rng=rng)
+            make_commandes(options['orders'], client, restaurants, rng=rng)
+            positions = [random_position(rng) for _ in range(options['lookups'])]
+            self.stdout.write(
+                f"{options['orders']} commandes PRETE, {len(restaurants)} restaurants, "
+                f"{len(positions)} positions livreur, rayon {radius} km"
+            )
+
+            def query_path(lat, lon):
+                location = Point(lon, lat, srid=4326)
+                base_queryset = Commande.objects.filter(status='PRETE', livreur__isnull=True)
+                restaurant_orders = list(
+                    base_queryset.filter(restaurant__position__isnull=False)
+                    .annotate(distance=Distance('restaurant__position', location))
+                    .filter(distance__lte=D(km=radius))
+                )
+                supermarket_orders = list(
+                    base_queryset.filter(supermarche__position__isnull=False)
+                    .annotate(distance=Distance('supermarche__position', location))
+                    .filter(distance__lte=D(km=radius))
+                )
+                deduped = {cmd.id: cmd for cmd in restaurant_orders + supermarket_orders}
+                return sorted(deduped.values(), key=lambda cmd: cmd.distance.m)[:20]
+
+            index = PickupSpatialIndex(refresh_seconds=3600)
+            index.rebuild()
+
+            query_iter = iter(positions * 2)
+            index_iter = iter(positions * 2)
+            query_stats = time_calls(lambda: query_path(*next(query_iter)), len(positions))
+            index_stats = time_calls(lambda: index.nearby(*next(index_iter), radius), len(positions))
+
+            mismatches = 0
+            for lat, lon in positions[:20]:
+                expected = [cmd.id for cmd in query_path(lat, lon)]
+                got = [commande_id for commande_id, _ in index.nearby(lat, lon, radius)]
+                if set(expected) != set(got):
+                    mismatches += 1
+
+        self.stdout.write(format_timing('Requêtes spatialite', query_stats))
+        self.stdout.write(format_timing('Index en mémoire', index_stats))
+        self.stdout.write(f"Accélération: x{query_stats['mean_ms'] / max(index_stats['mean_ms'], 1e-9):.1f}")
+        if mismatches:
+            self.stdout.write(self.style.WARNING(
+                f'{mismatches}/20 résultats diffèrent (ordres à égalité de distance ou précision géodésique)'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Résultats identiques sur 20 positions'))
@@ -0,0 +1,83 @@
+"""
+Load test of the courier push feed against polling of commandes_disponibles.
+
+For each connection count the command simulates one minute of traffic and
+reports the CPU time spent by the server:
+- polling: every courier calls the pickup index lookup every --poll-interval
+  seconds (lower bound: the real endpoint also pays auth, one query and
+  serialization per call);
+- push: --events-per-minute order events are fanned out to the open streams
+  and formatted as SSE frames, plus heartbeats.
+Runs in memory only, no database access.
+Usage: python manage.py bench_courier_feed --connections 100,500,1000
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.core.benchmarks import random_position
+
+
+class Command(BaseCommand):
+    help = 'Compare server CPU of the SSE courier feed and of polling'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=str, default='100,500,1000,2000')
+        parser.add_argument('--orders', type=int, default=500, help='PRETE orders in the index')
+        parser.add_argument('--events-per-minute', type=int, default=60)
+        parser.add_argument('--poll-interval', type=float, default=5)
+        parser.add_argument('--heartbeat', type=float, default=15)
+        parser.add_argument('--radius', type=float, default=10)
+        parser.add_argument('--seed', type=int, default=3)
+
+    def handle(self, *args, **options):
+        from apps.livreurs.feed import EVENT_NEW, LocalBroker, format_sse
+        from apps.livreurs.spatial_index import PickupSpatialIndex
+
+        rng = random.Random(options['seed'])
+        radius = options['radius']
+
+        index = PickupSpatialIndex(refresh_seconds=3600)
+        index.load((i, *random_position(rng)) for i in range(options['orders']))
+
+        self.stdout.write(
+            f"{'connexions':>10} {'polling CPU/min':>16} {'push CPU/min':>14} {'ratio':>8} {'événements livrés':>18}"
+        )
+        for connections in [int(n) for n in options['connections'].split(',')]:
+            couriers = [random_position(rng) for _ in range(connections)]
+
+            polls = int(60 / options['poll_interval'])
+            start = time.process_time()
+            for _ in range(polls):
+                for lat, lon in couriers:
+                    index.nearby(lat, lon, radius)
+            polling_cpu = time.process_time() - start
+
+            broker = LocalBroker()
+            subscriptions = [broker.subscribe(lat, lon, radius) for lat, lon in couriers]
+            events = [
+                {'type': EVENT_NEW, 'commande_id': i, 'numero': None,
+                 'latitude': lat, 'longitude': lon}
+                for i, (lat, lon) in enumerate(random_position(rng) for _ in range(options['events_per_minute']))
+            ]
+            heartbeats = int(60 / options['heartbeat'])
+            delivered = 0
+            start = time.process_time()
+            for event in events:
+                broker.publish(event)
+            for subscription in subscriptions:
+                while True:
+                    event = subscription.get(timeout=0)
+                    if event is None:
+                        break
+                    format_sse(event)
+                    delivered += 1
+                for _ in range(heartbeats):
+                    ': ping\n\n'.encode()
+            push_cpu = time.process_time() - start
+
+            self.stdout.write(
+                f'{connections:>10} {polling_cpu * 1000:>14.0f}ms {push_cpu * 1000:>12.0f}ms '
+                f'{polling_cpu / max(push_cpu, 1e-9):>7.1f}x {delivered:>18}'
+            )
@@ -0,0 +1,57 @@
+"""
+Batch distance matrix (apps.geolocation.distances) vs geopy geodesic.
+
+Draws --size origins and --size destinations around Yaoundé, times the
+NumPy haversine and Vincenty matrices over every pair, and times geodesic
+on a random sample of --sample pairs, extrapolated to the full matrix
+(1k x 1k pairs with geodesic take minutes). Also prints the largest
+difference of each method to geodesic on the sample. No database access.
+Usage: python manage.py bench_distance_matrix --size 1000 --sample 20000
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from geopy.distance import geodesic
+
+from apps.core.benchmarks import format_timing, random_position, time_calls
+
+
+class Command(BaseCommand):
+    help = 'Compare NumPy distance matrices with per-pair geodesic calls'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=1000)
+        parser.add_argument('--sample', type=int, default=20000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=12)
+
+    def handle(self, *args, **options):
+        from apps.geolocation.distances import distance_matrix
+
+        rng = random.Random(options['seed'])
+        size = options['size']
+        origins = [random_position(rng) for _ in range(size)]
+        destinations = [random_position(rng) for _ in range(size)]
+        pairs = size * size
+        self.stdout.write(f'{size} x {size} = {pairs} paires')
+
+        matrices = {}
+        for method in ('haversine', 'vincenty'):
+            def batch(method=method):
+                matrices[method] = distance_matrix(origins, destinations, method)
+            self.stdout.write(format_timing(f'numpy {method}', time_calls(batch, options['repeat'])))
+
+        sample = [(rng.randrange(size), rng.randrange(size)) for _ in range(min(options['sample'], pairs))]
+        start = time.perf_counter()
+        reference = [geodesic(origins[i], destinations[j]).kilometers for i, j in sample]
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"{'geopy geodesic':<28} {elapsed / len(sample) * 1e6:.1f}µs/paire, "
+            f"estimé {elapsed / len(sample) * pairs:.1f}s pour la matrice complète"
+        )
+
+        for method, matrix in matrices.items():
+            error = max(abs(matrix[i, j] - km) for (i, j), km in zip(sample, reference))
+            self.stdout.write(f'écart max {method} / geodesic: {error * 1000:.2f} m')
+        self.stdout.write(self.style.SUCCESS('Terminé'))
@@ -0,0 +1,68 @@
+"""
+Restaurant menu: full serialization vs versioned cache vs 304.
+
+Creates one restaurant with --items products (rolled back at the end) and
+times GET /api/restaurants/<id>/menu/ when every request serializes the
+menu (cache cleared before each call), when the menu of the current
+catalog version is cached, and when the client revalidates with
+If-None-Match. Prints the SQL queries and response size of each, then
+checks that a product change invalidates the client's ETag.
+Usage: python manage.py bench_menu --items 300
+"""
+import random
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.core.benchmarks import format_timing, make_produits, make_restaurants, rollback, time_calls
+
+
+class Command(BaseCommand):
+    help = 'Compare menu serialization with the versioned cache and conditional GET'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=300)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        client = APIClient()
+
+        with rollback():
+            restaurant = make_restaurants(1, rng=rng)[0]
+            produits = make_produits([restaurant], per_restaurant=options['items'])
+            url = f'/api/restaurants/{restaurant.id}/menu/'
+            etag = client.get(url)['ETag']
+            self.stdout.write(f"{options['items']} produits, ETag {etag}")
+
+            def cold():
+                cache.clear()
+                return client.get(url)
+
+            cases = [
+                ('sérialisation', cold),
+                ('cache par version', lambda: client.get(url)),
+                ('If-None-Match (304)', lambda: client.get(url, HTTP_IF_NONE_MATCH=etag)),
+            ]
+            for label, call in cases:
+                with CaptureQueriesContext(connection) as queries:
+                    response = call()
+                stats = time_calls(call, options['repeat'])
+                self.stdout.write(
+                    f'{format_timing(label, stats)} HTTP {response.status_code}, '
+                    f'{len(response.content)} octets, {len(queries)} requête(s)'
+                )
+
+            produit = produits[0]
+            produit.price += 100
+            produit.save()
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+            if response.status_code != 200 or response['ETag'] == etag:
+                raise CommandError("L'ETag n'a pas changé après la modification d'un produit")
+            self.stdout.write(f"Après modification: HTTP 200, nouvel ETag {response['ETag']}")
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS('Terminé'))
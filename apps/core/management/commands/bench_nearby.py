@@ -0,0 +1,73 @@
+"""
+Restaurant nearby: former four-query path vs the single bounded query.
+
+Creates --restaurants restaurants around Yaoundé (rolled back at the
+end), then for --repeat random positions calls the former nearby code
+(two counts for the logs, the annotated radius query, its count, then
+serialization) and GET /api/restaurants/nearby/ in GeoJSON and compact
+form. Prints the SQL query count and timing of each.
+Usage: python manage.py bench_nearby --restaurants 5000 --radius 5
+"""
+import random
+
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import Point
+from django.contrib.gis.measure import D
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.core.benchmarks import format_timing, make_restaurants, random_position, rollback, time_calls
+
+
+class Command(BaseCommand):
+    help = 'Compare the former nearby restaurant path with the single-query one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=5000)
+        parser.add_argument('--radius', type=float, default=5.0)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=18)
+
+    def handle(self, *args, **options):
+        from apps.restaurants.models import Restaurant
+        from apps.restaurants.serializers import RestaurantListSerializer
+
+        rng = random.Random(options['seed'])
+        radius_km = options['radius']
+        client = APIClient()
+
+        with rollback():
+            make_restaurants(options['restaurants'], rng=rng)
+            positions = [random_position(rng) for _ in range(options['repeat'])]
+            self.stdout.write(f"{options['restaurants']} restaurants, rayon {radius_km} km")
+
+            def legacy(lat, lon):
+                queryset = Restaurant.objects.filter(is_active=True, user__is_approved=True)
+                queryset.count()
+                queryset.exclude(position__isnull=True).count()
+                restaurants = queryset.annotate(
+                    distance=Distance('position', Point(lon, lat, srid=4326))
+                ).filter(distance__lte=D(km=radius_km)).order_by('distance')
+                if restaurants.count():
+                    RestaurantListSerializer(restaurants, many=True).data
+
+            def endpoint(lat, lon, compact=''):
+                response = client.get(
+                    f'/api/restaurants/nearby/?lat={lat}&lon={lon}&radius={radius_km}{compact}'
+                )
+                assert response.status_code == 200, response.content[:200]
+
+            cases = [
+                ('ancien nearby', legacy),
+                ('nearby', endpoint),
+                ('nearby compact', lambda lat, lon: endpoint(lat, lon, '&compact=1')),
+            ]
+            for label, call in cases:
+                with CaptureQueriesContext(connection) as queries:
+                    call(*positions[0])
+                iterator = iter(positions)
+                stats = time_calls(lambda: call(*next(iterator)), len(positions))
+                self.stdout.write(f'{format_timing(label, stats)} {len(queries)} requête(s)')
+        self.stdout.write(self.style.SUCCESS('Terminé'))
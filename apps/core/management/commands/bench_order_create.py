@@ -0,0 +1,75 @@
+"""
+Order creation latency by basket size: per-line pipeline vs bulk ingest.
+
+For baskets of 1, 10 and 100 lines (--sizes), times POST
+/api/orders/commandes/ (one in_bulk for the produits, one bulk_create for
+the lines, one transaction) and the former per-line path replayed with
+the ORM (one produit query and one INSERT per line). Prints the SQL query
+count and the timing of each. Everything is rolled back at the end.
+Usage: python manage.py bench_order_create --sizes 1 10 100
+"""
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.core.benchmarks import format_timing, make_produits, make_restaurants, make_users, rollback, time_calls
+
+
+class Command(BaseCommand):
+    help = 'Compare per-line and bulk order creation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100])
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=21)
+
+    def handle(self, *args, **options):
+        from apps.orders.models import Commande, LigneCommande
+        from apps.products.models import Produit
+
+        rng = random.Random(options['seed'])
+        with rollback():
+            user = make_users('bench-client-', 1, 'CLIENT')[0]
+            restaurant = make_restaurants(1, rng=rng)[0]
+            produits = make_produits([restaurant], per_restaurant=max(options['sizes']))
+            client = APIClient()
+            client.force_authenticate(user)
+
+            for size in options['sizes']:
+                lines = [
+                    {'produit': produit.id, 'quantity': rng.randint(1, 3)}
+                    for produit in rng.sample(produits, size)
+                ]
+                payload = {
+                    'restaurant': restaurant.id,
+                    'delivery_address_text': 'Bastos, Yaoundé',
+                    'payment_mode': 'ESPECES',
+                    'items': lines,
+                }
+
+                def bulk():
+                    response = client.post('/api/orders/commandes/', payload, format='json')
+                    if response.status_code != 201:
+                        raise CommandError(f'{response.status_code}: {response.content[:200]}')
+
+                def per_line():
+                    commande = Commande.objects.create(
+                        client=user, restaurant=restaurant, delivery_address_text='Bastos, Yaoundé'
+                    )
+                    for line in lines:
+                        produit = Produit.objects.get(pk=line['produit'])
+                        LigneCommande.objects.create(
+                            commande=commande, produit=produit, quantity=line['quantity'],
+                            unit_price=produit.price, line_total=produit.price * line['quantity'],
+                        )
+
+                self.stdout.write(f'{size} ligne(s)')
+                for label, call in (('par ligne (ORM seul)', per_line), ('POST bulk', bulk)):
+                    with CaptureQueriesContext(connection) as queries:
+                        call()
+                    stats = time_calls(call, options['repeat'])
+                    self.stdout.write(f'  {format_timing(label, stats)} {len(queries)} requête(s)')
+        self.stdout.write(self.style.SUCCESS('Terminé'))
@@ -0,0 +1,72 @@
+"""
+Latency of deep pages of a restaurant order history: OFFSET vs keyset.
+
+Creates --orders orders for one restaurant (rolled back at the end) and,
+for several page depths, times fetching one page with OFFSET/LIMIT and
+with CommandeKeysetPagination's (date_created, id) cursor. Only the page
+query is timed; serialization costs the same for both.
+Usage: python manage.py bench_order_history --orders 20000 --page-size 20
+"""
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils import timezone
+from rest_framework.request import Request
+
+from apps.core.benchmarks import format_timing, make_commandes, make_restaurants, make_users, rollback, time_calls
+
+
+class Command(BaseCommand):
+    help = 'Compare OFFSET and keyset pagination latency for deep pages of the order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=20000)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=8)
+
+    def handle(self, *args, **options):
+        from apps.orders.models import Commande
+        from apps.orders.pagination import CommandeKeysetPagination
+
+        rng = random.Random(options['seed'])
+        total = options['orders']
+        page_size = options['page_size']
+        factory = RequestFactory()
+
+        with rollback():
+            client = make_users('bench-client-', 1, 'CLIENT')[0]
+            restaurant = make_restaurants(1, rng=rng)[0]
+            commandes = make_commandes(total, client, [restaurant], status='LIVREE', rng=rng)
+
+            # Spread creation dates (auto_now_add stamps them all alike)
+            now = timezone.now()
+            for offset, commande in enumerate(commandes):
+                commande.date_created = now - timedelta(minutes=offset)
+            Commande.objects.bulk_update(commandes, ['date_created'], batch_size=500)
+
+            history = Commande.objects.filter(restaurant=restaurant)
+            ordered_ids = list(history.order_by('-date_created', '-id').values_list('id', flat=True))
+            self.stdout.write(f'{total} commandes, pages de {page_size}')
+
+            for depth in sorted({0, total // 10, total // 2, total - page_size}):
+                def offset_page():
+                    return list(history.order_by('-date_created', '-id')[depth:depth + page_size])
+
+                paginator = CommandeKeysetPagination()
+                query = {'page_size': page_size}
+                if depth:
+                    query['cursor'] = paginator.encode_cursor(Commande.objects.get(id=ordered_ids[depth - 1]))
+                request = Request(factory.get('/api/restaurants/orders/', query))
+
+                def keyset_page():
+                    return paginator.paginate_queryset(history, request)
+
+                assert [cmd.id for cmd in offset_page()] == [cmd.id for cmd in keyset_page()]
+                self.stdout.write(f'profondeur {depth}:')
+                self.stdout.write('  ' + format_timing('OFFSET', time_calls(offset_page, options['repeat'])))
+                self.stdout.write('  ' + format_timing('keyset', time_calls(keyset_page, options['repeat'])))
+
+        self.stdout.write(self.style.SUCCESS('Terminé (données de test annulées)'))
@@ -0,0 +1,105 @@
+"""
+Order event outbox: relay throughput and delivery guarantees.
+
+Creates --orders orders and writes --per-order lifecycle events for each
+through record_events (rolled back at the end). For every batch size of
+--batch-sizes, marks all events pending again and times relay() draining
+them to the real subscribers (client and merchant notifications),
+printing the sustained events per second. A checking receiver verifies
+that the events of one order always arrive in write order.
+
+A last run makes a receiver fail once for one order in ten, and checks
+that every event is still relayed, in order, by the following relays.
+Usage: python manage.py bench_outbox --orders 2000 --per-order 4 --batch-sizes 100 500 2000
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.benchmarks import make_commandes, make_restaurants, make_users, rollback
+
+LIFECYCLE = ['creee', 'accepter', 'commencer_preparation', 'marquer_prete', 'assigner', 'livrer']
+
+
+class Command(BaseCommand):
+    help = 'Measure outbox relay throughput and check per-order ordering'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--per-order', type=int, default=4)
+        parser.add_argument('--batch-sizes', type=int, nargs='+', default=[100, 500, 2000])
+        parser.add_argument('--seed', type=int, default=24)
+
+    def handle(self, *args, **options):
+        from apps.notifications.models import Notification
+        from apps.orders.models import OrderEvent
+        from apps.orders.outbox import order_events, record_events, relay
+
+        rng = random.Random(options['seed'])
+        per_order = min(options['per_order'], len(LIFECYCLE))
+        last_seen = {}
+        out_of_order = []
+        flaky = set()
+
+        def check_order(sender, events, **kwargs):
+            for event in events:
+                if event.commande_id in flaky:
+                    flaky.discard(event.commande_id)
+                    raise RuntimeError(f'panne simulée pour la commande {event.commande_id}')
+            for event in events:
+                if event.id < last_seen.get(event.commande_id, 0):
+                    out_of_order.append(event.id)
+                last_seen[event.commande_id] = event.id
+
+        order_events.connect(check_order, sender=OrderEvent)
+        try:
+            with rollback():
+                client = make_users('bench-client-', 1, 'CLIENT')[0]
+                restaurants = make_restaurants(10, rng=rng)
+                commandes = make_commandes(options['orders'], client, restaurants, status='EN_ATTENTE', rng=rng)
+                events = OrderEvent.objects.filter(commande_id__in=[commande.id for commande in commandes])
+
+                start = time.perf_counter()
+                for event in LIFECYCLE[:per_order]:
+                    record_events(commandes, event)
+                elapsed = time.perf_counter() - start
+                total = events.count()
+                self.stdout.write(f'{total} événements écrits en {elapsed:.2f}s ({total / elapsed:.0f} événements/s)')
+
+                for batch_size in options['batch_sizes']:
+                    events.update(date_relayed=None, attempts=0)
+                    Notification.objects.all().delete()
+                    last_seen.clear()
+
+                    start = time.perf_counter()
+                    relayed = relay(batch_size=batch_size, max_seconds=3600)
+                    elapsed = time.perf_counter() - start
+                    self.stdout.write(
+                        f'lots de {batch_size:>5}: {relayed} relayés en {elapsed:.2f}s '
+                        f'({relayed / elapsed:.0f} événements/s), {Notification.objects.count()} notifications'
+                    )
+                    if events.filter(date_relayed__isnull=True).exists():
+                        raise CommandError('Des événements n\'ont pas été relayés')
+
+                events.update(date_relayed=None, attempts=0)
+                Notification.objects.all().delete()
+                last_seen.clear()
+                flaky.update(commande.id for commande in commandes[::10])
+                runs = 0
+                while events.filter(date_relayed__isnull=True).exists() and runs < 50:
+                    relay(batch_size=options['batch_sizes'][0], max_seconds=3600)
+                    runs += 1
+                pending = events.filter(date_relayed__isnull=True).count()
+                duplicates = Notification.objects.count() - len(set(
+                    Notification.objects.values_list('event_id', flat=True)
+                ))
+                self.stdout.write(
+                    f'avec pannes: {runs} relais, {pending} en attente, '
+                    f'{len(out_of_order)} hors ordre, {duplicates} notifications en double'
+                )
+                if pending or out_of_order or duplicates:
+                    raise CommandError('Livraison incomplète, désordonnée ou dupliquée')
+        finally:
+            order_events.disconnect(check_order, sender=OrderEvent)
+        self.stdout.write(self.style.SUCCESS('Terminé'))
@@ -0,0 +1,111 @@
+"""
+Throughput of courier GPS ingestion: one write per ping vs the buffer.
+
+Several threads (one livreur each) send pings for --seconds:
+- direct: each ping writes the Livreur row, as update_position used to;
+- buffered: each ping goes to positions.LocalPositionBuffer and one
+  thread flushes the latest positions in bulk every --flush-interval.
+Reports the sustained pings/s and checks that the database ends up with
+the last position of every livreur.
+
+The fixtures are committed because every thread uses its own database
+connection; they are deleted at the end.
+Usage: python manage.py bench_position_ingest --threads 16 --seconds 5
+"""
+import random
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.utils import timezone
+
+from apps.core.benchmarks import make_livreurs, random_position
+
+
+class Command(BaseCommand):
+    help = 'Compare pings/s of per-ping Livreur writes and of the buffered position pipeline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--flush-interval', type=float, default=1)
+        parser.add_argument('--seed', type=int, default=5)
+
+    def handle(self, *args, **options):
+        from apps.livreurs.models import Livreur
+        from apps.livreurs.positions import LocalPositionBuffer
+        from apps.users.models import User
+
+        rng = random.Random(options['seed'])
+        livreurs = make_livreurs(options['threads'], rng=rng)
+        duration = options['seconds']
+
+        def direct(livreur_id, lat, lon):
+            livreur = Livreur(id=livreur_id, current_latitude=lat, current_longitude=lon)
+            livreur.last_position_update = timezone.now()
+            livreur.save(update_fields=['current_latitude', 'current_longitude', 'current_position', 'last_position_update'])
+
+        buffer = LocalPositionBuffer(options['flush_interval'])
+
+        def buffered(livreur_id, lat, lon):
+            buffer.record(livreur_id, [(lat, lon, timezone.now())])
+
+        try:
+            results = {}
+            for label, ping in (('direct', direct), ('buffered', buffered)):
+                sent, last, errors = self.run(livreurs, ping, duration)
+                if label == 'buffered':
+                    buffer.flush()
+                results[label] = sent
+                self.stdout.write(f'{label:>9}: {sent} pings en {duration:.0f}s -> {sent / duration:.0f} pings/s')
+                for message, count in errors.items():
+                    self.stdout.write(self.style.WARNING(f'{count} x {message}'))
+
+                stored = {
+                    livreur_id: (float(lat), float(lon))
+                    for livreur_id, lat, lon in Livreur.objects.filter(id__in=last).values_list(
+                        'id', 'current_latitude', 'current_longitude'
+                    )
+                }
+                stale = [livreur_id for livreur_id, point in last.items() if stored.get(livreur_id) != point]
+                if stale:
+                    raise CommandError(f'{label}: {len(stale)} livreurs sans leur dernière position en base')
+        finally:
+            User.objects.filter(email__endswith='@bench.quickdeliver.cm').delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Gain: {results['buffered'] / max(results['direct'], 1):.1f}x pings/s"
+        ))
+
+    def run(self, livreurs, ping, duration):
+        """Ping from one thread per livreur until the deadline; return (count, last points, errors)"""
+        counts = Counter()
+        errors = Counter()
+        last = {}
+        barrier = threading.Barrier(len(livreurs))
+
+        def worker(livreur):
+            rng = random.Random(livreur.id)
+            try:
+                barrier.wait()
+                deadline = time.monotonic() + duration
+                while time.monotonic() < deadline:
+                    lat, lon = random_position(rng)
+                    try:
+                        ping(livreur.id, lat, lon)
+                    except OperationalError as e:
+                        errors[str(e)] += 1
+                        continue
+                    counts[livreur.id] += 1
+                    last[livreur.id] = (lat, lon)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(livreur,)) for livreur in livreurs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sum(counts.values()), last, errors
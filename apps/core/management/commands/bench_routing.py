@@ -0,0 +1,56 @@
+"""
+Throughput of the offline routing engine (apps.geolocation.routing).
+
+Loads the road graph, draws --routes random origin/destination pairs
+around Yaoundé and reports routes per second with an empty route cache
+(snapping + A*) and with every pair already cached, plus the share of
+pairs that fell back to the straight-line estimate and the average
+road / straight-line distance ratio. No database access.
+Usage: python manage.py bench_routing --routes 1000 [--graph path.npz]
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.benchmarks import random_position
+from apps.geolocation.distances import haversine_km
+
+
+class Command(BaseCommand):
+    help = 'Measure routes per second of the offline road routing engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--routes', type=int, default=1000)
+        parser.add_argument('--graph', default=None)
+        parser.add_argument('--seed', type=int, default=14)
+
+    def handle(self, *args, **options):
+        from apps.geolocation.routing import RoutingEngine
+
+        engine = RoutingEngine(options['graph'])
+        start = time.perf_counter()
+        if engine.graph is None:
+            raise CommandError(f'Graphe routier introuvable: {engine.graph_file} (voir build_routing_graph)')
+        self.stdout.write(f'{engine.graph.node_count} intersections chargées en {time.perf_counter() - start:.2f}s')
+
+        rng = random.Random(options['seed'])
+        pairs = [(random_position(rng), random_position(rng)) for _ in range(options['routes'])]
+
+        for label in ('cache vide', 'cache chaud'):
+            start = time.perf_counter()
+            routes = [engine.route(origin, destination) for origin, destination in pairs]
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f'{label:<12} {len(pairs) / elapsed:.0f} itinéraires/s')
+
+        road = [
+            (route['distance_km'], haversine_km(*origin, *destination))
+            for route, (origin, destination) in zip(routes, pairs)
+            if route['source'] == 'road'
+        ]
+        detours = [distance / straight for distance, straight in road if straight > 0.1]
+        self.stdout.write(
+            f'{len(pairs) - len(road)} repli(s) sur l\'estimation à vol d\'oiseau, '
+            f'détour moyen x{sum(detours) / len(detours) if detours else 0:.2f}'
+        )
+        self.stdout.write(self.style.SUCCESS('Terminé'))
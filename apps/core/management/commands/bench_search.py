@@ -0,0 +1,80 @@
+"""
+Product search latency: icontains scans vs the FTS5 index.
+
+Creates --products products (spread over --restaurants restaurants, with
+names drawn from French dish and grocery words) and indexes them, all
+rolled back at the end. Then, for a set of queries with and without
+accents and with partial words, times the former icontains filter over
+name and description and search_index.search, and prints the hit counts.
+Usage: python manage.py bench_search --products 100000
+"""
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from apps.core.benchmarks import format_timing, make_restaurants, rollback, time_calls
+
+WORDS = [
+    'poulet', 'braisé', 'poisson', 'ndolé', 'eru', 'okok', 'koki', 'beignets', 'haricots',
+    'plantain', 'frites', 'riz', 'sauce', 'arachide', 'tomate', 'épicé', 'crème', 'glacée',
+    'café', 'thé', 'jus', 'ananas', 'mangue', 'pâtes', 'fromage', 'européen', 'pizza',
+    'burger', 'brochettes', 'bœuf', 'mouton', 'crevettes', 'miel', 'pain', 'lait', 'savon',
+]
+QUERIES = ['poulet braisé', 'poulet braise', 'ndole', 'créme', 'crev', 'pat fromage', 'europ', 'ananas jus']
+
+
+class Command(BaseCommand):
+    help = 'Compare icontains product search with the FTS5 index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--restaurants', type=int, default=200)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=19)
+
+    def handle(self, *args, **options):
+        from apps.products.models import Produit
+        from apps.search.index import search_index
+
+        rng = random.Random(options['seed'])
+        with rollback():
+            restaurants = make_restaurants(options['restaurants'], rng=rng)
+            Produit.objects.bulk_create([
+                Produit(
+                    restaurant=rng.choice(restaurants),
+                    name=' '.join(rng.sample(WORDS, 3)).capitalize(),
+                    description=' '.join(rng.sample(WORDS, 8)),
+                    price=Decimal('1500'),
+                )
+                for _ in range(options['products'])
+            ], batch_size=2000)
+
+            start = time.perf_counter()
+            count = search_index.rebuild()
+            self.stdout.write(f'{count} documents indexés en {time.perf_counter() - start:.1f}s')
+
+            for query in QUERIES:
+                condition = Q()
+                for word in query.split():
+                    condition &= Q(name__icontains=word) | Q(description__icontains=word)
+                matches = {}
+
+                def scan():
+                    matches['icontains'] = list(Produit.objects.filter(condition).values_list('id', flat=True)[:20])
+
+                def fts():
+                    matches['fts'] = search_index.search(query, kinds=['produit'], limit=20)
+
+                self.stdout.write(f"'{query}'")
+                self.stdout.write(
+                    f"  {format_timing('icontains', time_calls(scan, options['repeat']))} "
+                    f"{len(matches['icontains'])} résultats"
+                )
+                self.stdout.write(
+                    f"  {format_timing('fts5 bm25', time_calls(fts, options['repeat']))} "
+                    f"{len(matches['fts'])} résultats"
+                )
+        self.stdout.write(self.style.SUCCESS('Terminé'))
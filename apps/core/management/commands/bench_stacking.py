@@ -0,0 +1,144 @@
+"""
+Offline simulation of multi-order stacking (apps.livreurs.stacking).
+
+Draws --merchants pickup points around Yaoundé (a few busy ones receive
+most orders) and --orders-per-hour orders over --hours, each delivered
+within --max-drop-km of its merchant. Every simulated minute, idle
+livreurs take the oldest ready order within --radius km; with stacking,
+they take its whole lot as built by ``group_bundles``. Rides go at
+--speed km/h with --stop-minutes at every pickup and drop-off.
+
+Prints, with and without stacking, the deliveries per courier-hour spent
+working, and the mean and p90 time from PRETE to delivered.
+No database access.
+Usage: python manage.py bench_stacking --couriers 40 --orders-per-hour 300
+"""
+import math
+import random
+
+from django.core.management.base import BaseCommand
+
+from apps.core.benchmarks import random_position
+
+
+def drop_point(rng, pickup, max_km):
+    """Random point within max_km of the pickup"""
+    distance_km = max_km * math.sqrt(rng.random())
+    angle = rng.uniform(0, 2 * math.pi)
+    return (
+        pickup[0] + distance_km * math.cos(angle) / 111.32,
+        pickup[1] + distance_km * math.sin(angle) / (111.32 * math.cos(math.radians(pickup[0]))),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Simulate deliveries per courier-hour with and without multi-order stacking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--merchants', type=int, default=40)
+        parser.add_argument('--couriers', type=int, default=40)
+        parser.add_argument('--hours', type=float, default=3)
+        parser.add_argument('--orders-per-hour', type=int, default=300)
+        parser.add_argument('--radius', type=float, default=5.0)
+        parser.add_argument('--max-drop-km', type=float, default=4.0)
+        parser.add_argument('--speed', type=float, default=20.0)
+        parser.add_argument('--stop-minutes', type=float, default=4.0)
+        parser.add_argument('--seed', type=int, default=17)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        merchants = [random_position(rng) for _ in range(options['merchants'])]
+        # Zipf-like popularity: the first merchants get most of the orders
+        weights = [1 / (rank + 1) for rank in range(len(merchants))]
+        count = int(options['orders_per_hour'] * options['hours'])
+        orders = []
+        for commande_id in range(count):
+            merchant = rng.choices(range(len(merchants)), weights)[0]
+            orders.append((
+                commande_id, merchant, merchants[merchant],
+                drop_point(rng, merchants[merchant], options['max_drop_km']),
+                rng.uniform(0, options['hours'] * 3600),
+            ))
+        orders.sort(key=lambda order: order[4])
+        couriers = [random_position(rng) for _ in range(options['couriers'])]
+        self.stdout.write(
+            f"{count} commandes, {len(merchants)} commerces, {len(couriers)} livreurs, {options['hours']} h"
+        )
+
+        for label, stacking in (('sans lots', False), ('avec lots', True)):
+            result = self.simulate(orders, couriers, stacking, options)
+            self.stdout.write(
+                f"{label:<10} {result['delivered']} livrées, "
+                f"{result['per_hour']:.2f} livraisons/heure-livreur, "
+                f"attente moyenne {result['mean_wait']:.1f} min, p90 {result['p90_wait']:.1f} min, "
+                f"{result['mean_lot']:.2f} commandes par course"
+            )
+        self.stdout.write(self.style.SUCCESS('Terminé'))
+
+    def simulate(self, orders, couriers, stacking, options):
+        from apps.geolocation.distances import haversine_km
+        from apps.livreurs.stacking import Candidate, group_bundles
+
+        seconds_per_km = 3600 / options['speed']
+        stop_seconds = options['stop_minutes'] * 60
+        positions = list(couriers)
+        free_at = [0.0] * len(couriers)
+        busy_seconds = 0.0
+        waits = []
+        rides = 0
+
+        upcoming = list(orders)
+        waiting = []
+        now = 0.0
+        while upcoming or waiting:
+            while upcoming and upcoming[0][4] <= now:
+                waiting.append(upcoming.pop(0))
+            lots = {}
+            if stacking and len(waiting) > 1:
+                by_id = {order[0]: order for order in waiting}
+                for bundle in group_bundles([Candidate(*order) for order in waiting]):
+                    for commande_id in bundle.commande_ids:
+                        lots[commande_id] = [by_id[other] for other in bundle.commande_ids]
+
+            for courier in sorted(range(len(couriers)), key=free_at.__getitem__):
+                if free_at[courier] > now or not waiting:
+                    continue
+                order = next((
+                    order for order in waiting
+                    if haversine_km(*positions[courier], *order[2]) <= options['radius']
+                ), None)
+                if order is None:
+                    continue
+                lot = lots.get(order[0], [order])
+                if any(member not in waiting for member in lot):
+                    lot = [order]
+                for member in lot:
+                    waiting.remove(member)
+
+                # Ride to the merchant, then through the drop-offs in lot order
+                elapsed = haversine_km(*positions[courier], *order[2]) * seconds_per_km + stop_seconds
+                position = order[2]
+                for member in lot:
+                    elapsed += haversine_km(*position, *member[3]) * seconds_per_km + stop_seconds
+                    position = member[3]
+                    waits.append((now + elapsed - member[4]) / 60)
+                positions[courier] = position
+                free_at[courier] = now + elapsed
+                busy_seconds += elapsed
+                rides += 1
+            if not upcoming and max(free_at) <= now and waiting and all(
+                haversine_km(*position, *order[2]) > options['radius']
+                for position in positions for order in waiting
+            ):
+                # Nobody will ever be in range of what is left
+                break
+            now += 60
+
+        waits.sort()
+        return {
+            'delivered': len(waits),
+            'per_hour': len(waits) / (busy_seconds / 3600) if busy_seconds else 0.0,
+            'mean_wait': sum(waits) / len(waits) if waits else 0.0,
+            'p90_wait': waits[int(len(waits) * 0.9)] if waits else 0.0,
+            'mean_lot': len(waits) / rides if rides else 0.0,
+        }
@@ -0,0 +1,97 @@
+"""
+Throughput and memory of the delivery trace recorder (apps.livreurs.traces).
+
+Opens --deliveries traces in a LocalTraceRecorder and feeds each of them
+--pings simulated pings (a courier wandering at ~30 km/h with ~2 m of GPS
+noise, one ping every 5 s), batched per round like concurrent uploads.
+Reports pings/s, peak buffer memory, the time to close every trace into
+its simplified LineString, and the error of the recorded distance against
+the simulated one. Last, checks that a livreur claiming a second order
+while the first is open keeps recording both traces. No database access.
+Usage: python manage.py bench_trace_recorder --deliveries 1000 --pings 600
+"""
+import math
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.benchmarks import random_position
+from apps.geolocation.distances import haversine_km
+
+
+class Command(BaseCommand):
+    help = 'Measure trace recording throughput and memory for concurrent deliveries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--deliveries', type=int, default=1000)
+        parser.add_argument('--pings', type=int, default=600)
+        parser.add_argument('--max-points', type=int, default=None)
+        parser.add_argument('--seed', type=int, default=15)
+
+    def handle(self, *args, **options):
+        from django.conf import settings
+
+        from apps.livreurs.traces import LocalTraceRecorder
+
+        rng = random.Random(options['seed'])
+        deliveries = options['deliveries']
+        recorder = LocalTraceRecorder(options['max_points'] or getattr(settings, 'TRACE_MAX_POINTS', 1000))
+        for delivery in range(deliveries):
+            recorder.start([delivery], delivery, 0.0)
+
+        couriers = [(*random_position(rng), rng.uniform(0, 2 * math.pi)) for _ in range(deliveries)]
+        travelled = [0.0] * deliveries
+        rounds = []
+        for ping in range(1, options['pings'] + 1):
+            batch = []
+            for delivery, (lat, lon, heading) in enumerate(couriers):
+                heading += rng.gauss(0, 0.3)
+                new_lat, new_lon = lat + 0.0004 * math.cos(heading), lon + 0.0004 * math.sin(heading)
+                travelled[delivery] += haversine_km(lat, lon, new_lat, new_lon)
+                couriers[delivery] = (new_lat, new_lon, heading)
+                noisy = (new_lat + rng.gauss(0, 0.00002), new_lon + rng.gauss(0, 0.00002), ping * 5.0)
+                batch.append((delivery, noisy))
+            rounds.append(batch)
+
+        peak = 0
+        start = time.perf_counter()
+        for batch in rounds:
+            for delivery, point in batch:
+                recorder.append(delivery, [point])
+            peak = max(peak, recorder.memory_bytes())
+        elapsed = time.perf_counter() - start
+        total = deliveries * options['pings']
+        self.stdout.write(f'{deliveries} livraisons x {options["pings"]} pings: {total / elapsed:.0f} pings/s')
+        self.stdout.write(
+            f'mémoire des tampons: pic {peak / 1e6:.1f} Mo ({peak / deliveries / 1024:.1f} Ko par trace)'
+        )
+
+        start = time.perf_counter()
+        errors = []
+        vertices = 0
+        for delivery in range(deliveries):
+            trace = recorder.pop(delivery)
+            route, distance_km, _ = trace.summary(options['pings'] * 5.0)
+            vertices += len(route) if route is not None else 0
+            errors.append(abs(distance_km - travelled[delivery]) / travelled[delivery])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'clôture: {elapsed / deliveries * 1000:.2f} ms par trace, '
+            f'{vertices / deliveries:.0f} sommets par LineString'
+        )
+        self.stdout.write(
+            f'écart de distance: moyen {sum(errors) / len(errors):.2%}, max {max(errors):.2%}'
+        )
+
+        # Second claim while delivering: the first trace must stay active, and a repeated id not be doubled
+        first, second = deliveries, deliveries + 1
+        lat, lon = random_position(rng)
+        recorder.start([first], 0, 0.0)
+        recorder.start([second, first], 0, 0.0)
+        recorder.append(0, [(lat, lon, 10.0), (lat + 0.001, lon, 20.0)])
+        lengths = [len(recorder.pop(commande_id)) for commande_id in (first, second)]
+        if lengths != [2, 2] or recorder.pop(first) is not None:
+            raise CommandError(f'Traces perdues après une seconde prise en charge: {lengths} points')
+        self.stdout.write('seconde prise en charge: les deux traces sont enregistrées')
+        self.stdout.write(self.style.SUCCESS('Terminé'))
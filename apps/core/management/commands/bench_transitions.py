@@ -0,0 +1,123 @@
+"""
+Order transition throughput under concurrent updates.
+
+Several threads race to push the same EN_ATTENTE orders through
+accepter -> commencer_preparation -> marquer_prete. With --mode cas each
+step goes through apps.orders.transitions (compare-and-set UPDATE of the
+status and date columns, hooks included); with --mode save it replays the
+former read, check in Python, full-row save(). The command reports
+transitions per second and how many times a step was applied more than
+once (lost updates): zero is required in cas mode.
+
+The fixtures are committed because every thread uses its own database
+connection; they are deleted at the end.
+Usage: python manage.py bench_transitions --threads 8 --orders 200 --mode cas
+"""
+import random
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from apps.core.benchmarks import make_commandes, make_restaurants, make_users
+
+CHAIN = ['accepter', 'commencer_preparation', 'marquer_prete']
+
+
+class Command(BaseCommand):
+    help = 'Measure order transitions per second under concurrent updates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--orders', type=int, default=200)
+        parser.add_argument('--mode', choices=['cas', 'save'], default='cas')
+        parser.add_argument('--seed', type=int, default=23)
+
+    def handle(self, *args, **options):
+        from apps.orders.models import Commande
+        from apps.orders.transitions import TRANSITIONS, TransitionNotAllowed, apply_transition
+        from apps.users.models import User
+
+        rng = random.Random(options['seed'])
+        client = make_users('bench-client-', 1, 'CLIENT')[0]
+        restaurants = make_restaurants(5, rng=rng)
+        commande_ids = [
+            cmd.id for cmd in make_commandes(options['orders'], client, restaurants, status='EN_ATTENTE', rng=rng)
+        ]
+
+        applied = Counter()
+        outcomes = Counter()
+        errors = Counter()
+        lock = threading.Lock()
+        barrier = threading.Barrier(options['threads'])
+
+        def legacy(commande, name):
+            transition = TRANSITIONS[name]
+            if commande.status not in transition.sources:
+                raise TransitionNotAllowed(transition, commande.status)
+            commande.status = transition.target
+            commande.save()
+
+        step = apply_transition if options['mode'] == 'cas' else legacy
+
+        def worker(seed):
+            order = commande_ids[:]
+            random.Random(seed).shuffle(order)
+            try:
+                barrier.wait()
+                for commande_id in order:
+                    commande = Commande.objects.get(id=commande_id)
+                    for name in CHAIN:
+                        try:
+                            step(commande, name)
+                        except TransitionNotAllowed:
+                            # Another thread got there first: carry on from its status
+                            commande.refresh_from_db(fields=['status'])
+                            outcome = 'refusées'
+                        except OperationalError as e:
+                            outcome = str(e)
+                        else:
+                            outcome = 'appliquées'
+                        with lock:
+                            if outcome not in ('appliquées', 'refusées'):
+                                errors[outcome] += 1
+                                continue
+                            outcomes[outcome] += 1
+                            if outcome == 'appliquées':
+                                applied[commande_id, name] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(options['threads'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        try:
+            final = Counter(Commande.objects.filter(id__in=commande_ids).values_list('status', flat=True))
+            lost = sum(count - 1 for count in applied.values() if count > 1)
+            attempts = outcomes['appliquées'] + outcomes['refusées']
+
+            self.stdout.write(
+                f"mode {options['mode']}, {options['threads']} threads x {len(commande_ids)} commandes: "
+                f"{attempts} tentatives en {elapsed:.2f}s, "
+                f"{outcomes['appliquées'] / elapsed:.0f} transitions/s, {attempts / elapsed:.0f} tentatives/s"
+            )
+            self.stdout.write(
+                f"{outcomes['appliquées']} appliquées, {outcomes['refusées']} refusées, "
+                f"{lost} appliquées plusieurs fois, statuts finaux: {dict(final)}"
+            )
+            for message, count in errors.items():
+                self.stdout.write(self.style.WARNING(f'{count} x {message}'))
+        finally:
+            Commande.objects.filter(id__in=commande_ids).delete()
+            User.objects.filter(email__endswith='@bench.quickdeliver.cm').delete()
+
+        if options['mode'] == 'cas' and lost:
+            raise CommandError(f'{lost} transitions appliquées plusieurs fois')
+        self.stdout.write(self.style.SUCCESS('Terminé'))
@@ -0,0 +1,85 @@
+"""
+Point-in-zone latency: polygon__contains query vs the in-process zone index.
+
+Tiles the Yaoundé bounding box with --zones square ZoneLivraison polygons
+(rolled back at the end), then for --points random positions times the
+former verifier_zone query and zone_index.locate, checks that both return
+the same zone, and times one locate_many call over all the points.
+Usage: python manage.py bench_zone_lookup --zones 100 --points 2000
+"""
+import math
+import random
+
+from django.contrib.gis.geos import Polygon
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.benchmarks import YAOUNDE_BBOX, format_timing, random_position, rollback, time_calls
+
+
+class Command(BaseCommand):
+    help = 'Compare polygon__contains queries with the prepared-geometry zone index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--zones', type=int, default=100)
+        parser.add_argument('--points', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=13)
+
+    def handle(self, *args, **options):
+        from django.contrib.gis.geos import Point
+
+        from apps.geolocation.models import ZoneLivraison
+        from apps.geolocation.zone_index import ZoneIndex
+
+        rng = random.Random(options['seed'])
+        side = max(1, math.isqrt(options['zones']))
+        min_lat, min_lon, max_lat, max_lon = YAOUNDE_BBOX
+        # Leave a margin outside the tiles so that some points miss
+        step_lat = (max_lat - min_lat) * 0.9 / side
+        step_lon = (max_lon - min_lon) * 0.9 / side
+
+        with rollback():
+            ZoneLivraison.objects.update(is_active=False)
+            ZoneLivraison.objects.bulk_create([
+                ZoneLivraison(
+                    name=f'bench-zone-{i}-{j}',
+                    city='Yaoundé',
+                    polygon=Polygon.from_bbox((
+                        min_lon + j * step_lon, min_lat + i * step_lat,
+                        min_lon + (j + 1) * step_lon, min_lat + (i + 1) * step_lat,
+                    )),
+                )
+                for i in range(side) for j in range(side)
+            ])
+            index = ZoneIndex()
+            points = [random_position(rng) for _ in range(options['points'])]
+            self.stdout.write(f'{side * side} zones, {len(points)} positions')
+
+            mismatches = 0
+            for lat, lon in points:
+                zone = ZoneLivraison.objects.filter(
+                    is_active=True, polygon__contains=Point(lon, lat)
+                ).first()
+                located = index.locate(lat, lon)
+                if (zone.id if zone else None) != (located.id if located else None):
+                    mismatches += 1
+
+            samples = iter(points * 2)
+
+            def query():
+                lat, lon = next(samples)
+                return ZoneLivraison.objects.filter(is_active=True, polygon__contains=Point(lon, lat)).first()
+
+            def locate():
+                lat, lon = next(samples)
+                return index.locate(lat, lon)
+
+            self.stdout.write(format_timing('polygon__contains', time_calls(query, len(points))))
+            samples = iter(points * 2)
+            self.stdout.write(format_timing('zone_index.locate', time_calls(locate, len(points))))
+            self.stdout.write(format_timing(
+                f'locate_many ({len(points)})', time_calls(lambda: index.locate_many(points), 10)
+            ))
+
+        if mismatches:
+            raise CommandError(f'{mismatches} position(s) classées différemment par la requête et l\'index')
+        self.stdout.write(self.style.SUCCESS('Résultats identiques (données de test annulées)'))
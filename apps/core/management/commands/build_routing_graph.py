@@ -0,0 +1,170 @@
+"""
+Build the offline road graph used by apps.geolocation.routing.
+
+Reads an OpenStreetMap XML extract (.osm, .osm.gz or .osm.bz2) of the
+city, for example an Overpass export of the Yaoundé bounding box, keeps
+the ways a delivery motorbike can use, folds the shape points between
+intersections into single edges, keeps the largest connected part of the
+network and writes the compressed sparse row arrays to ROUTING_GRAPH_FILE
+(or --output). Oneway streets and roundabouts are one-directional.
+The routing engine of running processes picks the new file up on restart.
+Usage: python manage.py build_routing_graph yaounde.osm.bz2 [--output path]
+"""
+import bz2
+import gzip
+import re
+import xml.etree.ElementTree as ET
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.geolocation.distances import haversine_km
+from apps.geolocation.routing import HIGHWAY_SPEEDS_KMH, RoadGraph
+
+CLOSED_ACCESS = {'no', 'private'}
+
+
+def open_extract(path):
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def way_speed_kmh(tags):
+    speed = HIGHWAY_SPEEDS_KMH[tags['highway']]
+    match = re.match(r'\s*(\d+)', tags.get('maxspeed', ''))
+    if match and 0 < int(match.group(1)) < speed:
+        speed = int(match.group(1))
+    return speed
+
+
+def way_directions(tags):
+    """(forward, backward) allowed along the node order of the way"""
+    oneway = tags.get('oneway', '')
+    if oneway == '-1':
+        return False, True
+    if oneway in ('yes', 'true', '1') or tags.get('junction') in ('roundabout', 'circular'):
+        return True, False
+    return True, True
+
+
+def read_extract(path):
+    """({node_id: (lat, lon)}, [(node_ids, tags)]) of the drivable ways"""
+    coordinates = {}
+    ways = []
+    with open_extract(path) as source:
+        for _, element in ET.iterparse(source, events=('end',)):
+            if element.tag == 'node':
+                coordinates[int(element.get('id'))] = (float(element.get('lat')), float(element.get('lon')))
+            elif element.tag == 'way':
+                tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+                if (
+                    tags.get('highway') in HIGHWAY_SPEEDS_KMH
+                    and tags.get('access') not in CLOSED_ACCESS
+                    and tags.get('motorcycle') not in CLOSED_ACCESS
+                ):
+                    ways.append(([int(nd.get('ref')) for nd in element.iter('nd')], tags))
+            if element.tag in ('node', 'way', 'relation'):
+                element.clear()
+    return coordinates, ways
+
+
+def fold_edges(coordinates, ways):
+    """{(from_osm_id, to_osm_id): (length_m, time_s)} between intersections and dead ends"""
+    usage = Counter()
+    for refs, _ in ways:
+        refs = [ref for ref in refs if ref in coordinates]
+        usage.update(refs)
+        if refs:
+            # Way ends are kept even when no other way touches them
+            usage[refs[0]] += 1
+            usage[refs[-1]] += 1
+
+    edges = {}
+    for refs, tags in ways:
+        refs = [ref for ref in refs if ref in coordinates]
+        if len(refs) < 2:
+            continue
+        speed_ms = way_speed_kmh(tags) / 3.6
+        forward, backward = way_directions(tags)
+        start, length_m = refs[0], 0.0
+        for previous, ref in zip(refs, refs[1:]):
+            length_m += haversine_km(*coordinates[previous], *coordinates[ref]) * 1000
+            if usage[ref] < 2 or ref == start:
+                continue
+            time_s = length_m / speed_ms
+            for key, allowed in (((start, ref), forward), ((ref, start), backward)):
+                if allowed and (key not in edges or edges[key][1] > time_s):
+                    edges[key] = (length_m, time_s)
+            start, length_m = ref, 0.0
+    return edges
+
+
+def largest_component(edges):
+    """OSM ids of the largest weakly connected part of the network"""
+    parent = {}
+
+    def find(node):
+        root = node
+        while parent.setdefault(root, root) != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    for source, target in edges:
+        parent[find(source)] = find(target)
+    sizes = Counter(find(node) for node in parent)
+    if not sizes:
+        return set()
+    biggest = sizes.most_common(1)[0][0]
+    return {node for node in parent if find(node) == biggest}
+
+
+class Command(BaseCommand):
+    help = 'Build the offline routing graph from an OpenStreetMap XML extract'
+
+    def add_arguments(self, parser):
+        parser.add_argument('extract', help='Extrait OSM (.osm, .osm.gz, .osm.bz2)')
+        parser.add_argument('--output', default=None)
+
+    def handle(self, *args, **options):
+        output = options['output'] or str(getattr(
+            settings, 'ROUTING_GRAPH_FILE', settings.BASE_DIR / 'yaounde_roads.npz'
+        ))
+        try:
+            coordinates, ways = read_extract(options['extract'])
+        except (OSError, ET.ParseError) as e:
+            raise CommandError(f"Lecture de l'extrait impossible: {e}")
+        self.stdout.write(f'{len(coordinates)} noeuds OSM, {len(ways)} voies carrossables')
+
+        edges = fold_edges(coordinates, ways)
+        kept = largest_component(edges)
+        edges = {key: value for key, value in edges.items() if key[0] in kept}
+        if not edges:
+            raise CommandError('Aucune voie carrossable dans cet extrait')
+
+        osm_ids = sorted(kept)
+        index = {osm_id: i for i, osm_id in enumerate(osm_ids)}
+        sources = np.array([index[source] for source, _ in edges], dtype=np.int32)
+        targets = np.array([index[target] for _, target in edges], dtype=np.int32)
+        lengths_m = np.array([length for length, _ in edges.values()])
+        times_s = np.array([time_s for _, time_s in edges.values()])
+
+        order = np.argsort(sources, kind='stable')
+        indptr = np.zeros(len(osm_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(osm_ids)), out=indptr[1:])
+
+        RoadGraph.save(
+            output,
+            [coordinates[osm_id][0] for osm_id in osm_ids],
+            [coordinates[osm_id][1] for osm_id in osm_ids],
+            indptr, targets[order], lengths_m[order], times_s[order],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(osm_ids)} intersections, {len(edges)} arcs -> {output}'
+        ))
@@ -0,0 +1,94 @@
+"""
+Offline check of the geocoding layer (apps.geolocation.geocoding).
+
+Outbound connections are refused for the whole run, then the command
+checks that:
+- every quartier and address of the gazetteer resolves without network;
+- a result stored in CacheGeocodage is served from the table, then from
+  the in-process LRU;
+- an unknown address that names a quartier, and coordinates near one,
+  degrade to an approximate gazetteer answer instead of an error.
+Database writes are rolled back. Prints the hit rates at the end.
+Usage: python manage.py check_geocoding_offline
+"""
+import socket
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.benchmarks import rollback
+
+
+@contextmanager
+def network_disabled():
+    def refuse(*args, **kwargs):
+        raise OSError('network disabled by check_geocoding_offline')
+
+    original_connect, original_create = socket.socket.connect, socket.create_connection
+    socket.socket.connect = refuse
+    socket.create_connection = refuse
+    try:
+        yield
+    finally:
+        socket.socket.connect = original_connect
+        socket.create_connection = original_create
+
+
+class Command(BaseCommand):
+    help = 'Verify that geocoding works from the cache and the gazetteer with the network disabled'
+
+    def handle(self, *args, **options):
+        from apps.geolocation.geocoding import GeocodingService
+        from apps.geolocation.models import CacheGeocodage
+
+        failures = []
+
+        def expect(label, condition):
+            if condition:
+                self.stdout.write(self.style.SUCCESS(f'OK   {label}'))
+            else:
+                failures.append(label)
+                self.stdout.write(self.style.ERROR(f'ECHEC {label}'))
+
+        with network_disabled(), rollback():
+            service = GeocodingService()
+            gazetteer = service.gazetteer
+            expect('gazetteer non vide', gazetteer.quartiers and gazetteer.addresses)
+
+            for key, entry in gazetteer.quartiers.items():
+                result = service.geocode(entry['name'])
+                expect(f"quartier '{entry['name']}'", result and result['source'] == 'gazetteer')
+            for key, entry in gazetteer.addresses.items():
+                result = service.geocode(entry['address'])
+                expect(f"adresse '{entry['address'][:40]}'", result and result['source'] == 'gazetteer')
+
+            CacheGeocodage.objects.create(
+                lookup_type='ADRESSE', key='rue 1770 nlongkak',
+                latitude=3.8760, longitude=11.5190, address='Rue 1770, Nlongkak, Yaoundé'
+            )
+            db_hits = service.counters['db_hits']
+            first = service.geocode('Rue 1770, Nlongkak, Yaoundé')
+            expect('cache persistant', first and service.counters['db_hits'] == db_hits + 1)
+            lru_hits = service.counters['lru_hits']
+            second = service.geocode('rue 1770 NLONGKAK')
+            expect('LRU en mémoire', second == first and service.counters['lru_hits'] == lru_hits + 1)
+
+            if gazetteer.quartiers:
+                name = next(iter(gazetteer.quartiers.values()))['name']
+                fallback = service.geocode(f'Rue inconnue 999, {name}, Yaoundé')
+                expect('adresse inconnue -> quartier approximatif', fallback and fallback.get('approximate'))
+                quartier = gazetteer.lookup(next(iter(gazetteer.quartiers)))
+                nearby = service.reverse(quartier['latitude'] + 0.001, quartier['longitude'])
+                expect('géocodage inverse -> quartier approximatif', nearby and nearby.get('approximate'))
+
+            expect('aucune réponse réseau mise en cache', not CacheGeocodage.objects.filter(source='nominatim').exists())
+            stats = service.stats()
+
+        self.stdout.write(
+            f"{stats['requests']} requêtes, taux de succès local {stats['hit_rate']:.0%} "
+            f"(LRU {stats.get('lru_hits', 0)}, table {stats.get('db_hits', 0)}, "
+            f"gazetteer {stats.get('gazetteer_hits', 0)}, repli {stats.get('gazetteer_fallbacks', 0)}, "
+            f"erreurs réseau {stats.get('remote_errors', 0)})"
+        )
+        if failures:
+            raise CommandError(f'{len(failures)} vérification(s) en échec')
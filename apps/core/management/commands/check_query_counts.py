@@ -0,0 +1,148 @@
+"""
+Query-count regression checks for the hot API endpoints.
+
+Each check builds its fixtures in a rolled-back transaction, calls the
+endpoint through the DRF test client at several data sizes and fails if
+the number of SQL queries exceeds the endpoint budget or grows with the
+data size. Authentication is forced, so the JWT user lookup is not counted.
+Usage: python manage.py check_query_counts
+"""
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.core.benchmarks import (
+    make_commandes, make_lignes, make_livreurs, make_produits, make_restaurants, make_users, rollback
+)
+from apps.livreurs.models import Livreur, StatistiquesLivreur
+from apps.livreurs.spatial_index import pickup_index
+from apps.restaurants.stats import invalidate_dashboard_stats
+
+SIZES = (5, 50)
+
+
+def count_queries(user, method, url, **kwargs):
+    client = APIClient()
+    client.force_authenticate(user)
+    with CaptureQueriesContext(connection) as queries:
+        response = getattr(client, method)(url, **kwargs)
+    if response.status_code >= 400:
+        raise CommandError(f'{method.upper()} {url} -> {response.status_code}: {response.content[:200]}')
+    return len(queries)
+
+
+def check_revenus(size, rng):
+    """livreurs/revenus: livreur + rollup row + one grouped aggregate"""
+    livreur = make_livreurs(1, rng=rng)[0]
+    StatistiquesLivreur.objects.create(livreur=livreur)
+    client = make_users('bench-client-', 1, 'CLIENT')[0]
+    restaurants = make_restaurants(3, rng=rng)
+    now = timezone.now()
+    for day in range(size):
+        make_commandes(
+            1, client, restaurants, status='LIVREE', rng=rng,
+            livreur=livreur, date_delivered=now - timedelta(days=day % 40)
+        )
+    make_commandes(size // 5 + 1, client, restaurants, status='ANNULEE', rng=rng, livreur=livreur)
+    return count_queries(livreur.user, 'get', '/api/livreurs/revenus/')
+
+
+def order_list_fixtures(size, rng, **fields):
+    """size orders of one client and one restaurant, two items each; returns (client, restaurant)"""
+    client = make_users('bench-client-', 1, 'CLIENT')[0]
+    restaurants = make_restaurants(1, rng=rng)
+    commandes = make_commandes(size, client, restaurants, rng=rng, **fields)
+    make_lignes(commandes, make_produits(restaurants), rng=rng)
+    return client, restaurants[0]
+
+
+def check_client_orders(size, rng):
+    """orders/commandes: count + orders + items, page size = data size"""
+    client, _ = order_list_fixtures(size, rng, status='EN_ATTENTE')
+    return count_queries(client, 'get', f'/api/orders/commandes/?page_size={size}')
+
+
+def check_restaurant_orders(size, rng):
+    """restaurants/orders: restaurant + orders + items"""
+    _, restaurant = order_list_fixtures(size, rng, status='EN_ATTENTE')
+    return count_queries(restaurant.user, 'get', '/api/restaurants/orders/')
+
+
+def check_recent_orders(size, rng):
+    """restaurants/recent_orders: restaurant + orders + items"""
+    _, restaurant = order_list_fixtures(size, rng, status='EN_ATTENTE')
+    return count_queries(restaurant.user, 'get', '/api/restaurants/recent_orders/')
+
+
+def check_dashboard_stats(size, rng):
+    """restaurants/dashboard_stats: restaurant + one aggregate (cold cache)"""
+    _, restaurant = order_list_fixtures(size, rng, status='EN_ATTENTE')
+    invalidate_dashboard_stats(restaurant.id)
+    return count_queries(restaurant.user, 'get', '/api/restaurants/dashboard_stats/')
+
+
+def check_historique(size, rng):
+    """livreurs/historique: livreur + orders + items"""
+    livreur = make_livreurs(1, rng=rng)[0]
+    order_list_fixtures(size, rng, status='LIVREE', livreur=livreur, date_delivered=timezone.now())
+    return count_queries(livreur.user, 'get', '/api/livreurs/historique/')
+
+
+def check_commandes_disponibles(size, rng):
+    """livreurs/commandes_disponibles: livreur + candidates + items"""
+    livreur = make_livreurs(1, rng=rng)[0]
+    Livreur.objects.filter(pk=livreur.pk).update(action_radius_km=50)
+    order_list_fixtures(size, rng, status='PRETE')
+    pickup_index.rebuild()
+    return count_queries(livreur.user, 'get', '/api/livreurs/commandes_disponibles/')
+
+
+def check_restaurants_nearby(size, rng):
+    """restaurants/nearby: one bounded, sorted, limited query"""
+    client = make_users('bench-client-', 1, 'CLIENT')[0]
+    make_restaurants(size, rng=rng)
+    return count_queries(client, 'get', '/api/restaurants/nearby/?lat=3.86&lon=11.51&radius=50')
+
+
+CHECKS = [
+    ('livreurs/revenus', check_revenus, 3),
+    ('orders/commandes', check_client_orders, 3),
+    ('restaurants/orders', check_restaurant_orders, 3),
+    ('restaurants/recent_orders', check_recent_orders, 3),
+    ('restaurants/dashboard_stats', check_dashboard_stats, 2),
+    ('livreurs/historique', check_historique, 3),
+    ('livreurs/commandes_disponibles', check_commandes_disponibles, 3),
+    ('restaurants/nearby', check_restaurants_nearby, 1),
+]
+
+
+class Command(BaseCommand):
+    help = 'Fail if a hot endpoint issues more SQL queries than its budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=11)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        failures = []
+
+        for label, check, budget in CHECKS:
+            counts = []
+            for size in SIZES:
+                with rollback():
+                    counts.append(check(size, rng))
+
+            detail = ', '.join(f'{size} lignes: {count}' for size, count in zip(SIZES, counts))
+            if max(counts) > budget or len(set(counts)) > 1:
+                failures.append(label)
+                self.stdout.write(self.style.ERROR(f'{label:<32} budget {budget} -> {detail}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{label:<32} budget {budget} -> {detail}'))
+
+        if failures:
+            raise CommandError(f"Budget de requêtes dépassé: {', '.join(failures)}")
@@ -0,0 +1,84 @@
+"""
+Query-plan regression check for the order lifecycle hot paths.
+
+Runs EXPLAIN QUERY PLAN (QuerySet.explain() on spatialite/SQLite) for the
+Commande queries issued by the orders, livreurs, restaurants and payments
+views and fails if any of them reads orders_commande with a full table
+scan instead of an index. Only the plans are computed: no data is needed.
+Usage: python manage.py check_query_plans [--verbose-plans]
+"""
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from apps.livreurs.spatial_index import waiting_pickups
+from apps.orders.models import Commande
+from apps.orders.pagination import CommandeKeysetPagination
+from apps.orders.queries import commande_detail_queryset, filter_commandes
+from apps.restaurants.stats import dashboard_queryset
+
+FULL_SCAN = re.compile(r'\bSCAN (?:TABLE )?orders_commande\b(?! USING)')
+
+
+def hot_queries():
+    """(label, queryset) of the Commande queries on the request paths
+
+    Built with the helpers the views call, so a change to one of them is
+    planned here as it runs; the claim UPDATE (transition_ids) is planned
+    through the equivalent SELECT.
+    """
+    now = timezone.now()
+    active = ['LIVREUR_ASSIGNE', 'EN_ROUTE_COLLECTE', 'COLLECTEE', 'EN_LIVRAISON']
+    # A history page with every filter and a cursor, the widest WHERE the views build
+    history_filters = {'status': ['LIVREE'], 'date_from': (now - timedelta(days=30)).date(), 'date_to': now.date()}
+    keyset = CommandeKeysetPagination()
+    position = (now, 1000)
+
+    return [
+        ('pickup index rebuild', waiting_pickups()),
+        ('claim', Commande.objects.filter(id=1, status='PRETE', livreur__isnull=True)),
+        ('livreurs/commande_active', Commande.objects.filter(livreur_id=1, status__in=active)),
+        ('livreurs/revenus', Commande.objects.filter(livreur_id=1).order_by()),
+        ('livreurs/statistiques', Commande.objects.filter(
+            livreur_id=1, status='LIVREE').order_by('-date_delivered')[:5]),
+        ('livreurs/historique', keyset.keyset_queryset(filter_commandes(
+            commande_detail_queryset().filter(livreur_id=1, status__in=['LIVREE', 'ANNULEE']), **history_filters
+        ), position)[:51]),
+        ('restaurants/orders', keyset.keyset_queryset(filter_commandes(
+            commande_detail_queryset().filter(restaurant_id=1), **history_filters
+        ), position)[:21]),
+        ('restaurants/recent_orders', commande_detail_queryset().filter(
+            restaurant_id=1).order_by('-date_created')[:10]),
+        ('restaurants/dashboard', dashboard_queryset(1, now - timedelta(days=7))),
+        ('orders/commandes (client)', commande_detail_queryset().filter(client_id=1)),
+        ('payments/webhook', Commande.objects.filter(campay_reference='REF')),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Fail if a hot Commande query is planned as a full table scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Afficher les plans complets')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'EXPLAIN QUERY PLAN attendu sur SQLite/spatialite, base actuelle: {connection.vendor}')
+
+        failures = []
+        for label, queryset in hot_queries():
+            plan = queryset.explain()
+            if FULL_SCAN.search(plan):
+                failures.append(label)
+                self.stdout.write(self.style.ERROR(f'{label:<32} SCAN complet'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{label:<32} index'))
+            if options['verbose_plans'] or FULL_SCAN.search(plan):
+                for line in plan.splitlines():
+                    self.stdout.write(f'    {line}')
+
+        if failures:
+            raise CommandError(f"Parcours complet de orders_commande: {', '.join(failures)}")
@@ -0,0 +1,21 @@
+"""
+Rebuild the full-text search index (apps.search.index) from the database.
+
+Signals keep the index in sync with single saves and deletes; bulk_create,
+queryset.update() and raw imports bypass them. Run this command after
+such writes, or to repair drift.
+Usage: python manage.py rebuild_search_index
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.search.index import search_index
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = search_index.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{count} documents indexés'))
@@ -0,0 +1,133 @@
+"""
+Rebuild the StatistiquesLivreur rollups and Livreur totals from order history.
+
+The rollups are normally maintained incrementally on each delivery; this
+command recomputes them from the LIVREE orders with one grouped query and
+writes them back in bulk. Run it after a data import or to repair drift.
+
+The traces of a stacked lot all start at the claim, so each one holds the
+cumulative distance up to its own drop-off. As in finish_trace, a lot
+order is only credited with the distance ridden since the previous
+drop-off: the longest trace of the lot orders delivered before it is
+subtracted.
+Usage: python manage.py rebuild_statistiques_livreur [--dry-run]
+"""
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, DecimalField, Q, Sum
+from django.db.models.functions import Coalesce, NullIf
+from django.utils import timezone
+
+from apps.geolocation.models import TrajetLivraison
+from apps.livreurs.models import Livreur, StatistiquesLivreur
+from apps.livreurs.rollups import DAY_FIELDS, MONTH_FIELDS, WEEK_FIELDS, month_start, week_start
+from apps.livreurs.stacking import bundle_commande_ids
+from apps.orders.models import Commande
+
+ZERO = Decimal('0')
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les statistiques des livreurs à partir de l'historique des commandes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Simuler sans enregistrer les modifications',
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        starts = {'today': today, 'week': week_start(today), 'month': month_start(today)}
+        windows = {window: Q(date_delivered__date__gte=start) for window, start in starts.items()}
+        # Traced distance when the trip was recorded, estimated distance otherwise
+        distance = Coalesce(
+            NullIf('trajet__distance_km', ZERO), 'distance_km',
+            output_field=DecimalField(max_digits=10, decimal_places=2)
+        )
+
+        aggregates = {
+            'delivery_count': Count('id'),
+            'total_earnings': Sum('livreur_earnings'),
+        }
+        for window, condition in windows.items():
+            aggregates[f'deliveries_{window}'] = Count('id', filter=condition)
+            aggregates[f'earnings_{window}'] = Sum('livreur_earnings', filter=condition)
+            aggregates[f'distance_{window}_km'] = Sum(distance, filter=condition)
+
+        rows = {
+            row['livreur']: row
+            for row in Commande.objects.filter(status='LIVREE', livreur__isnull=False)
+            .values('livreur')
+            .annotate(**aggregates)
+            .order_by()
+        }
+        self.stdout.write(f'{len(rows)} livreurs avec des livraisons.')
+
+        overlaps = self.lot_overlaps()
+        for livreur_id, delivered_on, overlap in overlaps:
+            row = rows[livreur_id]
+            for window, start in starts.items():
+                if delivered_on >= start:
+                    row[f'distance_{window}_km'] -= overlap
+        self.stdout.write(f'{len(overlaps)} livraisons groupées corrigées de la distance déjà comptée.')
+
+        rollup_fields = list(DAY_FIELDS) + list(WEEK_FIELDS) + list(MONTH_FIELDS)
+        existing = {stats.livreur_id: stats for stats in StatistiquesLivreur.objects.all()}
+        to_update, to_create = [], []
+        livreurs = list(Livreur.objects.only('id', 'delivery_count', 'total_earnings'))
+
+        for livreur in livreurs:
+            row = rows.get(livreur.id, {})
+            livreur.delivery_count = row.get('delivery_count') or 0
+            livreur.total_earnings = row.get('total_earnings') or ZERO
+
+            stats = existing.get(livreur.id)
+            if stats is None:
+                stats = StatistiquesLivreur(livreur=livreur)
+                to_create.append(stats)
+            else:
+                to_update.append(stats)
+            stats.date = today
+            for field in rollup_fields:
+                setattr(stats, field, row.get(field) or 0)
+
+        if options['dry_run']:
+            self.stdout.write('DRY RUN - Aucune modification enregistrée.')
+            return
+
+        with transaction.atomic():
+            Livreur.objects.bulk_update(livreurs, ['delivery_count', 'total_earnings'], batch_size=500)
+            StatistiquesLivreur.objects.bulk_update(to_update, ['date'] + rollup_fields, batch_size=500)
+            StatistiquesLivreur.objects.bulk_create(to_create, batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Succès! {len(to_update)} statistiques mises à jour, {len(to_create)} créées.'
+        ))
+
+    def lot_overlaps(self):
+        """(livreur_id, delivery day, km already credited to an earlier drop-off) for each traced lot order"""
+        trajets = list(
+            TrajetLivraison.objects.filter(commande__status='LIVREE', date_end__isnull=False)
+            .exclude(stops=[])
+            .values_list(
+                'commande_id', 'commande__livreur_id', 'commande__date_delivered', 'distance_km', 'date_end', 'stops'
+            )
+        )
+        ends = {commande_id: (distance, date_end) for commande_id, _, _, distance, date_end, _ in trajets}
+
+        overlaps = []
+        for commande_id, livreur_id, date_delivered, distance, date_end, stops in trajets:
+            # An untraced order was counted with its estimated distance, which is per leg already
+            if not distance or livreur_id is None or date_delivered is None:
+                continue
+            earlier = [
+                ends[other][0] for other in bundle_commande_ids(stops)
+                if other != commande_id and other in ends and ends[other][1] < date_end
+            ]
+            if earlier:
+                overlaps.append((livreur_id, timezone.localdate(date_delivered), min(distance, max(earlier))))
+        return overlaps
@@ -0,0 +1,98 @@
+"""
+Concurrency stress test for accepter_commande's claim engine.
+
+Many threads (one livreur each) race to claim the same set of PRETE
+orders. The command checks that every order ends up assigned exactly once,
+to the thread that won it, and reports claim throughput.
+
+The fixtures are committed because every thread uses its own database
+connection; they are deleted at the end.
+Usage: python manage.py stress_claims --threads 16 --orders 200
+"""
+import random
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from apps.core.benchmarks import make_commandes, make_livreurs, make_restaurants, make_users
+
+
+class Command(BaseCommand):
+    help = 'Stress-test concurrent order claims and verify exactly-once assignment'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--orders', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        from apps.livreurs.claims import claim_commande
+        from apps.orders.models import Commande
+        from apps.users.models import User
+
+        rng = random.Random(options['seed'])
+        client = make_users('bench-client-', 1, 'CLIENT')[0]
+        restaurants = make_restaurants(5, rng=rng)
+        livreurs = make_livreurs(options['threads'], rng=rng)
+        commande_ids = [cmd.id for cmd in make_commandes(options['orders'], client, restaurants, rng=rng)]
+
+        wins = {livreur.id: [] for livreur in livreurs}
+        errors = Counter()
+        barrier = threading.Barrier(len(livreurs))
+
+        def worker(livreur):
+            order = commande_ids[:]
+            random.Random(livreur.id).shuffle(order)
+            try:
+                barrier.wait()
+                for commande_id in order:
+                    try:
+                        if claim_commande(commande_id, livreur):
+                            wins[livreur.id].append(commande_id)
+                    except OperationalError as e:
+                        errors[str(e)] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(livreur,)) for livreur in livreurs]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        try:
+            claimed = Counter(commande_id for ids in wins.values() for commande_id in ids)
+            assigned = dict(Commande.objects.filter(id__in=commande_ids).values_list('id', 'livreur_id'))
+            winners = {commande_id: livreur_id for livreur_id, ids in wins.items() for commande_id in ids}
+
+            double_claims = [commande_id for commande_id, count in claimed.items() if count > 1]
+            wrong_owner = [
+                commande_id for commande_id, livreur_id in winners.items()
+                if assigned.get(commande_id) != livreur_id
+            ]
+            unclaimed = [commande_id for commande_id in commande_ids if commande_id not in claimed]
+            attempts = len(livreurs) * len(commande_ids)
+
+            self.stdout.write(
+                f'{len(livreurs)} threads x {len(commande_ids)} commandes = {attempts} tentatives '
+                f'en {elapsed:.2f}s ({attempts / elapsed:.0f} tentatives/s, {len(claimed) / elapsed:.0f} attributions/s)'
+            )
+            for message, count in errors.items():
+                self.stdout.write(self.style.WARNING(f'{count} x {message}'))
+        finally:
+            Commande.objects.filter(id__in=commande_ids).delete()
+            User.objects.filter(email__endswith='@bench.quickdeliver.cm').delete()
+
+        if double_claims or wrong_owner:
+            raise CommandError(
+                f'Attribution multiple: {len(double_claims)} commandes, '
+                f'livreur incohérent: {len(wrong_owner)} commandes'
+            )
+        if unclaimed and not errors:
+            raise CommandError(f'{len(unclaimed)} commandes jamais attribuées')
+        self.stdout.write(self.style.SUCCESS('Chaque commande a été attribuée exactement une fois'))
@@ -0,0 +1,136 @@
+"""
+Retry storm against the Idempotency-Key endpoints.
+
+For each of --requests logical requests, --threads threads send the same
+POST with the same Idempotency-Key at the same instant, as a phone on a
+bad connection retrying. This happens on /api/orders/commandes/ (Mobile
+Money order) and on /api/payments/initiate-collect/. CamPay's
+init_collect is replaced for the run by a counter that answers after
+--latency seconds, so no USSD prompt is really sent and duplicates
+overlap the first request. The command checks that every key produced
+exactly one order and one init_collect call, and that every retry got
+the first answer. It also reports requests per second and replays.
+
+The fixtures are committed because every thread uses its own database
+connection; they are deleted at the end.
+Usage: python manage.py stress_idempotency --threads 16 --requests 20
+"""
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.core.benchmarks import make_produits, make_restaurants, make_users
+
+
+class Command(BaseCommand):
+    help = 'Retry-storm the idempotent endpoints and verify each request runs once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=20)
+        parser.add_argument('--latency', type=float, default=0.3)
+        parser.add_argument('--seed', type=int, default=25)
+
+    def handle(self, *args, **options):
+        from apps.core.models import IdempotencyKey
+        from apps.orders.models import Commande
+        from apps.payments.services import payment_service
+        from apps.users.models import User
+
+        rng = random.Random(options['seed'])
+        started = timezone.now()
+        client = make_users('bench-client-', 1, 'CLIENT')[0]
+        restaurant = make_restaurants(1, rng=rng)[0]
+        produit = make_produits([restaurant], per_restaurant=1)[0]
+
+        collects = Counter()
+        lock = threading.Lock()
+
+        def init_collect(amount, phone, description='Payment', external_reference=''):
+            with lock:
+                collects[external_reference or description] += 1
+            time.sleep(options['latency'])
+            return {
+                'success': True, 'status': 'PENDING', 'reference': uuid.uuid4().hex,
+                'operator': 'MTN', 'ussd_code': '*126#', 'amount': amount,
+            }
+
+        endpoints = {
+            'commande': ('/api/orders/commandes/', {
+                'restaurant': restaurant.id,
+                'delivery_address_text': 'Bastos, Yaoundé',
+                'payment_mode': 'MOBILE_MONEY',
+                'payment_phone': '677123456',
+                'delivery_fee': '500',
+                'total_amount': '1750',
+                'items': [{'produit': produit.id, 'quantity': 1}],
+            }),
+            'paiement': ('/api/payments/initiate-collect/', {
+                'amount': '1750', 'phone': '677123456', 'description': 'Commande bench',
+            }),
+        }
+        rounds = [(name, f'storm-{name}-{i}') for i in range(options['requests']) for name in endpoints]
+        answers = defaultdict(list)
+        barrier = threading.Barrier(options['threads'])
+
+        def worker():
+            api = APIClient()
+            api.force_authenticate(client)
+            try:
+                for name, key in rounds:
+                    url, payload = endpoints[name]
+                    if name == 'paiement':
+                        payload = {**payload, 'external_reference': key}
+                    barrier.wait()
+                    response = api.post(url, payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+                    body = response.json()
+                    with lock:
+                        answers[key].append((
+                            response.status_code, body.get('id') or body.get('reference'),
+                            response.get('Idempotent-Replayed') == 'true',
+                        ))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        start = time.perf_counter()
+        with mock.patch.object(payment_service, 'init_collect', init_collect):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - start
+
+        try:
+            orders = Commande.objects.filter(client=client).count()
+            statuses = Counter(code for replies in answers.values() for code, _, _ in replies)
+            replays = sum(replayed for replies in answers.values() for _, _, replayed in replies)
+            divergent = [key for key, replies in answers.items() if len({reply[:2] for reply in replies}) > 1]
+            sent = sum(len(replies) for replies in answers.values())
+
+            self.stdout.write(
+                f"{len(rounds)} clés x {options['threads']} envois = {sent} requêtes en {elapsed:.2f}s "
+                f"({sent / elapsed:.0f} requêtes/s), {replays} réponses rejouées, statuts: {dict(statuses)}"
+            )
+            self.stdout.write(
+                f"{orders} commandes créées, {sum(collects.values())} appels init_collect "
+                f"pour {len(rounds)} requêtes logiques"
+            )
+        finally:
+            Commande.objects.filter(client=client).delete()
+            IdempotencyKey.objects.filter(date_created__gte=started).delete()
+            User.objects.filter(email__endswith='@bench.quickdeliver.cm').delete()
+
+        if orders != options['requests'] or sum(collects.values()) != len(rounds):
+            raise CommandError('Une requête rejouée a été exécutée plusieurs fois')
+        if divergent:
+            raise CommandError(f'{len(divergent)} clés ont reçu des réponses différentes')
+        self.stdout.write(self.style.SUCCESS('Chaque requête a été exécutée une seule fois'))
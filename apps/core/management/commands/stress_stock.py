@@ -0,0 +1,133 @@
+"""
+Concurrency stress test for stock reservation (apps.products.stock).
+
+Many threads (one client each) place orders through
+CommandeCreateSerializer for a few products with a small stock, as during
+a promotion, until every one of them is sold out. The command checks that
+no stock went negative, that the units taken out of each product equal
+the quantities of the orders that were accepted, and that cancelling
+those orders (the annuler transition) puts the stock back; it reports reservation throughput.
+
+The fixtures are committed because every thread uses its own database
+connection; they are deleted at the end.
+Usage: python manage.py stress_stock --threads 16 --products 5 --stock 100
+"""
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from rest_framework.exceptions import ValidationError
+
+from apps.core.benchmarks import make_produits, make_restaurants, make_users
+
+
+class Command(BaseCommand):
+    help = 'Stress-test concurrent stock reservations and verify that nothing is oversold'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--products', type=int, default=5)
+        parser.add_argument('--stock', type=int, default=100)
+        parser.add_argument('--max-quantity', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=22)
+
+    def handle(self, *args, **options):
+        from apps.orders.models import Commande, LigneCommande
+        from apps.orders.serializers import CommandeCreateSerializer
+        from apps.orders.transitions import apply_transition
+        from apps.products.models import Produit
+        from apps.users.models import User
+
+        rng = random.Random(options['seed'])
+        clients = make_users('bench-client-', options['threads'], 'CLIENT')
+        restaurant = make_restaurants(1, rng=rng)[0]
+        produit_ids = [produit.id for produit in make_produits([restaurant], per_restaurant=options['products'])]
+        Produit.objects.filter(id__in=produit_ids).update(stock=options['stock'])
+        initial = options['stock'] * len(produit_ids)
+
+        accepted = defaultdict(list)
+        outcomes = Counter()
+        errors = Counter()
+        barrier = threading.Barrier(len(clients))
+
+        def worker(client):
+            worker_rng = random.Random(client.id)
+            sold_out = set()
+            try:
+                barrier.wait()
+                while len(sold_out) < len(produit_ids):
+                    produit_id = worker_rng.choice([i for i in produit_ids if i not in sold_out])
+                    serializer = CommandeCreateSerializer(data={
+                        'restaurant': restaurant.id,
+                        'delivery_address_text': 'Bastos, Yaoundé',
+                        'payment_mode': 'ESPECES',
+                        'items': [{'produit': produit_id, 'quantity': worker_rng.randint(1, options['max_quantity'])}],
+                    })
+                    try:
+                        if serializer.is_valid():
+                            commande = serializer.save(client=client)
+                            accepted[client.id].append(commande.id)
+                            outcomes['acceptées'] += 1
+                            continue
+                        outcomes['refusées'] += 1
+                    except OperationalError as e:
+                        errors[str(e)] += 1
+                        continue
+                    except ValidationError:
+                        # Lost the race in reserve_stock: the order was rolled back
+                        outcomes['refusées'] += 1
+                    if not Produit.objects.filter(pk=produit_id, stock__gt=0).exists():
+                        sold_out.add(produit_id)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(client,)) for client in clients]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        commande_ids = [commande_id for ids in accepted.values() for commande_id in ids]
+        try:
+            stock = dict(Produit.objects.filter(id__in=produit_ids).values_list('id', 'stock'))
+            ordered = dict(
+                LigneCommande.objects.filter(commande_id__in=commande_ids)
+                .values_list('produit_id').annotate(total=Sum('quantity'))
+            )
+            negative = [produit_id for produit_id, units in stock.items() if units < 0]
+            mismatched = [
+                produit_id for produit_id in produit_ids
+                if options['stock'] - stock[produit_id] != ordered.get(produit_id, 0)
+            ]
+            attempts = outcomes['acceptées'] + outcomes['refusées']
+
+            self.stdout.write(
+                f"{len(clients)} threads, {len(produit_ids)} produits x {options['stock']} unités: "
+                f"{attempts} commandes en {elapsed:.2f}s ({attempts / elapsed:.0f} commandes/s), "
+                f"{outcomes['acceptées']} acceptées, {outcomes['refusées']} refusées, "
+                f"{sum(ordered.values())}/{initial} unités vendues"
+            )
+            for message, count in errors.items():
+                self.stdout.write(self.style.WARNING(f'{count} x {message}'))
+
+            for commande in Commande.objects.filter(id__in=commande_ids):
+                apply_transition(commande, 'annuler', cancellation_reason='stress_stock')
+            restored = Produit.objects.filter(id__in=produit_ids).aggregate(total=Sum('stock'))['total']
+        finally:
+            Commande.objects.filter(id__in=commande_ids).delete()
+            User.objects.filter(email__endswith='@bench.quickdeliver.cm').delete()
+
+        if negative or mismatched:
+            raise CommandError(
+                f'Stock négatif: {len(negative)} produits, '
+                f'stock incohérent avec les commandes: {len(mismatched)} produits'
+            )
+        if restored != initial:
+            raise CommandError(f'Stock après annulation: {restored} unités au lieu de {initial}')
+        self.stdout.write(self.style.SUCCESS('Aucune survente; le stock est rendu après annulation'))
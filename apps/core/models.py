@@ -0,0 +1,17 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+class IdempotencyKey(models.Model):
+    """Response of a request sent with an Idempotency-Key (apps.core.idempotency, 'db' store)"""
+    # sha256 of (scope, user, client key)
+    key = models.CharField(max_length=64, primary_key=True)
+    fingerprint = models.CharField(max_length=64)
+    token = models.CharField(max_length=32)
+    # NULL while the first request is in flight
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    expires_at = models.DateTimeField(db_index=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return self.key
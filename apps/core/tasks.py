@@ -0,0 +1,9 @@
+from celery import shared_task
+
+from apps.core.idempotency import purge_expired
+
+
+@shared_task
+def purge_idempotency_keys():
+    """Delete Idempotency-Key answers past IDEMPOTENCY_TTL_SECONDS"""
+    return purge_expired()
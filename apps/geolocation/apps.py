@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+class GeolocationConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.geolocation'
+    
+    def ready(self):
+        from django.core import checks
+
+        import apps.geolocation.signals
+        from apps.geolocation.checks import check_routing_graph
+
+        checks.register(check_routing_graph)
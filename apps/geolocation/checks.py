@@ -0,0 +1,24 @@
+"""
+System checks of the geolocation app.
+
+Without its road graph the routing engine silently falls back to the
+straight-line estimate for every route. Where ROUTING_REQUIRE_GRAPH is
+set (production), a missing or unreadable ROUTING_GRAPH_FILE is an
+error: ``manage.py check``, ``migrate`` and the Celery workers
+(celeryconfig.py) refuse to start until ``build_routing_graph`` has
+been run.
+"""
+from django.conf import settings
+from django.core.checks import Error, Warning
+
+
+def check_routing_graph(app_configs=None, **kwargs):
+    from apps.geolocation.routing import routing_engine
+
+    if routing_engine.graph is not None:
+        return []
+    message = f"Road graph not loaded from {routing_engine.graph_file}; routes fall back to the straight-line estimate."
+    hint = 'Build it from an OpenStreetMap extract: python manage.py build_routing_graph yaounde.osm.bz2'
+    if getattr(settings, 'ROUTING_REQUIRE_GRAPH', False):
+        return [Error(message, hint=hint, id='geolocation.E001')]
+    return [Warning(message, hint=hint, id='geolocation.W001')]
@@ -0,0 +1,144 @@
+"""
+Batch distance computations with NumPy.
+
+``distance_matrix(origins, destinations)`` returns the N x M matrix of
+distances in kilometers between two lists of (lat, lon) points in one
+vectorized pass, instead of one geopy ``geodesic`` call per pair:
+
+- ``haversine``: great-circle distance on a sphere of radius
+  EARTH_RADIUS_KM. Within ~0.5% of the ellipsoidal distance, which is far
+  below the precision of a courier GPS fix; used by the list serializers.
+- ``vincenty``: inverse Vincenty formula on the WGS-84 ellipsoid, iterated
+  on every pair at once. Pairs that do not converge (nearly antipodal
+  points, never the case within a city) fall back to haversine.
+
+``haversine_km`` is the scalar great-circle distance of one pair, for the
+callers that handle points one at a time (spatial indexes, GPS traces).
+"""
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+METHODS = ('haversine', 'vincenty')
+
+# WGS-84 ellipsoid
+WGS84_A_KM = 6378.137
+WGS84_F = 1 / 298.257223563
+WGS84_B_KM = WGS84_A_KM * (1 - WGS84_F)
+
+VINCENTY_MAX_ITERATIONS = 200
+VINCENTY_TOLERANCE = 1e-12
+
+# calculate_route estimate: average urban speed plus a fixed pickup margin
+AVG_SPEED_KMH = 30
+FIXED_MINUTES = 5
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometers"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def as_points(points):
+    """(N, 2) float array of (lat, lon) degrees"""
+    return np.asarray(points, dtype=float).reshape(-1, 2)
+
+
+def haversine_matrix(origins, destinations):
+    origins, destinations = as_points(origins), as_points(destinations)
+    lat1 = np.radians(origins[:, 0])[:, None]
+    lon1 = np.radians(origins[:, 1])[:, None]
+    lat2 = np.radians(destinations[:, 0])[None, :]
+    lon2 = np.radians(destinations[:, 1])[None, :]
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def vincenty_matrix(origins, destinations):
+    origins, destinations = as_points(origins), as_points(destinations)
+    shape = (len(origins), len(destinations))
+    f, a, b = WGS84_F, WGS84_A_KM, WGS84_B_KM
+
+    # Every pair as one flat array; each iteration only updates the pairs still moving
+    u1 = np.arctan((1 - f) * np.tan(np.radians(origins[:, 0])))[:, None]
+    u2 = np.arctan((1 - f) * np.tan(np.radians(destinations[:, 0])))[None, :]
+    sin_u1, cos_u1 = (np.broadcast_to(v, shape).ravel() for v in (np.sin(u1), np.cos(u1)))
+    sin_u2, cos_u2 = (np.broadcast_to(v, shape).ravel() for v in (np.sin(u2), np.cos(u2)))
+    big_l = (np.radians(destinations[:, 1])[None, :] - np.radians(origins[:, 1])[:, None]).ravel()
+
+    lam = big_l.copy()
+    sin_sigma, cos_sigma, sigma = np.zeros_like(lam), np.ones_like(lam), np.zeros_like(lam)
+    cos2_alpha, cos_2sigma_m = np.ones_like(lam), np.zeros_like(lam)
+    active = np.arange(lam.size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(VINCENTY_MAX_ITERATIONS):
+            s1, c1, s2, c2 = sin_u1[active], cos_u1[active], sin_u2[active], cos_u2[active]
+            sin_lam, cos_lam = np.sin(lam[active]), np.cos(lam[active])
+            sin_s = np.hypot(c2 * sin_lam, c1 * s2 - s1 * c2 * cos_lam)
+            cos_s = s1 * s2 + c1 * c2 * cos_lam
+            sig = np.arctan2(sin_s, cos_s)
+            sin_alpha = np.where(sin_s == 0, 0.0, c1 * c2 * sin_lam / sin_s)
+            c2a = 1 - sin_alpha ** 2
+            # Equatorial lines: cos2_alpha == 0 and the term is unused
+            c2sm = np.where(c2a == 0, 0.0, cos_s - 2 * s1 * s2 / c2a)
+            c = f / 16 * c2a * (4 + f * (4 - 3 * c2a))
+            new_lam = big_l[active] + (1 - c) * f * sin_alpha * (
+                sig + c * sin_s * (c2sm + c * cos_s * (-1 + 2 * c2sm ** 2))
+            )
+            sin_sigma[active], cos_sigma[active], sigma[active] = sin_s, cos_s, sig
+            cos2_alpha[active], cos_2sigma_m[active] = c2a, c2sm
+            moving = ~(np.abs(new_lam - lam[active]) < VINCENTY_TOLERANCE)
+            lam[active] = new_lam
+            active = active[moving]
+            if not active.size:
+                break
+
+        u_sq = cos2_alpha * (a ** 2 - b ** 2) / b ** 2
+        big_a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+        big_b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+        delta_sigma = big_b * sin_sigma * (cos_2sigma_m + big_b / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+            - big_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+        ))
+        distances = (b * big_a * (sigma - delta_sigma)).reshape(shape)
+
+    fallback = ~np.isfinite(distances)
+    fallback.ravel()[active] = True
+    if fallback.any():
+        distances = np.where(fallback, haversine_matrix(origins, destinations), distances)
+    return distances
+
+
+def distance_matrix(origins, destinations, method='haversine'):
+    """N x M distances in kilometers between (lat, lon) origins and destinations"""
+    if method not in METHODS:
+        raise ValueError(f'Unknown distance method: {method}')
+    if len(origins) == 0 or len(destinations) == 0:
+        return np.zeros((len(origins), len(destinations)))
+    if method == 'vincenty':
+        return vincenty_matrix(origins, destinations)
+    return haversine_matrix(origins, destinations)
+
+
+def estimated_minutes(distances_km):
+    """Same travel-time estimate as calculate_route, for a whole matrix"""
+    return (np.asarray(distances_km) / AVG_SPEED_KMH * 60).astype(int) + FIXED_MINUTES
+
+
+def distances_from(origin, objects, method='haversine'):
+    """{obj.id: km rounded to 2 decimals} from (lat, lon) origin to objects with latitude/longitude"""
+    located = [obj for obj in objects if obj.latitude is not None and obj.longitude is not None]
+    if origin is None or not located:
+        return {}
+    row = distance_matrix(
+        [origin], [(float(obj.latitude), float(obj.longitude)) for obj in located], method
+    )[0]
+    return {obj.id: round(float(km), 2) for obj, km in zip(located, row)}
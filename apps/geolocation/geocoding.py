@@ -0,0 +1,329 @@
+"""
+Geocoding with a persistent cache and an offline Yaoundé gazetteer.
+
+Lookups go through, in order:
+1. an in-process LRU;
+2. the CacheGeocodage table, keyed by the normalized address or by the
+   coordinates rounded to GEOCODING_REVERSE_PRECISION decimals;
+3. the gazetteer, for an exact known address or a query that only names a
+   quartier;
+4. Nominatim. Its answers (including "not found") are stored in the
+   table. "Not found" answers expire after GEOCODING_NEGATIVE_TTL_HOURS,
+   in the table and in the LRU alike. When it fails or rate-limits us, a quartier named in the address
+   (or the nearest quartier, for reverse lookups) is returned as an
+   approximate result.
+
+Batch callers can ask for the local layers only (``remote=False``): an
+address that only Nominatim could answer then returns NOT_CACHED, so a
+request checking hundreds of addresses spends a bounded number of
+remote calls.
+
+The gazetteer is built from ZoneLivraison.neighborhoods (plain names
+placed at the zone centroid, or {"name", "latitude", "longitude"}
+objects) and from the addresses of the Yaoundé seed file. Each layer
+counts its hits; ``geocoding_service.stats()`` reports the hit rates.
+"""
+import json
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from geopy.exc import GeopyError
+from geopy.geocoders import Nominatim
+
+from apps.geolocation.distances import haversine_km
+
+logger = logging.getLogger(__name__)
+
+STOP_WORDS = {'yaounde', 'cameroun', 'cameroon', 'quartier'}
+# Address parts starting with these words name a street or a landmark, not a quartier
+STREET_WORDS = {'rue', 'avenue', 'route', 'boulevard', 'carrefour', 'place', 'face', 'immeuble', 'villa', 'hotel'}
+
+# Returned by geocode(..., remote=False) when only Nominatim could answer
+NOT_CACHED = object()
+
+
+def normalize_address(address):
+    """Lowercase, accent-free, punctuation-free address with city/country words removed"""
+    text = unicodedata.normalize('NFKD', address or '').encode('ascii', 'ignore').decode().lower()
+    words = re.sub(r'[^a-z0-9]+', ' ', text).split()
+    return ' '.join(word for word in words if word not in STOP_WORDS)
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class Gazetteer:
+    """Known Yaoundé places: exact addresses and quartier names with a position"""
+
+    def __init__(self):
+        self.addresses = {}
+        self.quartiers = {}
+
+    def add_address(self, address, latitude, longitude):
+        key = normalize_address(address)
+        if key:
+            self.addresses[key] = {'latitude': latitude, 'longitude': longitude, 'address': address}
+
+    def add_quartier(self, name, latitude, longitude):
+        key = normalize_address(name)
+        if key:
+            self.quartiers.setdefault(key, {'name': name.strip(), 'points': []})['points'].append((latitude, longitude))
+
+    def _quartier_result(self, key):
+        entry = self.quartiers[key]
+        points = entry['points']
+        return {
+            'latitude': sum(lat for lat, _ in points) / len(points),
+            'longitude': sum(lon for _, lon in points) / len(points),
+            'address': f"{entry['name']}, Yaoundé",
+        }
+
+    def lookup(self, key):
+        """Exact address, or a query that is only a quartier name"""
+        if key in self.addresses:
+            return self.addresses[key]
+        if key in self.quartiers:
+            return self._quartier_result(key)
+        return None
+
+    def quartier_in(self, key):
+        """Longest quartier name contained in the query, as an approximate result"""
+        padded = f' {key} '
+        matches = [name for name in self.quartiers if f' {name} ' in padded]
+        return self._quartier_result(max(matches, key=len)) if matches else None
+
+    def nearest_quartier(self, latitude, longitude, max_km=2.0):
+        best = None
+        for key in self.quartiers:
+            result = self._quartier_result(key)
+            distance = haversine_km(latitude, longitude, result['latitude'], result['longitude'])
+            if distance <= max_km and (best is None or distance < best[0]):
+                best = (distance, result)
+        return best[1] if best else None
+
+    @classmethod
+    def build(cls, seed_file=None):
+        from apps.geolocation.models import ZoneLivraison
+
+        gazetteer = cls()
+        for zone in ZoneLivraison.objects.filter(is_active=True):
+            centroid = zone.polygon.centroid if zone.polygon else None
+            for neighborhood in zone.neighborhoods or []:
+                if isinstance(neighborhood, dict) and neighborhood.get('latitude') is not None:
+                    gazetteer.add_quartier(
+                        neighborhood.get('name', ''),
+                        float(neighborhood['latitude']), float(neighborhood['longitude'])
+                    )
+                elif isinstance(neighborhood, str) and centroid is not None:
+                    gazetteer.add_quartier(neighborhood, centroid.y, centroid.x)
+
+        seed_file = Path(seed_file or getattr(
+            settings, 'GEOCODING_SEED_FILE', settings.BASE_DIR / 'restaurants_yaounde_seed.json'
+        ))
+        try:
+            seed = json.loads(seed_file.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            logger.warning(f"[GEOCODING] Seed file not loaded ({seed_file}): {e}")
+            seed = {}
+        for restaurant in seed.get('restaurants', []):
+            fields = restaurant.get('fields', {})
+            address = fields.get('full_address') or ''
+            if not address or not fields.get('latitude') or not fields.get('longitude'):
+                continue
+            latitude, longitude = float(fields['latitude']), float(fields['longitude'])
+            gazetteer.add_address(address, latitude, longitude)
+            # "..., <quartier>, Yaounde": the part before the city names the quartier
+            parts = [part.strip() for part in address.split(',') if part.strip()]
+            if len(parts) >= 2 and normalize_address(parts[-1]) == '':
+                quartier = normalize_address(parts[-2])
+                if quartier and quartier.split()[0] not in STREET_WORDS:
+                    gazetteer.add_quartier(parts[-2], latitude, longitude)
+
+        logger.info(
+            f"[GEOCODING] Gazetteer: {len(gazetteer.addresses)} adresses, {len(gazetteer.quartiers)} quartiers"
+        )
+        return gazetteer
+
+
+class GeocodingService:
+    def __init__(self, remote=None):
+        self.remote = remote or Nominatim(
+            user_agent='quickdeliver', timeout=getattr(settings, 'GEOCODING_TIMEOUT_SECONDS', 5)
+        )
+        self.lru = LRUCache(getattr(settings, 'GEOCODING_LRU_SIZE', 2048))
+        self.precision = getattr(settings, 'GEOCODING_REVERSE_PRECISION', 4)
+        self.negative_ttl = timedelta(hours=getattr(settings, 'GEOCODING_NEGATIVE_TTL_HOURS', 24))
+        self.counters = Counter()
+        self._gazetteer = None
+        self._lock = threading.Lock()
+
+    @property
+    def gazetteer(self):
+        if self._gazetteer is None:
+            with self._lock:
+                if self._gazetteer is None:
+                    self._gazetteer = Gazetteer.build()
+        return self._gazetteer
+
+    def reload_gazetteer(self):
+        self._gazetteer = None
+        self.lru.clear()
+
+    def geocode(self, address, remote=True):
+        """Return {'latitude', 'longitude', 'address', 'source'} or None
+
+        With remote=False Nominatim is not called, and NOT_CACHED is returned
+        when no local layer knows the address.
+        """
+        key = normalize_address(address)
+        if not key:
+            return None
+        return self._resolve('ADRESSE', key, (lambda: self._geocode_remote(address, key)) if remote else None)
+
+    def reverse(self, latitude, longitude):
+        """Return {'latitude', 'longitude', 'address', 'source'} or None"""
+        latitude, longitude = float(latitude), float(longitude)
+        key = f'{latitude:.{self.precision}f},{longitude:.{self.precision}f}'
+        return self._resolve('INVERSE', key, lambda: self._reverse_remote(latitude, longitude))
+
+    def _resolve(self, lookup_type, key, fetch):
+        from apps.geolocation.models import CacheGeocodage
+
+        self.counters['requests'] += 1
+        lru_key = (lookup_type, key)
+        cached = self.lru.get(lru_key)
+        # A "not found" is cached as {'missing_until': <monotonic time>}
+        if cached is not None and cached.get('missing_until', math.inf) > time.monotonic():
+            self.counters['lru_hits'] += 1
+            return None if 'missing_until' in cached else cached
+
+        entry = CacheGeocodage.objects.filter(lookup_type=lookup_type, key=key).first()
+        if entry is not None and (entry.found or timezone.now() - entry.date_updated < self.negative_ttl):
+            self.counters['db_hits'] += 1
+            CacheGeocodage.objects.filter(pk=entry.pk).update(hit_count=F('hit_count') + 1)
+            if not entry.found:
+                self._remember_missing(lru_key, self.negative_ttl - (timezone.now() - entry.date_updated))
+                return None
+            result = self._entry_result(entry)
+            self.lru.set(lru_key, result)
+            return result
+
+        if lookup_type == 'ADRESSE':
+            result = self.gazetteer.lookup(key)
+            if result is not None:
+                self.counters['gazetteer_hits'] += 1
+                result = dict(result, source='gazetteer')
+                self.lru.set(lru_key, result)
+                return result
+
+        if fetch is None:
+            self.counters['remote_deferred'] += 1
+            return NOT_CACHED
+
+        try:
+            self.counters['remote_calls'] += 1
+            result = fetch()
+        except (GeopyError, OSError) as e:
+            self.counters['remote_errors'] += 1
+            logger.warning(f"[GEOCODING] Nominatim unavailable for {lookup_type} '{key}': {e}")
+            return self._approximate(lookup_type, key)
+
+        CacheGeocodage.objects.update_or_create(
+            lookup_type=lookup_type, key=key,
+            defaults={
+                'found': result is not None,
+                'latitude': round(result['latitude'], 6) if result else None,
+                'longitude': round(result['longitude'], 6) if result else None,
+                'address': result['address'] if result else '',
+                'source': 'nominatim',
+            }
+        )
+        if result is None:
+            self._remember_missing(lru_key, self.negative_ttl)
+        else:
+            self.lru.set(lru_key, result)
+        return result
+
+    def _remember_missing(self, lru_key, ttl):
+        self.lru.set(lru_key, {'missing_until': time.monotonic() + ttl.total_seconds()})
+
+    def _approximate(self, lookup_type, key):
+        if lookup_type == 'ADRESSE':
+            result = self.gazetteer.quartier_in(key)
+        else:
+            latitude, longitude = (float(value) for value in key.split(','))
+            result = self.gazetteer.nearest_quartier(latitude, longitude)
+        if result is None:
+            return None
+        self.counters['gazetteer_fallbacks'] += 1
+        # Not cached: the precise answer is fetched once Nominatim is back
+        return dict(result, source='gazetteer', approximate=True)
+
+    def _geocode_remote(self, address, key):
+        location = self.remote.geocode(address)
+        if location is None:
+            return None
+        return {
+            'latitude': location.latitude, 'longitude': location.longitude,
+            'address': location.address, 'source': 'nominatim',
+        }
+
+    def _reverse_remote(self, latitude, longitude):
+        location = self.remote.reverse(f'{latitude}, {longitude}')
+        if location is None:
+            return None
+        return {
+            'latitude': location.latitude, 'longitude': location.longitude,
+            'address': location.address, 'source': 'nominatim',
+        }
+
+    @staticmethod
+    def _entry_result(entry):
+        return {
+            'latitude': float(entry.latitude), 'longitude': float(entry.longitude),
+            'address': entry.address, 'source': entry.source,
+        }
+
+    def stats(self):
+        requests = self.counters['requests']
+        served_locally = self.counters['lru_hits'] + self.counters['db_hits'] + self.counters['gazetteer_hits']
+        return dict(
+            self.counters,
+            requests=requests,
+            hit_rate=round(served_locally / requests, 4) if requests else 0.0,
+        )
+
+
+geocoding_service = GeocodingService()
@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('geolocation', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheGeocodage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lookup_type', models.CharField(choices=[('ADRESSE', 'Adresse vers coordonnées'), ('INVERSE', 'Coordonnées vers adresse')], max_length=10)),
+                ('key', models.CharField(max_length=255)),
+                ('found', models.BooleanField(default=True)),
+                ('latitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True)),
+                ('address', models.TextField(blank=True)),
+                ('source', models.CharField(default='nominatim', max_length=20)),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='cachegeocodage',
+            constraint=models.UniqueConstraint(fields=('lookup_type', 'key'), name='cache_geocodage_unique_key'),
+        ),
+    ]
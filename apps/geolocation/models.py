@@ -39,3 +39,29 @@ class TrajetLivraison(models.Model):
     
     def __str__(self):
         return f"Trajet {self.commande.numero}"
+
+class CacheGeocodage(models.Model):
+    """Persistent geocoding results, keyed by normalized address or rounded coordinates"""
+    TYPE_CHOICES = (
+        ('ADRESSE', 'Adresse vers coordonnées'),
+        ('INVERSE', 'Coordonnées vers adresse'),
+    )
+    
+    lookup_type = models.CharField(max_length=10, choices=TYPE_CHOICES)
+    key = models.CharField(max_length=255)
+    found = models.BooleanField(default=True)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    address = models.TextField(blank=True)
+    source = models.CharField(max_length=20, default='nominatim')
+    hit_count = models.PositiveIntegerField(default=0)
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_updated = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['lookup_type', 'key'], name='cache_geocodage_unique_key'),
+        ]
+    
+    def __str__(self):
+        return f"{self.lookup_type} {self.key}"
@@ -0,0 +1,45 @@
+"""
+Nearest-first merchant lookups around a point, in one query.
+
+``nearby_queryset`` prefilters on the bounding box of the search circle
+(a cheap MBR comparison that can use the spatial index), computes the
+distance in the database only for the rows inside it, keeps those within
+the radius, sorts by distance and applies a LIMIT. The list serializers
+reuse the ``distance`` annotation instead of computing it again.
+"""
+import math
+
+from django.conf import settings
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import Point, Polygon
+from django.contrib.gis.measure import D
+
+from apps.geolocation.distances import KM_PER_DEGREE_LAT
+
+
+def bounding_box(lat, lon, radius_km):
+    """Polygon around the circle of radius_km centered on (lat, lon)"""
+    delta_lat = radius_km / KM_PER_DEGREE_LAT
+    delta_lon = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01))
+    bbox = Polygon.from_bbox((lon - delta_lon, lat - delta_lat, lon + delta_lon, lat + delta_lat))
+    bbox.srid = 4326
+    return bbox
+
+
+def nearby_limit(value):
+    """Validated result count for a ``limit`` query parameter (ValueError if not a number)"""
+    if value in (None, ''):
+        return getattr(settings, 'NEARBY_DEFAULT_LIMIT', 50)
+    return max(1, min(int(value), getattr(settings, 'NEARBY_MAX_LIMIT', 200)))
+
+
+def nearby_queryset(queryset, lat, lon, radius_km, limit):
+    """Objects of queryset within radius_km of (lat, lon), nearest first, annotated with distance"""
+    origin = Point(lon, lat, srid=4326)
+    return queryset.filter(
+        position__contained=bounding_box(lat, lon, radius_km)
+    ).annotate(
+        distance=Distance('position', origin)
+    ).filter(
+        distance__lte=D(km=radius_km)
+    ).order_by('distance')[:limit]
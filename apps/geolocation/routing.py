@@ -0,0 +1,211 @@
+"""
+Offline road routing for Yaoundé.
+
+The road graph is built once from an OpenStreetMap extract by the
+``build_routing_graph`` command and stored as a NumPy ``.npz`` file
+(ROUTING_GRAPH_FILE) in compressed sparse row form:
+
+- ``node_lat`` / ``node_lon``: intersections and dead ends (the shape
+  points of a street between two intersections are folded into its edge);
+- ``indptr`` / ``targets``: outgoing edges of node i are
+  ``targets[indptr[i]:indptr[i + 1]]``;
+- ``lengths_m`` / ``times_s``: length and travel time of each edge, the
+  time coming from the highway type speed (or a lower maxspeed tag).
+
+``RoutingEngine.route(start, end)`` snaps both points to the nearest
+graph node through a grid of cells, runs A* on travel time (with a
+straight-line / top speed heuristic) and caches the result by snapped
+node pair. Points farther than ROUTING_MAX_SNAP_KM from the network, an
+unreachable destination or a missing graph file fall back to the former
+straight-line estimate (AVG_SPEED_KMH plus FIXED_MINUTES); the ``source``
+key of the result tells which one was used.
+"""
+import heapq
+import logging
+import math
+import threading
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from apps.geolocation.distances import AVG_SPEED_KMH, FIXED_MINUTES, KM_PER_DEGREE_LAT, haversine_km
+from apps.geolocation.geocoding import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Free-flow speeds of a delivery motorbike by OSM highway type (km/h)
+HIGHWAY_SPEEDS_KMH = {
+    'motorway': 60, 'trunk': 50, 'primary': 40, 'secondary': 35, 'tertiary': 30,
+    'unclassified': 25, 'residential': 20, 'living_street': 10, 'service': 15,
+    'road': 20, 'track': 10,
+    'motorway_link': 40, 'trunk_link': 35, 'primary_link': 30, 'secondary_link': 25, 'tertiary_link': 25,
+}
+# Off-network legs (from the point to its snapped node)
+ACCESS_SPEED_KMH = 10
+
+
+class RoadGraph:
+    def __init__(self, node_lat, node_lon, indptr, targets, lengths_m, times_s, cell_size_deg=0.005):
+        self.node_count = len(node_lat)
+        # Plain lists: the A* loop indexes them one element at a time
+        self.node_lat = node_lat.tolist()
+        self.node_lon = node_lon.tolist()
+        self.indptr = indptr.tolist()
+        self.targets = targets.tolist()
+        self.lengths_m = lengths_m.tolist()
+        self.times_s = times_s.tolist()
+        self.max_speed_ms = max(HIGHWAY_SPEEDS_KMH.values()) / 3.6
+        self.cell_size_deg = cell_size_deg
+        self.cells = {}
+        for node, (lat, lon) in enumerate(zip(self.node_lat, self.node_lon)):
+            self.cells.setdefault(self._cell(lat, lon), []).append(node)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(
+                data['node_lat'], data['node_lon'], data['indptr'],
+                data['targets'], data['lengths_m'], data['times_s']
+            )
+
+    @staticmethod
+    def save(path, node_lat, node_lon, indptr, targets, lengths_m, times_s):
+        np.savez_compressed(
+            path,
+            node_lat=np.asarray(node_lat, dtype=np.float64),
+            node_lon=np.asarray(node_lon, dtype=np.float64),
+            indptr=np.asarray(indptr, dtype=np.int32),
+            targets=np.asarray(targets, dtype=np.int32),
+            lengths_m=np.asarray(lengths_m, dtype=np.float32),
+            times_s=np.asarray(times_s, dtype=np.float32),
+        )
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_size_deg), math.floor(lon / self.cell_size_deg))
+
+    def snap(self, lat, lon, max_km):
+        """(node, distance_km) of the nearest node within max_km, or None"""
+        ci, cj = self._cell(lat, lon)
+        cell_km = self.cell_size_deg * KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.1)
+        rings = int(max_km / cell_km) + 1
+        best = None
+        for ring in range(rings + 1):
+            for i in range(ci - ring, ci + ring + 1):
+                for j in range(cj - ring, cj + ring + 1):
+                    if max(abs(i - ci), abs(j - cj)) != ring:
+                        continue
+                    for node in self.cells.get((i, j), ()):
+                        distance = haversine_km(lat, lon, self.node_lat[node], self.node_lon[node])
+                        if best is None or distance < best[1]:
+                            best = (node, distance)
+            # Nodes of the next ring are at least `ring` cells away
+            if best is not None and best[1] <= ring * cell_km:
+                break
+        if best is None or best[1] > max_km:
+            return None
+        return best
+
+    def shortest_path(self, source, target):
+        """(length_m, time_s) of the fastest path, or None when unreachable"""
+        if source == target:
+            return 0.0, 0.0
+        node_lat, node_lon = self.node_lat, self.node_lon
+        indptr, targets, lengths, times = self.indptr, self.targets, self.lengths_m, self.times_s
+        target_lat, target_lon = node_lat[target], node_lon[target]
+        # Equirectangular distance at top speed, shrunk by 1% so that it never
+        # overestimates within a city (keeps A* exact)
+        seconds_per_degree = 0.99 * KM_PER_DEGREE_LAT * 1000 / self.max_speed_ms
+        scale_lat = seconds_per_degree
+        scale_lon = seconds_per_degree * math.cos(math.radians(target_lat))
+
+        def heuristic(node):
+            return math.hypot((node_lat[node] - target_lat) * scale_lat, (node_lon[node] - target_lon) * scale_lon)
+
+        best_time = {source: 0.0}
+        best_length = {source: 0.0}
+        queue = [(heuristic(source), 0.0, source)]
+        settled = set()
+        while queue:
+            _, elapsed, node = heapq.heappop(queue)
+            if node == target:
+                return best_length[node], elapsed
+            if node in settled:
+                continue
+            settled.add(node)
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbor = targets[edge]
+                candidate = elapsed + times[edge]
+                if candidate < best_time.get(neighbor, math.inf):
+                    best_time[neighbor] = candidate
+                    best_length[neighbor] = best_length[node] + lengths[edge]
+                    heapq.heappush(queue, (candidate + heuristic(neighbor), candidate, neighbor))
+        return None
+
+
+class RoutingEngine:
+    def __init__(self, graph_file=None):
+        self.graph_file = Path(graph_file or getattr(
+            settings, 'ROUTING_GRAPH_FILE', settings.BASE_DIR / 'yaounde_roads.npz'
+        ))
+        self.max_snap_km = getattr(settings, 'ROUTING_MAX_SNAP_KM', 1.0)
+        self.cache = LRUCache(getattr(settings, 'ROUTING_CACHE_SIZE', 10000))
+        self._graph = None
+        self._load_failed = False
+        self._lock = threading.Lock()
+
+    @property
+    def graph(self):
+        if self._graph is None and not self._load_failed:
+            with self._lock:
+                if self._graph is None and not self._load_failed:
+                    try:
+                        self._graph = RoadGraph.load(self.graph_file)
+                        logger.info(f"[ROUTING] Loaded {self._graph.node_count} nodes from {self.graph_file}")
+                    except (OSError, KeyError, ValueError) as e:
+                        self._load_failed = True
+                        logger.warning(f"[ROUTING] Road graph not loaded ({self.graph_file}): {e}")
+        return self._graph
+
+    def reload(self):
+        with self._lock:
+            self._graph = None
+            self._load_failed = False
+        self.cache.clear()
+
+    def route(self, start, end):
+        """{'distance_km', 'duration_minutes', 'source'} from (lat, lon) start to (lat, lon) end"""
+        start_lat, start_lon = float(start[0]), float(start[1])
+        end_lat, end_lon = float(end[0]), float(end[1])
+        graph = self.graph
+        if graph is not None:
+            origin = graph.snap(start_lat, start_lon, self.max_snap_km)
+            destination = graph.snap(end_lat, end_lon, self.max_snap_km)
+            if origin is not None and destination is not None:
+                key = (origin[0], destination[0])
+                path = self.cache.get(key)
+                if path is None:
+                    path = graph.shortest_path(*key) or ()
+                    self.cache.set(key, path)
+                if path:
+                    access_km = origin[1] + destination[1]
+                    length_m, time_s = path
+                    minutes = (time_s + access_km / ACCESS_SPEED_KMH * 3600) / 60
+                    return {
+                        'distance_km': round(length_m / 1000 + access_km, 2),
+                        'duration_minutes': math.ceil(minutes) + FIXED_MINUTES,
+                        'source': 'road',
+                    }
+        return self.estimate(start_lat, start_lon, end_lat, end_lon)
+
+    @staticmethod
+    def estimate(start_lat, start_lon, end_lat, end_lon):
+        distance_km = haversine_km(start_lat, start_lon, end_lat, end_lon)
+        return {
+            'distance_km': round(distance_km, 2),
+            'duration_minutes': int(distance_km / AVG_SPEED_KMH * 60) + FIXED_MINUTES,
+            'source': 'estimate',
+        }
+
+
+routing_engine = RoutingEngine()
@@ -1,7 +1,51 @@
+from django.db import models
 from rest_framework import serializers
-from rest_framework_gis.serializers import GeoFeatureModelSerializer
+from rest_framework_gis.serializers import GeoFeatureModelListSerializer, GeoFeatureModelSerializer
+from apps.geolocation.distances import METHODS, distances_from
 from apps.geolocation.models import ZoneLivraison, TrajetLivraison
 
+
+def request_origin(context):
+    """(lat, lon) set by the nearby views on request.user_location, or None"""
+    user_location = getattr(context.get('request'), 'user_location', None)
+    if not isinstance(user_location, (tuple, list)) or len(user_location) != 2:
+        return None
+    try:
+        return float(user_location[0]), float(user_location[1])
+    except (TypeError, ValueError):
+        return None
+
+
+class DistanceListSerializer(GeoFeatureModelListSerializer):
+    """Computes the user -> object distances of the whole list in one batch
+
+    The child serializer reads them from ``self.child.distances`` (by id)
+    in its distance_km method. Rows annotated with ``distance`` by the
+    nearby query need no batch.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.Manager) else data)
+        if all(getattr(item, 'distance', None) is not None for item in items):
+            self.child.distances = None
+        else:
+            self.child.distances = distances_from(request_origin(self.context), items)
+        return super().to_representation(items)
+
+
+class DistanceFieldMixin:
+    """distance_km from the nearby annotation, the batch of the list serializer, or a single row"""
+    distances = None
+
+    def get_distance_km(self, obj):
+        annotated = getattr(obj, 'distance', None)
+        if annotated is not None:
+            return round(annotated.km, 2)
+        if self.distances is not None:
+            return self.distances.get(obj.id)
+        return distances_from(request_origin(self.context), [obj]).get(obj.id)
+
+
 class ZoneLivraisonSerializer(GeoFeatureModelSerializer):
     class Meta:
         model = ZoneLivraison
@@ -49,3 +93,53 @@ class RouteCalculationSerializer(serializers.Serializer):
 class ZoneVerificationSerializer(serializers.Serializer):
     latitude = serializers.DecimalField(max_digits=9, decimal_places=6)
     longitude = serializers.DecimalField(max_digits=9, decimal_places=6)
+
+class ZoneBatchItemSerializer(serializers.Serializer):
+    """A position, or an address geocoded before the check"""
+    latitude = serializers.DecimalField(max_digits=9, decimal_places=6, required=False)
+    longitude = serializers.DecimalField(max_digits=9, decimal_places=6, required=False)
+    address = serializers.CharField(required=False, allow_blank=False)
+
+    def validate(self, attrs):
+        has_position = attrs.get('latitude') is not None and attrs.get('longitude') is not None
+        if not has_position and not attrs.get('address'):
+            raise serializers.ValidationError('latitude and longitude, or address, are required')
+        return attrs
+
+class ZoneBatchVerificationSerializer(serializers.Serializer):
+    MAX_POINTS = 500
+
+    points = ZoneBatchItemSerializer(many=True, allow_empty=False)
+
+    def validate_points(self, value):
+        if len(value) > self.MAX_POINTS:
+            raise serializers.ValidationError(f'At most {self.MAX_POINTS} points per request.')
+        return value
+
+class PointSerializer(serializers.Serializer):
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+
+class DistanceMatrixSerializer(serializers.Serializer):
+    MAX_POINTS = 1000
+    MAX_PAIRS = 250000
+
+    origins = PointSerializer(many=True, allow_empty=False)
+    destinations = PointSerializer(many=True, allow_empty=False)
+    method = serializers.ChoiceField(choices=METHODS, default='haversine')
+
+    def _validate_points(self, value):
+        if len(value) > self.MAX_POINTS:
+            raise serializers.ValidationError(f'At most {self.MAX_POINTS} points per list.')
+        return value
+
+    def validate_origins(self, value):
+        return self._validate_points(value)
+
+    def validate_destinations(self, value):
+        return self._validate_points(value)
+
+    def validate(self, attrs):
+        if len(attrs['origins']) * len(attrs['destinations']) > self.MAX_PAIRS:
+            raise serializers.ValidationError(f'At most {self.MAX_PAIRS} origin/destination pairs per request.')
+        return attrs
@@ -0,0 +1,14 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.geolocation.geocoding import geocoding_service
+from apps.geolocation.models import ZoneLivraison
+from apps.geolocation.zone_index import zone_index
+
+
+@receiver(post_save, sender=ZoneLivraison)
+@receiver(post_delete, sender=ZoneLivraison)
+def zone_changed(sender, instance, **kwargs):
+    """Zone polygons feed the zone index, their neighborhoods the geocoding gazetteer"""
+    zone_index.invalidate()
+    geocoding_service.reload_gazetteer()
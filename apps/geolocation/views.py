@@ -2,17 +2,19 @@ from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.contrib.gis.geos import Point
-from django.contrib.gis.db.models.functions import Distance
-from geopy.geocoders import Nominatim
+from django.conf import settings
 from geopy.distance import geodesic
-from apps.geolocation.models import ZoneLivraison, TrajetLivraison
+from apps.geolocation.distances import distance_matrix as compute_distance_matrix, estimated_minutes
+from apps.geolocation.geocoding import NOT_CACHED, geocoding_service
+from apps.geolocation.models import ZoneLivraison
+from apps.geolocation.routing import routing_engine
 from apps.geolocation.serializers import (
     ZoneLivraisonSerializer, GeocodingSerializer, DistanceCalculationSerializer,
-    RouteCalculationSerializer, ZoneVerificationSerializer
+    RouteCalculationSerializer, ZoneVerificationSerializer, DistanceMatrixSerializer,
+    ZoneBatchVerificationSerializer
 )
-
-geocoder = Nominatim(user_agent='quickdeliver')
+from apps.geolocation.zone_index import zone_index
+from apps.users.permissions import IsAdmin
 
 class GeolocationViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
@@ -22,23 +24,15 @@ class GeolocationViewSet(viewsets.ViewSet):
         """Convert address to coordinates"""
         serializer = GeocodingSerializer(data=request.data)
         if serializer.is_valid():
-            try:
-                location = geocoder.geocode(serializer.validated_data['address'])
-                if location:
-                    return Response({
-                        'latitude': location.latitude,
-                        'longitude': location.longitude,
-                        'address': location.address,
-                    })
-                return Response(
-                    {'error': 'Address not found'},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-            except Exception as e:
-                return Response(
-                    {'error': str(e)},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            if not serializer.validated_data.get('address'):
+                return Response({'error': 'address is required'}, status=status.HTTP_400_BAD_REQUEST)
+            location = geocoding_service.geocode(serializer.validated_data['address'])
+            if location:
+                return Response(location)
+            return Response(
+                {'error': 'Address not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     @action(detail=False, methods=['post'])
@@ -46,18 +40,24 @@ class GeolocationViewSet(viewsets.ViewSet):
         """Convert coordinates to address"""
         serializer = GeocodingSerializer(data=request.data)
         if serializer.is_valid():
-            try:
-                location = geocoder.reverse(
-                    f"{serializer.validated_data['latitude']}, {serializer.validated_data['longitude']}"
-                )
-                return Response({'address': location.address})
-            except Exception as e:
-                return Response(
-                    {'error': str(e)},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            latitude = serializer.validated_data.get('latitude')
+            longitude = serializer.validated_data.get('longitude')
+            if latitude is None or longitude is None:
+                return Response({'error': 'latitude and longitude are required'}, status=status.HTTP_400_BAD_REQUEST)
+            location = geocoding_service.reverse(latitude, longitude)
+            if location:
+                return Response(location)
+            return Response(
+                {'error': 'Address not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsAdmin])
+    def geocoding_stats(self, request):
+        """Hit rates of the geocoding cache layers (this process)"""
+        return Response(geocoding_service.stats())
+    
     @action(detail=False, methods=['post'])
     def calculate_distance(self, request):
         """Calculate distance between two points"""
@@ -80,7 +80,7 @@ class GeolocationViewSet(viewsets.ViewSet):
     
     @action(detail=False, methods=['post'])
     def calculate_route(self, request):
-        """Calculate route and estimated time"""
+        """Calculate route and estimated time on the road network"""
         serializer = RouteCalculationSerializer(data=request.data)
         if serializer.is_valid():
             start = (
@@ -91,15 +91,30 @@ class GeolocationViewSet(viewsets.ViewSet):
                 serializer.validated_data['end_lat'],
                 serializer.validated_data['end_lon']
             )
-            distance_km = geodesic(start, end).kilometers
-            
-            avg_speed = 30
-            estimated_minutes = int((distance_km / avg_speed) * 60) + 5
+            route = routing_engine.route(start, end)
+            duration_minutes = route['duration_minutes']
             
             return Response({
-                'distance_km': round(distance_km, 2),
-                'estimated_duration_minutes': estimated_minutes,
-                'estimated_arrival': f"{estimated_minutes} minutes",
+                'distance_km': route['distance_km'],
+                'estimated_duration_minutes': duration_minutes,
+                'estimated_arrival': f"{duration_minutes} minutes",
+                'source': route['source'],
+            })
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'])
+    def distance_matrix(self, request):
+        """Distances and estimated durations for every origin x destination pair"""
+        serializer = DistanceMatrixSerializer(data=request.data)
+        if serializer.is_valid():
+            origins = [(p['latitude'], p['longitude']) for p in serializer.validated_data['origins']]
+            destinations = [(p['latitude'], p['longitude']) for p in serializer.validated_data['destinations']]
+            method = serializer.validated_data['method']
+            distances_km = compute_distance_matrix(origins, destinations, method)
+            return Response({
+                'method': method,
+                'distances_km': distances_km.round(2).tolist(),
+                'estimated_duration_minutes': estimated_minutes(distances_km).tolist(),
             })
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -112,34 +127,84 @@ class GeolocationViewSet(viewsets.ViewSet):
     
     @action(detail=False, methods=['post'])
     def verifier_zone(self, request):
-        """Verify if a position is within a delivery zone"""
+        """Verify if a position is within a delivery zone
+
+        A point on a zone boundary is in the zone (the index tests ``covers``,
+        the former query used ``polygon__contains``, which excluded it).
+        """
         serializer = ZoneVerificationSerializer(data=request.data)
         if serializer.is_valid():
-            point = Point(
-                serializer.validated_data['longitude'],
-                serializer.validated_data['latitude']
-            )
-            
-            zones = ZoneLivraison.objects.filter(
-                is_active=True,
-                polygon__contains=point
+            zone = zone_index.locate(
+                serializer.validated_data['latitude'],
+                serializer.validated_data['longitude']
             )
-            
-            if zones.exists():
-                zone = zones.first()
-                return Response({
-                    'in_zone': True,
-                    'zone': ZoneLivraisonSerializer(zone).data,
-                })
-            
-            return Response({
-                'in_zone': False,
-                'available_zones': ZoneLivraisonSerializer(
-                    ZoneLivraison.objects.filter(is_active=True),
-                    many=True
-                ).data,
-            })
+            # The index finds the zone; the full payload (polygon, neighborhoods) is one primary-key read
+            zone = ZoneLivraison.objects.filter(pk=zone.id).first() if zone is not None else None
+            if zone is not None:
+                return Response({'in_zone': True, 'zone': ZoneLivraisonSerializer(zone).data})
+            return Response({'in_zone': False, 'available_zones': available_zones()})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['post'])
+    def verifier_zones(self, request):
+        """Verify many positions or addresses at once"""
+        serializer = ZoneBatchVerificationSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Addresses only Nominatim knows are geocoded up to a small budget per batch (its
+        # public service allows one request per second); the others are reported as deferred
+        remote_budget = getattr(settings, 'GEOCODING_BATCH_REMOTE_LIMIT', 5)
+        points = []
+        for item in serializer.validated_data['points']:
+            if item.get('latitude') is not None:
+                points.append((item['latitude'], item['longitude']))
+                continue
+            location = geocoding_service.geocode(item['address'], remote=False)
+            if location is NOT_CACHED and remote_budget > 0:
+                remote_budget -= 1
+                location = geocoding_service.geocode(item['address'])
+            if location is NOT_CACHED:
+                points.append(NOT_CACHED)
+            else:
+                points.append((location['latitude'], location['longitude']) if location else None)
+        
+        located = iter(zone_index.locate_many([point for point in points if isinstance(point, tuple)]))
+        results = []
+        for item, point in zip(serializer.validated_data['points'], points):
+            result = {'address': item['address']} if item.get('address') else {}
+            if point is NOT_CACHED:
+                results.append(dict(result, in_zone=False, error='Address not geocoded yet, retry later'))
+                continue
+            if point is None:
+                results.append(dict(result, in_zone=False, error='Address not found'))
+                continue
+            zone = next(located)
+            result.update(latitude=point[0], longitude=point[1], in_zone=zone is not None)
+            if zone is not None:
+                result['zone'] = zone_data(zone)
+            results.append(result)
+        
+        response = {'results': results}
+        if not all(result['in_zone'] for result in results):
+            response['available_zones'] = available_zones()
+        return Response(response)
+
+
+def zone_data(zone):
+    return {
+        'id': zone.id,
+        'name': zone.name,
+        'city': zone.city,
+        'base_delivery_fee': str(zone.base_delivery_fee),
+        'additional_fee_per_km': str(zone.additional_fee_per_km),
+        'average_delivery_time': zone.average_delivery_time,
+    }
+
+
+def available_zones():
+    """Slim list of the active zones; polygons are served by the zones action"""
+    return [{'id': zone.id, 'name': zone.name, 'city': zone.city} for zone in zone_index.zones()]
 
 class ZoneLivraisonViewSet(viewsets.ModelViewSet):
     queryset = ZoneLivraison.objects.filter(is_active=True)
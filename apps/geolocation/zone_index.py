@@ -0,0 +1,123 @@
+"""
+In-memory index of the active delivery zones.
+
+Active ZoneLivraison polygons are loaded once as GEOS prepared geometries
+and bucketed by bounding box into fixed-size lat/lon cells, so that
+"which zone contains this point" is one dict lookup plus a prepared
+``covers`` test on the few candidate polygons, instead of a
+``polygon__contains`` query per check. Zones whose bounding box spans more
+than MAX_CELLS_PER_ZONE cells are kept apart and tested for every point
+after their bounding box.
+
+When several zones contain a point, the first one in ZoneLivraison
+ordering (city, name) wins, as with the former ``.first()`` query.
+
+ZoneLivraison post_save/post_delete signals invalidate the index of the
+current process; it is also reloaded every ZONE_INDEX_REFRESH_SECONDS,
+which bounds staleness when several worker processes serve the API.
+"""
+import logging
+import math
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+
+logger = logging.getLogger(__name__)
+
+MAX_CELLS_PER_ZONE = 400
+
+Zone = namedtuple('Zone', [
+    'id', 'name', 'city', 'base_delivery_fee', 'additional_fee_per_km', 'average_delivery_time'
+])
+
+
+class ZoneIndex:
+    def __init__(self, cell_size_deg=None, refresh_seconds=None):
+        self.cell_size_deg = cell_size_deg or getattr(settings, 'ZONE_INDEX_CELL_SIZE_DEG', 0.05)
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else getattr(
+            settings, 'ZONE_INDEX_REFRESH_SECONDS', 300
+        )
+        self._lock = threading.Lock()
+        # (zones, cells, large) swapped as a whole on reload
+        self._state = None
+        self._loaded_at = None
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_size_deg), math.floor(lon / self.cell_size_deg))
+
+    def rebuild(self):
+        """Reload the active zones from the database"""
+        from apps.geolocation.models import ZoneLivraison
+
+        zones = []
+        cells = {}
+        large = []
+        for zone in ZoneLivraison.objects.filter(is_active=True, polygon__isnull=False):
+            polygon = zone.polygon
+            if polygon.srid and polygon.srid != 4326:
+                polygon = polygon.transform(4326, clone=True)
+            rank = len(zones)
+            zones.append(Zone(
+                zone.id, zone.name, zone.city, zone.base_delivery_fee,
+                zone.additional_fee_per_km, zone.average_delivery_time
+            ))
+            min_lon, min_lat, max_lon, max_lat = polygon.extent
+            entry = (rank, (min_lat, min_lon, max_lat, max_lon), polygon.prepared)
+
+            min_i, min_j = self._cell(min_lat, min_lon)
+            max_i, max_j = self._cell(max_lat, max_lon)
+            if (max_i - min_i + 1) * (max_j - min_j + 1) > MAX_CELLS_PER_ZONE:
+                large.append(entry)
+                continue
+            for i in range(min_i, max_i + 1):
+                for j in range(min_j, max_j + 1):
+                    cells.setdefault((i, j), []).append(entry)
+
+        with self._lock:
+            self._state = (zones, cells, large)
+            self._loaded_at = time.monotonic()
+        logger.debug(f"[ZONE_INDEX] Rebuilt with {len(zones)} zones ({len(large)} large)")
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _current(self):
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > self.refresh_seconds:
+            self.rebuild()
+        return self._state
+
+    def locate(self, latitude, longitude):
+        """Return the Zone containing the point, or None"""
+        return self.locate_many([(latitude, longitude)])[0]
+
+    def locate_many(self, points):
+        """Return a Zone or None for each (lat, lon) point"""
+        zones, cells, large = self._current()
+        results = []
+        for latitude, longitude in points:
+            lat, lon = float(latitude), float(longitude)
+            best = None
+            point = None
+            for rank, bbox, prepared in cells.get(self._cell(lat, lon), []) + large:
+                min_lat, min_lon, max_lat, max_lon = bbox
+                if best is not None and rank >= best:
+                    continue
+                if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+                    continue
+                point = point or Point(lon, lat, srid=4326)
+                # covers: a point on the boundary belongs to the zone
+                if prepared.covers(point):
+                    best = rank
+            results.append(zones[best] if best is not None else None)
+        return results
+
+    def zones(self):
+        """Every indexed zone, in ZoneLivraison ordering"""
+        return list(self._current()[0])
+
+
+zone_index = ZoneIndex()
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+class LivreursConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.livreurs'
+    
+    def ready(self):
+        from django.core import checks
+
+        import apps.livreurs.signals
+        from apps.livreurs.checks import check_dispatch_offers
+
+        checks.register(check_dispatch_offers)
@@ -0,0 +1,40 @@
+"""
+System checks of the livreurs app.
+
+In DISPATCH_MODE 'offer', offers are made by the ``dispatch_commandes``
+Celery task, in the worker process, while couriers read them from the web
+processes: the 'proposee' event through the feed broker and the pending
+offer through the cache. With the in-process feed broker or a per-process
+cache, no offer ever leaves the worker, so ``manage.py check``,
+``migrate`` and the Celery workers (celeryconfig.py) refuse that
+configuration.
+"""
+from django.conf import settings
+from django.core.checks import Error
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def check_dispatch_offers(app_configs=None, **kwargs):
+    if getattr(settings, 'DISPATCH_MODE', 'off') != 'offer':
+        return []
+    errors = []
+    if getattr(settings, 'COURIER_FEED_BROKER', 'local') != 'redis':
+        errors.append(Error(
+            "DISPATCH_MODE 'offer' publishes offers from the Celery worker; "
+            "the 'local' courier feed broker never delivers them to the web processes' streams.",
+            hint="Set COURIER_FEED_BROKER=redis, or DISPATCH_MODE=assign.",
+            id='livreurs.E001',
+        ))
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend in PROCESS_LOCAL_CACHES:
+        errors.append(Error(
+            f"DISPATCH_MODE 'offer' keeps pending offers in the cache; {backend} is not shared "
+            "between the Celery worker and the web processes.",
+            hint='Configure a shared cache (Redis, Memcached or the database) as CACHES["default"].',
+            id='livreurs.E002',
+        ))
+    return errors
@@ -0,0 +1,38 @@
+"""
+Contention-safe assignment of PRETE orders to livreurs.
+
+A claim is a single conditional UPDATE: only the row that is still PRETE
+and unassigned is written, and the rows-affected count tells the caller
+whether it won. Concurrent couriers tapping the same order therefore get
+exactly one winner, and losers fail fast without reading the row.
+A stacked lot (apps.livreurs.stacking) is claimed the same way, all or
+nothing, in one transaction. Both go through the 'assigner' transition
+of apps.orders.transitions; the pickup index, feed and trace updates are
+its hooks (apps.livreurs.signals).
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from apps.livreurs.stacking import bundle_stops
+from apps.orders.transitions import transition_ids
+
+
+def claim_commande(commande_id, livreur):
+    """Assign the order to the livreur if it is still available; return True on success"""
+    return transition_ids([commande_id], 'assigner', filters={'livreur__isnull': True}, livreur=livreur)
+
+
+def claim_bundle(bundle, livreur):
+    """Assign every order of the lot to the livreur if all are still available; return True on success"""
+    from apps.geolocation.models import TrajetLivraison
+
+    commande_ids = list(bundle.commande_ids)
+    with transaction.atomic():
+        if not transition_ids(commande_ids, 'assigner', filters={'livreur__isnull': True}, livreur=livreur):
+            return False
+        stops = bundle_stops(bundle)
+        TrajetLivraison.objects.bulk_create([
+            TrajetLivraison(commande_id=commande_id, livreur=livreur, date_start=timezone.now(), stops=stops)
+            for commande_id in commande_ids
+        ])
+    return True
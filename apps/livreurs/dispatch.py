@@ -0,0 +1,183 @@
+"""
+Batch dispatch of PRETE orders to online livreurs.
+
+With DISPATCH_MODE set to 'offer' or 'assign', the ``dispatch_commandes``
+task runs every DISPATCH_INTERVAL_SECONDS. It takes every PRETE,
+unassigned order and every EN_LIGNE livreur without an active delivery,
+builds the pickup distance matrix in one vectorized pass and solves the
+min-cost assignment (Hungarian algorithm). A pair is only allowed when the
+pickup point is within the livreur's action_radius_km. Among the
+assignments of maximum size, the total pickup distance is minimal.
+
+- 'assign': each pair is claimed with ``claim_commande`` (the same
+  conditional UPDATE as accepter_commande), so an order a courier took
+  manually in the meantime is simply skipped.
+- 'offer': each livreur receives a 'proposee' event on their feed, and
+  the offer is kept in the cache for DISPATCH_OFFER_SECONDS so that
+  commandes_disponibles lists it first. Orders stay first-come-first-
+  served.
+
+'off' (the default) keeps the current first-come-first-served model only.
+"""
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.geolocation.distances import haversine_matrix
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ['LIVREUR_ASSIGNE', 'EN_ROUTE_COLLECTE', 'COLLECTEE', 'EN_LIVRAISON']
+# Cost of a forbidden pair: larger than any sum of feasible distances
+FORBIDDEN = 1e9
+
+
+def hungarian(cost):
+    """Min-cost assignment of a rectangular matrix; returns [(row, col)] with one pair per row or column
+
+    Potential-based Hungarian algorithm, O(n^2 m), with the scan over the
+    columns vectorized.
+    """
+    cost = np.asarray(cost, dtype=float)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    if n == 0:
+        return []
+
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=int)  # match[j]: 1-based row assigned to column j, 0 if free
+    way = np.zeros(m + 1, dtype=int)
+    for row in range(1, n + 1):
+        match[0] = row
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[match[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+
+    pairs = [(match[j] - 1, j - 1) for j in range(1, m + 1) if match[j]]
+    if transposed:
+        pairs = [(col, row) for row, col in pairs]
+    return sorted(pairs)
+
+
+def solve(order_points, courier_points, radii_km):
+    """[(order index, courier index, distance_km)] minimizing pickup distance within each courier's radius"""
+    if not len(order_points) or not len(courier_points):
+        return []
+    distances = haversine_matrix(order_points, courier_points)
+    feasible = distances <= np.asarray(radii_km, dtype=float)[None, :]
+
+    # Orders and couriers without any feasible pair only slow the solver down
+    rows = np.flatnonzero(feasible.any(axis=1))
+    cols = np.flatnonzero(feasible.any(axis=0))
+    if not len(rows):
+        return []
+    cost = np.where(feasible, distances, FORBIDDEN)[np.ix_(rows, cols)]
+    return [
+        (int(rows[i]), int(cols[j]), float(distances[rows[i], cols[j]]))
+        for i, j in hungarian(cost)
+        if cost[i, j] < FORBIDDEN
+    ]
+
+
+def available_couriers():
+    """[(livreur_id, (lat, lon), action_radius_km)] of EN_LIGNE livreurs without an active delivery"""
+    from apps.livreurs.models import Livreur
+    from apps.livreurs.positions import position_buffer
+    from apps.orders.models import Commande
+
+    busy = Commande.objects.filter(status__in=ACTIVE_STATUSES, livreur__isnull=False).values('livreur_id')
+    couriers = []
+    for livreur_id, latitude, longitude, radius_km in Livreur.objects.filter(
+        status='EN_LIGNE', is_active=True
+    ).exclude(id__in=busy).values_list('id', 'current_latitude', 'current_longitude', 'action_radius_km'):
+        buffered = position_buffer.latest(livreur_id)
+        if buffered is not None:
+            couriers.append((livreur_id, (buffered[0], buffered[1]), radius_km))
+        elif latitude is not None and longitude is not None:
+            couriers.append((livreur_id, (float(latitude), float(longitude)), radius_km))
+    return couriers
+
+
+def pending_orders():
+    """[(commande_id, (lat, lon))] of PRETE, unassigned orders with a pickup point"""
+    from apps.orders.models import Commande
+
+    rows = Commande.objects.filter(
+        status='PRETE', livreur__isnull=True
+    ).values_list('id', 'restaurant__position', 'supermarche__position')
+    return [
+        (commande_id, (position.y, position.x))
+        for commande_id, restaurant_position, supermarche_position in rows
+        for position in [restaurant_position or supermarche_position]
+        if position is not None
+    ]
+
+
+def _offer_key(livreur_id):
+    return f'livreurs:{livreur_id}:dispatch_offer'
+
+
+def current_offer(livreur_id):
+    """Commande id offered to the livreur by the last dispatch round, or None"""
+    return cache.get(_offer_key(livreur_id))
+
+
+def dispatch(mode=None):
+    """Run one dispatch round; return the number of orders assigned or offered"""
+    from apps.livreurs.claims import claim_commande
+    from apps.livreurs.feed import publish_offer
+    from apps.livreurs.models import Livreur
+
+    mode = mode or getattr(settings, 'DISPATCH_MODE', 'off')
+    if mode not in ('offer', 'assign'):
+        return 0
+    orders = pending_orders()
+    couriers = available_couriers()
+    pairs = solve(
+        [point for _, point in orders],
+        [point for _, point, _ in couriers],
+        [radius_km for _, _, radius_km in couriers],
+    )
+
+    done = 0
+    offer_seconds = getattr(settings, 'DISPATCH_OFFER_SECONDS', 30)
+    for order_index, courier_index, distance_km in pairs:
+        commande_id, point = orders[order_index]
+        livreur_id = couriers[courier_index][0]
+        if mode == 'assign':
+            done += claim_commande(commande_id, Livreur(id=livreur_id))
+        else:
+            cache.set(_offer_key(livreur_id), commande_id, offer_seconds)
+            publish_offer(livreur_id, commande_id, point, distance_km)
+            done += 1
+    logger.info(
+        f"[DISPATCH] {mode}: {done}/{len(pairs)} commandes, "
+        f"{len(orders)} en attente, {len(couriers)} livreurs disponibles"
+    )
+    return done
@@ -0,0 +1,289 @@
+"""
+Push feed of pickup opportunities for livreurs (Server-Sent Events).
+
+Order transitions publish small events ('nouvelle', 'attribuee', 'annulee')
+carrying the pickup point of the order. Each open stream holds a
+subscription with the courier position and action radius and only
+receives the events whose pickup point falls inside that radius.
+Dispatch offers ('proposee') name a livreur and only reach that
+livreur's streams. When the caller has no pickup point (order out of the
+pickup index), it is read from the order's merchant, so no event is dropped for lack of a position.
+
+A stream holds its connection for up to COURIER_FEED_MAX_DURATION_SECONDS.
+Under ASGI (config/asgi.py) that is a parked coroutine; under WSGI it is
+a whole worker thread, so the flux action refuses WSGI requests unless
+COURIER_FEED_WSGI_STREAMS is set (development server, gevent workers).
+
+COURIER_FEED_BROKER selects the transport:
+- 'local' (default): in-process fan-out, enough for a single ASGI worker
+  and for tests.
+- 'redis': events are published on a Redis channel and one listener
+  thread per process relays them to the local subscribers, so every
+  worker sees the transitions made by the others.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer
+
+from apps.geolocation.distances import haversine_km
+from apps.livreurs.spatial_index import pickup_index, pickup_point
+
+logger = logging.getLogger(__name__)
+
+EVENT_NEW = 'nouvelle'
+EVENT_CLAIMED = 'attribuee'
+EVENT_CANCELLED = 'annulee'
+EVENT_OFFER = 'proposee'
+
+
+class Subscription:
+    """Bounded mailbox of one stream; readable from a thread or an event loop"""
+
+    def __init__(self, latitude, longitude, radius_km, maxsize=100, loop=None, livreur_id=None):
+        self.livreur_id = livreur_id
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+        self.radius_km = float(radius_km)
+        self.loop = loop
+        self.dropped = 0
+        if loop is not None:
+            self._queue = asyncio.Queue(maxsize=maxsize)
+        else:
+            self._queue = queue.Queue(maxsize=maxsize)
+
+    def wants(self, event):
+        if event.get('livreur_id') is not None:
+            return event['livreur_id'] == self.livreur_id
+        if event.get('latitude') is None or event.get('longitude') is None:
+            return False
+        return haversine_km(
+            self.latitude, self.longitude, event['latitude'], event['longitude']
+        ) <= self.radius_km
+
+    def deliver(self, event):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._put_nowait, event)
+        else:
+            self._put_nowait(event)
+
+    def _put_nowait(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except (queue.Full, asyncio.QueueFull):
+            # A stalled client must not slow down the publisher
+            self.dropped += 1
+
+    def get(self, timeout):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def aget(self, timeout):
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    """In-process publish/subscribe"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._sequence = itertools.count(1)
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def subscribe(self, latitude, longitude, radius_km, loop=None, livreur_id=None):
+        subscription = Subscription(latitude, longitude, radius_km, loop=loop, livreur_id=livreur_id)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event):
+        event = dict(event, id=next(self._sequence))
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.wants(event):
+                subscription.deliver(event)
+
+
+class RedisBroker(LocalBroker):
+    """Publishes on a Redis channel; a listener thread feeds the local subscribers"""
+
+    def __init__(self, url, channel):
+        super().__init__()
+        import redis
+
+        self.channel = channel
+        self._redis = redis.Redis.from_url(url)
+        self._listener = None
+
+    def subscribe(self, *args, **kwargs):
+        self._ensure_listener()
+        return super().subscribe(*args, **kwargs)
+
+    def publish(self, event):
+        try:
+            self._redis.publish(self.channel, json.dumps(event))
+        except Exception as e:
+            logger.error(f"[COURIER_FEED] Redis publish failed: {e}")
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name='courier-feed-relay', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        for message in pubsub.listen():
+            try:
+                LocalBroker.publish(self, json.loads(message['data']))
+            except (TypeError, ValueError) as e:
+                logger.warning(f"[COURIER_FEED] Invalid message on {self.channel}: {e}")
+
+
+def _build_broker():
+    if getattr(settings, 'COURIER_FEED_BROKER', 'local') == 'redis':
+        return RedisBroker(
+            getattr(settings, 'COURIER_FEED_REDIS_URL', settings.CELERY_BROKER_URL),
+            getattr(settings, 'COURIER_FEED_CHANNEL', 'quickdeliver:courier-feed'),
+        )
+    return LocalBroker()
+
+
+broker = _build_broker()
+
+
+def _stored_pickup(commande_id):
+    """(pickup point, numero) of an order read from its merchant, or (None, None)"""
+    from apps.orders.models import Commande
+
+    row = Commande.objects.filter(pk=commande_id).values_list(
+        'restaurant__position', 'supermarche__position', 'numero'
+    ).first()
+    if row is None:
+        return None, None
+    position = row[0] or row[1]
+    return ((position.y, position.x) if position is not None else None), row[2]
+
+
+def publish_commande_event(event_type, commande_id, point=None, numero=None):
+    """Publish an order event; point is the (lat, lon) pickup point, read from the order when missing"""
+    if point is None:
+        point, stored_numero = _stored_pickup(commande_id)
+        numero = numero or stored_numero
+    if point is None:
+        logger.warning(f"[COURIER_FEED] No pickup point for commande {commande_id}, '{event_type}' not published")
+        return
+    broker.publish({
+        'type': event_type,
+        'commande_id': commande_id,
+        'numero': numero,
+        'latitude': point[0],
+        'longitude': point[1],
+    })
+
+
+def publish_for_commande(event_type, commande):
+    publish_commande_event(event_type, commande.id, pickup_point(commande), commande.numero)
+
+
+def publish_offer(livreur_id, commande_id, point, distance_km):
+    """Offer an order to one livreur (dispatch 'offer' mode)"""
+    broker.publish({
+        'type': EVENT_OFFER,
+        'livreur_id': livreur_id,
+        'commande_id': commande_id,
+        'numero': None,
+        'latitude': point[0],
+        'longitude': point[1],
+        'distance_km': round(distance_km, 2),
+    })
+
+
+def format_sse(event):
+    payload = json.dumps({key: value for key, value in event.items() if key != 'id'})
+    return f"id: {event.get('id', '')}\nevent: {event['type']}\ndata: {payload}\n\n"
+
+
+def snapshot_events(latitude, longitude, radius_km):
+    """Orders already available when a stream opens, nearest first (may hit the database)"""
+    for commande_id, _ in pickup_index.nearby(latitude, longitude, radius_km, limit=20):
+        point = pickup_index.point(commande_id)
+        if point is not None:
+            yield {
+                'type': EVENT_NEW,
+                'commande_id': commande_id,
+                'numero': None,
+                'latitude': point[0],
+                'longitude': point[1],
+            }
+
+
+def _stream_limits():
+    heartbeat = getattr(settings, 'COURIER_FEED_HEARTBEAT_SECONDS', 15)
+    max_duration = getattr(settings, 'COURIER_FEED_MAX_DURATION_SECONDS', 300)
+    return heartbeat, time.monotonic() + max_duration
+
+
+def event_stream(latitude, longitude, radius_km, snapshot=(), livreur_id=None):
+    """Blocking SSE generator for WSGI workers (holds the thread); clients reconnect after max duration"""
+    heartbeat, deadline = _stream_limits()
+    subscription = broker.subscribe(latitude, longitude, radius_km, livreur_id=livreur_id)
+    try:
+        yield 'retry: 3000\n\n'
+        for event in snapshot:
+            yield format_sse(event)
+        while time.monotonic() < deadline:
+            event = subscription.get(timeout=heartbeat)
+            yield format_sse(event) if event is not None else ': ping\n\n'
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def async_event_stream(latitude, longitude, radius_km, snapshot=(), livreur_id=None):
+    """Non-blocking SSE generator for the ASGI application (config/asgi.py)"""
+    heartbeat, deadline = _stream_limits()
+    subscription = broker.subscribe(
+        latitude, longitude, radius_km, loop=asyncio.get_running_loop(), livreur_id=livreur_id
+    )
+    try:
+        yield 'retry: 3000\n\n'
+        for event in snapshot:
+            yield format_sse(event)
+        while time.monotonic() < deadline:
+            event = await subscription.aget(timeout=heartbeat)
+            yield format_sse(event) if event is not None else ': ping\n\n'
+    finally:
+        broker.unsubscribe(subscription)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets DRF content negotiation accept 'Accept: text/event-stream'"""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (bytes, str)):
+            return data
+        return json.dumps(data)
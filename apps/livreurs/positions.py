@@ -0,0 +1,202 @@
+"""
+Buffered ingestion of courier GPS pings.
+
+Writing the Livreur row on every ping serializes all couriers on the
+database write lock. Pings are instead recorded in a buffer that keeps
+the latest position per livreur, and a background flusher writes the
+positions that changed since the previous flush with one bulk UPDATE
+every COURIER_POSITION_FLUSH_SECONDS. Readers ask the buffer first, so
+they see a position as soon as it is received.
+
+COURIER_POSITION_BUFFER selects the storage:
+- 'local' (default): per-process dict, enough for a single worker.
+- 'redis': a shared hash of latest positions and a set of dirty livreur
+  ids, so every worker reads the same position and any of them can flush.
+"""
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.db import close_old_connections
+from django.utils import timezone
+
+from apps.livreurs.traces import append_pings
+
+logger = logging.getLogger(__name__)
+
+
+class LocalPositionBuffer:
+    """Latest (lat, lon, recorded_at) per livreur, flushed in bulk by a daemon thread"""
+
+    def __init__(self, flush_seconds):
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._latest = {}
+        self._dirty = set()
+        self._flusher = None
+
+    def record(self, livreur_id, points):
+        """Keep the most recent of the (lat, lon, recorded_at) points; return it"""
+        newest = max(points, key=lambda point: point[2])
+        with self._lock:
+            current = self._latest.get(livreur_id)
+            if current is None or current[2] <= newest[2]:
+                self._latest[livreur_id] = newest
+                self._dirty.add(livreur_id)
+        self._ensure_flusher()
+        return newest
+
+    def latest(self, livreur_id):
+        return self._latest.get(livreur_id)
+
+    def drain(self):
+        """Return {livreur_id: (lat, lon, recorded_at)} received since the last drain"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            return {livreur_id: self._latest[livreur_id] for livreur_id in dirty}
+
+    def _ensure_flusher(self):
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._run, name='courier-position-flush', daemon=True)
+            self._flusher.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"[POSITIONS] Flush failed: {e}")
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Write the pending positions with one bulk UPDATE; return the number written"""
+        return write_positions(self.drain())
+
+
+class RedisPositionBuffer(LocalPositionBuffer):
+    """Latest positions shared by all workers through Redis"""
+
+    def __init__(self, flush_seconds, url, key):
+        super().__init__(flush_seconds)
+        import redis
+
+        self.key = key
+        self.dirty_key = f'{key}:dirty'
+        self._redis = redis.Redis.from_url(url)
+
+    def record(self, livreur_id, points):
+        newest = max(points, key=lambda point: point[2])
+        lat, lon, recorded_at = newest
+        pipeline = self._redis.pipeline()
+        pipeline.hset(self.key, livreur_id, json.dumps([lat, lon, recorded_at.isoformat()]))
+        pipeline.sadd(self.dirty_key, livreur_id)
+        pipeline.execute()
+        self._ensure_flusher()
+        return newest
+
+    def latest(self, livreur_id):
+        raw = self._redis.hget(self.key, livreur_id)
+        return self._decode(raw) if raw else None
+
+    def drain(self):
+        pipeline = self._redis.pipeline()
+        pipeline.smembers(self.dirty_key)
+        pipeline.delete(self.dirty_key)
+        dirty, _ = pipeline.execute()
+        if not dirty:
+            return {}
+        ids = sorted(int(livreur_id) for livreur_id in dirty)
+        return {
+            livreur_id: self._decode(raw)
+            for livreur_id, raw in zip(ids, self._redis.hmget(self.key, ids))
+            if raw
+        }
+
+    @staticmethod
+    def _decode(raw):
+        lat, lon, recorded_at = json.loads(raw)
+        return (lat, lon, datetime.fromisoformat(recorded_at))
+
+
+def write_positions(pending):
+    """Bulk UPDATE of the Livreur position fields from {livreur_id: (lat, lon, recorded_at)}"""
+    if not pending:
+        return 0
+    from apps.livreurs.models import Livreur
+
+    livreurs = [
+        Livreur(
+            id=livreur_id,
+            current_latitude=lat,
+            current_longitude=lon,
+            # bulk_update skips Livreur.save(), so the point is set here
+            current_position=Point(float(lon), float(lat), srid=4326),
+            last_position_update=recorded_at,
+        )
+        for livreur_id, (lat, lon, recorded_at) in pending.items()
+    ]
+    Livreur.objects.bulk_update(
+        livreurs,
+        ['current_latitude', 'current_longitude', 'current_position', 'last_position_update'],
+        batch_size=500
+    )
+    logger.debug(f"[POSITIONS] Flushed {len(livreurs)} positions")
+    return len(livreurs)
+
+
+def _build_buffer():
+    flush_seconds = getattr(settings, 'COURIER_POSITION_FLUSH_SECONDS', 2)
+    if getattr(settings, 'COURIER_POSITION_BUFFER', 'local') == 'redis':
+        return RedisPositionBuffer(
+            flush_seconds,
+            getattr(settings, 'COURIER_POSITION_REDIS_URL', settings.CELERY_BROKER_URL),
+            getattr(settings, 'COURIER_POSITION_REDIS_KEY', 'quickdeliver:positions'),
+        )
+    return LocalPositionBuffer(flush_seconds)
+
+
+position_buffer = _build_buffer()
+
+
+def record_positions(livreur_id, points):
+    """Buffer validated pings (dicts with latitude, longitude and optional timestamp) and add them to the open trace"""
+    now = timezone.now()
+    points = [
+        # Device clocks drift: a ping is never newer than its reception
+        (float(point['latitude']), float(point['longitude']), min(point.get('timestamp') or now, now))
+        for point in points
+    ]
+    append_pings(livreur_id, points)
+    return position_buffer.record(livreur_id, points)
+
+
+def current_position(livreur):
+    """Freshest known (lat, lon) of a livreur: buffer first, then the stored profile"""
+    buffered = position_buffer.latest(livreur.id)
+    if buffered is not None:
+        return buffered[0], buffered[1]
+    if livreur.current_latitude and livreur.current_longitude:
+        return float(livreur.current_latitude), float(livreur.current_longitude)
+    return None
+
+
+def apply_buffered_position(livreur):
+    """Copy the buffered position onto a loaded instance before it is serialized or saved"""
+    buffered = position_buffer.latest(livreur.id)
+    if buffered is not None:
+        lat, lon, recorded_at = buffered
+        livreur.current_latitude = round(lat, 6)
+        livreur.current_longitude = round(lon, 6)
+        livreur.current_position = Point(lon, lat, srid=4326)
+        livreur.last_position_update = recorded_at
+    return livreur
@@ -0,0 +1,111 @@
+"""
+Incrementally maintained StatistiquesLivreur rollups.
+
+Each delivered order adds to the livreur's day/week/month counters with
+F() expressions, so concurrent deliveries never lose an increment.
+``StatistiquesLivreur.date`` is the day the counters currently describe:
+when it is older than today the expired windows are reset first, either
+lazily (here) or in bulk by the nightly ``rollover_statistiques`` task.
+Weeks start on Monday, like the revenus endpoint.
+
+record_delivery runs inside the LIVREE transition's transaction
+(commande_transitioning), crediting the estimated distance of the order;
+once the GPS trace is closed after commit, correct_distance swaps the
+estimate for the traced distance.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import F
+from django.utils import timezone
+
+from apps.livreurs.models import Livreur, StatistiquesLivreur
+
+DAY_FIELDS = {'deliveries_today': 0, 'earnings_today': 0, 'distance_today_km': 0}
+WEEK_FIELDS = {'deliveries_week': 0, 'earnings_week': 0, 'distance_week_km': 0}
+MONTH_FIELDS = {'deliveries_month': 0, 'earnings_month': 0, 'distance_month_km': 0}
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def roll_windows(stats, today=None):
+    """Reset the expired windows of one stats row; return the up-to-date row"""
+    today = today or timezone.localdate()
+    if stats.date >= today:
+        return stats
+
+    updates = dict(DAY_FIELDS, date=today)
+    if week_start(stats.date) != week_start(today):
+        updates.update(WEEK_FIELDS)
+    if month_start(stats.date) != month_start(today):
+        updates.update(MONTH_FIELDS)
+
+    # Compare-and-set on the old date: a concurrent roll or the nightly task wins once
+    StatistiquesLivreur.objects.filter(pk=stats.pk, date=stats.date).update(**updates)
+    stats.refresh_from_db()
+    return stats
+
+
+def rollover_all(today=None):
+    """Bulk reset of every expired window, three UPDATE statements in total"""
+    today = today or timezone.localdate()
+    stale = StatistiquesLivreur.objects.filter(date__lt=today)
+    stale.filter(date__lt=month_start(today)).update(**MONTH_FIELDS)
+    stale.filter(date__lt=week_start(today)).update(**WEEK_FIELDS)
+    return stale.update(date=today, **DAY_FIELDS)
+
+
+def get_statistiques(livreur_id):
+    stats, _ = StatistiquesLivreur.objects.get_or_create(livreur_id=livreur_id)
+    return roll_windows(stats)
+
+
+def record_delivery(commande):
+    """Add a newly delivered order to its livreur's rollups; call inside the delivery transaction"""
+    if commande.livreur_id is None:
+        return
+
+    delivered_on = timezone.localdate(commande.date_delivered) if commande.date_delivered else timezone.localdate()
+    stats, _ = StatistiquesLivreur.objects.get_or_create(livreur_id=commande.livreur_id)
+    roll_windows(stats, delivered_on)
+
+    earnings = commande.livreur_earnings or Decimal('0')
+    distance_km = commande.distance_km or Decimal('0')
+
+    StatistiquesLivreur.objects.filter(pk=stats.pk).update(
+        deliveries_today=F('deliveries_today') + 1,
+        deliveries_week=F('deliveries_week') + 1,
+        deliveries_month=F('deliveries_month') + 1,
+        earnings_today=F('earnings_today') + earnings,
+        earnings_week=F('earnings_week') + earnings,
+        earnings_month=F('earnings_month') + earnings,
+        distance_today_km=F('distance_today_km') + distance_km,
+        distance_week_km=F('distance_week_km') + distance_km,
+        distance_month_km=F('distance_month_km') + distance_km,
+    )
+    Livreur.objects.filter(pk=commande.livreur_id).update(
+        delivery_count=F('delivery_count') + 1,
+        total_earnings=F('total_earnings') + earnings,
+    )
+
+
+def correct_distance(commande, distance_km):
+    """Replace the estimated distance credited by record_delivery with the traced one"""
+    if commande.livreur_id is None or distance_km is None:
+        return
+    delta = Decimal(str(distance_km)) - (commande.distance_km or Decimal('0'))
+    if not delta:
+        return
+    delivered_on = timezone.localdate(commande.date_delivered) if commande.date_delivered else timezone.localdate()
+    # Windows rolled over since the delivery no longer hold its estimate: leave them alone
+    StatistiquesLivreur.objects.filter(livreur_id=commande.livreur_id, date=delivered_on).update(
+        distance_today_km=F('distance_today_km') + delta,
+        distance_week_km=F('distance_week_km') + delta,
+        distance_month_km=F('distance_month_km') + delta,
+    )
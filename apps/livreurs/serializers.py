@@ -49,9 +49,29 @@ class LivreurUpdateSerializer(serializers.ModelSerializer):
             'action_radius_km'
         ]
 
+    def update(self, instance, validated_data):
+        # Only the edited columns: positions, status and counters are written concurrently
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        if validated_data:
+            instance.save(update_fields=list(validated_data))
+        return instance
+
 class LivreurPositionSerializer(serializers.Serializer):
     latitude = serializers.DecimalField(max_digits=9, decimal_places=6)
     longitude = serializers.DecimalField(max_digits=9, decimal_places=6)
+    timestamp = serializers.DateTimeField(required=False)
+
+class LivreurPositionBatchSerializer(serializers.Serializer):
+    """Several pings recorded by the app since its last upload"""
+    MAX_POINTS = 50
+
+    points = LivreurPositionSerializer(many=True, allow_empty=False)
+
+    def validate_points(self, value):
+        if len(value) > self.MAX_POINTS:
+            raise serializers.ValidationError(f'At most {self.MAX_POINTS} points per request.')
+        return value
 
 class LivreurStatusUpdateSerializer(serializers.Serializer):
     status = serializers.ChoiceField(choices=['HORS_LIGNE', 'EN_LIGNE', 'EN_PAUSE'])
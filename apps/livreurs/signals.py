@@ -0,0 +1,44 @@
+from django.dispatch import receiver
+
+from apps.livreurs.feed import EVENT_CANCELLED, EVENT_CLAIMED, EVENT_NEW, publish_commande_event, publish_for_commande
+from apps.livreurs.rollups import correct_distance, record_delivery
+from apps.livreurs.spatial_index import pickup_index
+from apps.livreurs.traces import discard_trace, finish_trace, start_trace
+from apps.orders.models import Commande
+from apps.orders.transitions import commande_transitioned, commande_transitioning
+
+
+@receiver(commande_transitioning, sender=Commande)
+def commande_transitioning_livreurs(sender, transition, commandes, **kwargs):
+    """Inside the transition's transaction: the counters commit with the LIVREE status or not at all"""
+    if transition.name == 'livrer':
+        for commande in commandes:
+            record_delivery(commande)
+
+
+@receiver(commande_transitioned, sender=Commande)
+def commande_transitioned_livreurs(sender, transition, commandes, previous, **kwargs):
+    if transition.name == 'marquer_prete':
+        for commande in commandes:
+            pickup_index.sync(commande)
+            publish_for_commande(EVENT_NEW, commande)
+
+    elif transition.name == 'assigner':
+        # The pickup point comes from the index (no merchant query); the feed reads it from the order on a miss
+        for commande in commandes:
+            point = pickup_index.point(commande.id)
+            pickup_index.remove(commande.id)
+            publish_commande_event(EVENT_CLAIMED, commande.id, point, commande.numero)
+        start_trace([commande.id for commande in commandes], commandes[0].livreur_id)
+
+    elif transition.name == 'livrer':
+        for commande in commandes:
+            correct_distance(commande, finish_trace(commande))
+
+    elif transition.name == 'annuler':
+        for commande in commandes:
+            pickup_index.remove(commande.id)
+            discard_trace(commande.id)
+            # Livreurs only saw it if it was waiting for a pickup
+            if previous == 'PRETE' and commande.livreur_id is None:
+                publish_for_commande(EVENT_CANCELLED, commande)
@@ -0,0 +1,154 @@
+"""
+In-memory grid index of pickup points for orders waiting for a livreur.
+
+Every PRETE, unassigned Commande is bucketed by the position of its
+restaurant (or supermarket) into fixed-size lat/lon cells, so that
+``commandes_disponibles`` can answer "orders within action_radius_km,
+nearest first" by scanning only the cells that cover the radius instead
+of running distance queries against the database.
+
+The index is updated by the order status transitions of the current
+process and fully rebuilt from the database every
+PICKUP_INDEX_REFRESH_SECONDS, which bounds staleness when several worker
+processes serve the API.
+"""
+import heapq
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+
+from apps.geolocation.distances import KM_PER_DEGREE_LAT, haversine_km
+
+logger = logging.getLogger(__name__)
+
+
+def waiting_pickups():
+    """(commande_id, restaurant position, supermarche position) rows of the PRETE, unassigned orders"""
+    from apps.orders.models import Commande
+
+    return Commande.objects.filter(
+        status='PRETE', livreur__isnull=True
+    ).values_list('id', 'restaurant__position', 'supermarche__position')
+
+
+def pickup_point(commande):
+    """Return the (lat, lon) pickup point of an order, or None"""
+    for merchant in (commande.restaurant, commande.supermarche):
+        if merchant is not None and merchant.position is not None:
+            return (merchant.position.y, merchant.position.x)
+    return None
+
+
+class PickupSpatialIndex:
+    """Grid buckets of (commande_id -> pickup point) for PRETE, unassigned orders"""
+
+    def __init__(self, cell_size_deg=None, refresh_seconds=None):
+        self.cell_size_deg = cell_size_deg or getattr(settings, 'PICKUP_INDEX_CELL_SIZE_DEG', 0.01)
+        self.refresh_seconds = refresh_seconds if refresh_seconds is not None else getattr(
+            settings, 'PICKUP_INDEX_REFRESH_SECONDS', 10
+        )
+        self._lock = threading.RLock()
+        self._cells = {}
+        self._points = {}
+        self._loaded_at = None
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_size_deg), math.floor(lon / self.cell_size_deg))
+
+    def rebuild(self):
+        """Reload every PRETE, unassigned order from the database"""
+        self.load(
+            (commande_id, position.y, position.x)
+            for commande_id, restaurant_position, supermarche_position in waiting_pickups()
+            for position in [restaurant_position or supermarche_position]
+            if position is not None
+        )
+        logger.debug(f"[PICKUP_INDEX] Rebuilt with {len(self._points)} orders")
+
+    def load(self, points):
+        """Replace the index content with (commande_id, lat, lon) triples"""
+        cells = {}
+        entries = {}
+        for commande_id, lat, lon in points:
+            cell = self._cell(lat, lon)
+            cells.setdefault(cell, {})[commande_id] = (lat, lon)
+            entries[commande_id] = (lat, lon, cell)
+
+        with self._lock:
+            self._cells = cells
+            self._points = entries
+            self._loaded_at = time.monotonic()
+
+    def _ensure_fresh(self):
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > self.refresh_seconds:
+            self.rebuild()
+
+    def upsert(self, commande_id, lat, lon):
+        with self._lock:
+            self._discard(commande_id)
+            cell = self._cell(lat, lon)
+            self._cells.setdefault(cell, {})[commande_id] = (lat, lon)
+            self._points[commande_id] = (lat, lon, cell)
+
+    def remove(self, commande_id):
+        with self._lock:
+            self._discard(commande_id)
+
+    def point(self, commande_id):
+        """Return the indexed (lat, lon) of an order, or None"""
+        entry = self._points.get(commande_id)
+        return entry[:2] if entry else None
+
+    def _discard(self, commande_id):
+        entry = self._points.pop(commande_id, None)
+        if entry is None:
+            return
+        bucket = self._cells.get(entry[2])
+        if bucket is not None:
+            bucket.pop(commande_id, None)
+            if not bucket:
+                del self._cells[entry[2]]
+
+    def sync(self, commande):
+        """Reflect the current state of an order after a status transition"""
+        if commande.status == 'PRETE' and commande.livreur_id is None:
+            point = pickup_point(commande)
+            if point is not None:
+                self.upsert(commande.id, *point)
+                return
+        self.remove(commande.id)
+
+    def nearby(self, lat, lon, radius_km, limit=20):
+        """Return [(commande_id, distance_km)] within radius_km, nearest first"""
+        self._ensure_fresh()
+        lat, lon, radius_km = float(lat), float(lon), float(radius_km)
+
+        dlat = radius_km / KM_PER_DEGREE_LAT
+        dlon = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+        min_i, min_j = self._cell(lat - dlat, lon - dlon)
+        max_i, max_j = self._cell(lat + dlat, lon + dlon)
+
+        candidates = []
+        with self._lock:
+            cells = self._cells
+            for i in range(min_i, max_i + 1):
+                for j in range(min_j, max_j + 1):
+                    bucket = cells.get((i, j))
+                    if not bucket:
+                        continue
+                    for commande_id, (plat, plon) in bucket.items():
+                        distance = haversine_km(lat, lon, plat, plon)
+                        if distance <= radius_km:
+                            candidates.append((distance, commande_id))
+
+        return [(commande_id, distance) for distance, commande_id in heapq.nsmallest(limit, candidates)]
+
+
+pickup_index = PickupSpatialIndex()
@@ -0,0 +1,155 @@
+"""
+Stacking of PRETE orders picked up at the same merchant.
+
+When a merchant marks several orders PRETE within STACKING_WINDOW_MINUTES
+and their delivery points lie in roughly the same direction from the
+pickup (bearings within STACKING_MAX_BEARING_DEG), one livreur can carry
+them together. ``group_bundles`` builds such lots of up to
+STACKING_MAX_ORDERS orders; the drop-off order of a lot is the shortest
+of all permutations, and a lot is only kept when no customer waits for
+more than STACKING_MAX_DETOUR_KM of extra ride compared to a direct
+delivery.
+
+``commandes_disponibles`` tags the orders of each lot, and ``accepter_lot``
+claims a whole lot at once (``claim_bundle``): the ordered pickup and
+drop-off stops are stored in ``TrajetLivraison.stops`` of every order of
+the lot.
+"""
+import itertools
+import math
+from collections import namedtuple
+
+from django.conf import settings
+
+from apps.geolocation.distances import haversine_km
+from apps.livreurs.spatial_index import pickup_point
+
+# One stackable order; ready_at is a unix timestamp (Commande.date_ready, stamped by marquer_prete)
+Candidate = namedtuple('Candidate', ['commande_id', 'merchant', 'pickup', 'drop', 'ready_at'])
+# commande_ids in drop-off order; cumulative_km[i] is the ride from the pickup to drop i
+Bundle = namedtuple('Bundle', ['commande_ids', 'pickup', 'drops', 'cumulative_km'])
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def bearing_deg(lat1, lon1, lat2, lon2):
+    """Initial bearing from point 1 to point 2, in degrees from north"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dlambda = math.radians(lon2 - lon1)
+    x = math.sin(dlambda) * math.cos(phi2)
+    y = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlambda)
+    return math.degrees(math.atan2(x, y)) % 360
+
+
+def angle_between(a, b):
+    difference = abs(a - b) % 360
+    return min(difference, 360 - difference)
+
+
+def candidate_for(commande):
+    """Candidate of an order (restaurant and supermarche loaded), or None when it has no pickup or drop point"""
+    pickup = pickup_point(commande)
+    if pickup is None or commande.delivery_position is None:
+        return None
+    merchant = ('restaurant', commande.restaurant_id) if commande.restaurant_id else ('supermarche', commande.supermarche_id)
+    return Candidate(
+        commande.id, merchant, pickup,
+        (commande.delivery_position.y, commande.delivery_position.x),
+        # date_updated moves on any later save (payment webhook); orders from before date_ready fall back to it
+        (commande.date_ready or commande.date_updated).timestamp(),
+    )
+
+
+def plan_route(pickup, drops):
+    """(drop indexes in visiting order, cumulative km) of the shortest route from the pickup through every drop"""
+    best = None
+    for sequence in itertools.permutations(range(len(drops))):
+        position, ridden, cumulative = pickup, 0.0, []
+        for index in sequence:
+            ridden += haversine_km(*position, *drops[index])
+            cumulative.append(ridden)
+            position = drops[index]
+            if best is not None and ridden >= best[1][-1]:
+                break
+        else:
+            best = (sequence, cumulative)
+    return best
+
+
+def _bundle(members):
+    pickup = members[0].pickup
+    sequence, cumulative = plan_route(pickup, [member.drop for member in members])
+    max_detour_km = _setting('STACKING_MAX_DETOUR_KM', 2.0)
+    for rank, index in enumerate(sequence):
+        direct_km = haversine_km(*pickup, *members[index].drop)
+        if cumulative[rank] - direct_km > max_detour_km:
+            return None
+    return Bundle(
+        [members[index].commande_id for index in sequence], pickup,
+        [members[index].drop for index in sequence], cumulative,
+    )
+
+
+def group_bundles(candidates):
+    """Lots of two or more stackable candidates; each candidate is in at most one lot"""
+    max_orders = _setting('STACKING_MAX_ORDERS', 3)
+    window_seconds = _setting('STACKING_WINDOW_MINUTES', 10) * 60
+    max_bearing = _setting('STACKING_MAX_BEARING_DEG', 45)
+
+    by_merchant = {}
+    for candidate in candidates:
+        by_merchant.setdefault(candidate.merchant, []).append(candidate)
+
+    bundles = []
+    for orders in by_merchant.values():
+        if len(orders) < 2:
+            continue
+        # Oldest ready order first: it seeds the lot and is never left behind for a newer one
+        orders.sort(key=lambda candidate: candidate.ready_at)
+        bearings = {candidate.commande_id: bearing_deg(*candidate.pickup, *candidate.drop) for candidate in orders}
+        remaining = list(orders)
+        while len(remaining) >= 2:
+            seed = remaining.pop(0)
+            members = [seed]
+            bundle = None
+            for candidate in list(remaining):
+                if len(members) >= max_orders:
+                    break
+                if candidate.ready_at - seed.ready_at > window_seconds:
+                    break
+                if angle_between(bearings[seed.commande_id], bearings[candidate.commande_id]) > max_bearing:
+                    continue
+                attempt = _bundle(members + [candidate])
+                if attempt is not None:
+                    members.append(candidate)
+                    remaining.remove(candidate)
+                    bundle = attempt
+            if bundle is not None:
+                bundles.append(bundle)
+    return bundles
+
+
+def bundle_stops(bundle):
+    """JSON stops of a lot, as stored in TrajetLivraison.stops"""
+    stops = [{
+        'type': 'collecte',
+        'commandes': list(bundle.commande_ids),
+        'latitude': bundle.pickup[0],
+        'longitude': bundle.pickup[1],
+    }]
+    for commande_id, drop, cumulative_km in zip(bundle.commande_ids, bundle.drops, bundle.cumulative_km):
+        stops.append({
+            'type': 'livraison',
+            'commande': commande_id,
+            'latitude': drop[0],
+            'longitude': drop[1],
+            'distance_km': round(cumulative_km, 2),
+        })
+    return stops
+
+
+def bundle_commande_ids(stops):
+    """Commande ids of the drop-off stops, in visiting order"""
+    return [stop['commande'] for stop in stops or () if stop.get('type') == 'livraison']
@@ -0,0 +1,16 @@
+from celery import shared_task
+
+from apps.livreurs.dispatch import dispatch
+from apps.livreurs.rollups import rollover_all
+
+
+@shared_task
+def rollover_statistiques():
+    """Reset the day/week/month StatistiquesLivreur windows that have ended"""
+    return rollover_all()
+
+
+@shared_task
+def dispatch_commandes():
+    """One batch dispatch round (no-op unless DISPATCH_MODE is 'offer' or 'assign')"""
+    return dispatch()
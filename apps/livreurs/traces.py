@@ -0,0 +1,384 @@
+"""
+GPS trace recording for active deliveries.
+
+When a livreur claims an order, a trace is opened for it; every ping
+received by ``record_positions`` while it is open is appended to a
+compact buffer of packed (lat, lon, unix time) float64 triplets. Pings
+closer than TRACE_MIN_MOVE_M to the previous kept point (a courier
+waiting at the restaurant) and jumps implying more than
+TRACE_MAX_SPEED_KMH (GPS glitches) are dropped.
+
+Memory is bounded: a buffer that reaches TRACE_MAX_POINTS is simplified
+in place with Douglas-Peucker, and the length the simplification removes
+is kept in ``folded_m``, so that the travelled distance is always
+``folded_m + path length of the buffer``.
+
+A livreur carrying a stacked lot has one open trace per order of the lot,
+all fed by the same pings; each order's trace therefore ends at its own
+drop-off, and ``finish_trace`` only credits the rollups with the distance
+ridden since the previous drop-off of the lot.
+
+On delivery, ``finish_trace`` simplifies the buffer with
+TRACE_SIMPLIFY_TOLERANCE_M into the TrajetLivraison LineString and
+stores the travelled distance and duration; the distance also feeds the
+StatistiquesLivreur rollups. Storage follows COURIER_POSITION_BUFFER:
+a per-process dict ('local') or Redis ('redis'), where the buffer is a
+string grown with APPEND.
+"""
+import logging
+import math
+import threading
+from array import array
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.contrib.gis.geos import LineString
+from django.db.models import Max
+from django.utils import timezone
+
+from apps.geolocation.distances import KM_PER_DEGREE_LAT, haversine_km
+
+logger = logging.getLogger(__name__)
+
+POINT_BYTES = 24  # three float64
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def path_length_m(coords):
+    """Length in meters of a flat [lat, lon, t, lat, lon, t, ...] sequence"""
+    total = 0.0
+    for i in range(3, len(coords), 3):
+        total += haversine_km(coords[i - 3], coords[i - 2], coords[i], coords[i + 1]) * 1000
+    return total
+
+
+def simplify(coords, tolerance_m):
+    """Douglas-Peucker on a flat (lat, lon, t) sequence; returns the kept triplets, flat"""
+    points = np.asarray(coords, dtype=float).reshape(-1, 3)
+    if len(points) <= 2:
+        return array('d', points.ravel())
+    # Local planar projection in meters (a city is small enough)
+    y = points[:, 0] * KM_PER_DEGREE_LAT * 1000
+    x = points[:, 1] * KM_PER_DEGREE_LAT * 1000 * math.cos(math.radians(points[0, 0]))
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx, dy = x[last] - x[first], y[last] - y[first]
+        px, py = x[first + 1:last] - x[first], y[first + 1:last] - y[first]
+        norm = math.hypot(dx, dy)
+        if norm == 0:
+            distances = np.hypot(px, py)
+        else:
+            distances = np.abs(dx * py - dy * px) / norm
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance_m:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return array('d', points[keep].ravel())
+
+
+class Trace:
+    """Buffered pings of one delivery"""
+    __slots__ = ('commande_id', 'livreur_id', 'started_at', 'coords', 'folded_m')
+
+    def __init__(self, commande_id, livreur_id, started_at, coords=None, folded_m=0.0):
+        self.commande_id = commande_id
+        self.livreur_id = livreur_id
+        self.started_at = started_at
+        self.coords = coords if coords is not None else array('d')
+        self.folded_m = folded_m
+
+    def __len__(self):
+        return len(self.coords) // 3
+
+    def accepts(self, lat, lon, timestamp):
+        """False for pings that are stale, stationary or physically impossible"""
+        if timestamp < self.started_at:
+            return False
+        if not self.coords:
+            return True
+        last_lat, last_lon, last_t = self.coords[-3:]
+        if timestamp <= last_t:
+            return False
+        moved_m = haversine_km(last_lat, last_lon, lat, lon) * 1000
+        if moved_m < _setting('TRACE_MIN_MOVE_M', 5):
+            return False
+        return moved_m / (timestamp - last_t) * 3.6 <= _setting('TRACE_MAX_SPEED_KMH', 120)
+
+    def compact(self, max_points):
+        """Simplify the buffer in place to at most half of max_points, keeping the travelled distance"""
+        before = path_length_m(self.coords)
+        tolerance_m = _setting('TRACE_COMPACT_TOLERANCE_M', 5)
+        coords = simplify(self.coords, tolerance_m)
+        while len(coords) // 3 > max_points // 2:
+            tolerance_m *= 2
+            coords = simplify(coords, tolerance_m)
+        self.coords = coords
+        self.folded_m += before - path_length_m(coords)
+
+    @property
+    def distance_m(self):
+        return self.folded_m + path_length_m(self.coords)
+
+    def summary(self, ended_at):
+        """(LineString or None, distance_km, duration_minutes) of a trace closed at ended_at (unix time)"""
+        coords = simplify(self.coords, _setting('TRACE_SIMPLIFY_TOLERANCE_M', 10))
+        route = None
+        if len(coords) >= 6:
+            route = LineString([(coords[i + 1], coords[i]) for i in range(0, len(coords), 3)], srid=4326)
+        return route, round(self.distance_m / 1000, 2), max(0, round((ended_at - self.started_at) / 60))
+
+
+class LocalTraceRecorder:
+    """Open traces of this process: {commande_id: Trace} and {livreur_id: [commande_id]}"""
+
+    def __init__(self, max_points):
+        self.max_points = max_points
+        self._lock = threading.Lock()
+        self._traces = {}
+        self._active = {}
+
+    def start(self, commande_ids, livreur_id, started_at):
+        with self._lock:
+            for commande_id in commande_ids:
+                self._traces[commande_id] = Trace(commande_id, livreur_id, started_at)
+            # A new claim adds to the deliveries the livreur already carries
+            active = self._active.get(livreur_id, [])
+            self._active[livreur_id] = active + [commande_id for commande_id in commande_ids if commande_id not in active]
+
+    def append(self, livreur_id, points):
+        """Append (lat, lon, unix time) points to the open traces of the livreur; return how many were kept per trace"""
+        commande_ids = self._active.get(livreur_id)
+        if not commande_ids:
+            return 0
+        points = sorted(points, key=lambda point: point[2])
+        kept = 0
+        with self._lock:
+            for commande_id in commande_ids:
+                trace = self._traces.get(commande_id)
+                if trace is None:
+                    continue
+                kept = 0
+                for lat, lon, timestamp in points:
+                    if trace.accepts(lat, lon, timestamp):
+                        trace.coords.extend((lat, lon, timestamp))
+                        kept += 1
+                if len(trace) >= self.max_points:
+                    trace.compact(self.max_points)
+        return kept
+
+    def pop(self, commande_id):
+        with self._lock:
+            trace = self._traces.pop(commande_id, None)
+            if trace is not None:
+                remaining = [other for other in self._active.get(trace.livreur_id, ()) if other != commande_id]
+                if remaining:
+                    self._active[trace.livreur_id] = remaining
+                else:
+                    self._active.pop(trace.livreur_id, None)
+        return trace
+
+    def memory_bytes(self):
+        return sum(trace.coords.buffer_info()[1] * trace.coords.itemsize for trace in self._traces.values())
+
+
+class RedisTraceRecorder:
+    """Open traces shared by all workers
+
+    ``{key}:active`` maps livreur ids to comma-separated commande ids; each
+    trace is a hash (livreur, started_at, folded_m) plus a string of packed
+    points.
+    """
+
+    def __init__(self, max_points, url, key):
+        import redis
+
+        self.max_points = max_points
+        self.key = key
+        self.active_key = f'{key}:active'
+        self._redis = redis.Redis.from_url(url)
+
+    def _keys(self, commande_id):
+        return f'{self.key}:{commande_id}', f'{self.key}:{commande_id}:points'
+
+    def start(self, commande_ids, livreur_id, started_at):
+        commande_ids = list(commande_ids)
+
+        def open_traces(pipeline):
+            for commande_id in commande_ids:
+                meta_key, points_key = self._keys(commande_id)
+                pipeline.delete(points_key)
+                pipeline.hset(meta_key, mapping={'livreur': livreur_id, 'started_at': started_at, 'folded_m': 0})
+
+        # A new claim adds to the deliveries the livreur already carries
+        self._update_active(
+            livreur_id, lambda active: active + [other for other in commande_ids if other not in active], open_traces
+        )
+
+    def _active(self, livreur_id, client=None):
+        value = (client or self._redis).hget(self.active_key, livreur_id)
+        return [int(commande_id) for commande_id in value.split(b',')] if value else []
+
+    def _update_active(self, livreur_id, change, queue=None):
+        """Read-modify-write of the livreur's active list under WATCH, with queue(pipeline)'s commands"""
+        import redis
+
+        with self._redis.pipeline() as pipeline:
+            while True:
+                try:
+                    pipeline.watch(self.active_key)
+                    commande_ids = change(self._active(livreur_id, pipeline))
+                    pipeline.multi()
+                    if queue is not None:
+                        queue(pipeline)
+                    if commande_ids:
+                        pipeline.hset(self.active_key, livreur_id, ','.join(str(other) for other in commande_ids))
+                    else:
+                        pipeline.hdel(self.active_key, livreur_id)
+                    pipeline.execute()
+                    return
+                except redis.WatchError:
+                    # A claim or a drop-off of another livreur changed the hash: read it again
+                    continue
+
+    def _load(self, commande_id, client=None):
+        meta_key, points_key = self._keys(commande_id)
+        client = client or self._redis
+        meta, raw = client.hgetall(meta_key), client.get(points_key) or b''
+        if not meta:
+            return None
+        return Trace(
+            commande_id, int(meta[b'livreur']), float(meta[b'started_at']),
+            array('d', raw), float(meta[b'folded_m'])
+        )
+
+    def append(self, livreur_id, points):
+        kept = 0
+        for commande_id in self._active(livreur_id):
+            kept = self._append(commande_id, livreur_id, points)
+        return kept
+
+    def _append(self, commande_id, livreur_id, points):
+        meta_key, points_key = self._keys(commande_id)
+        started_at = self._redis.hget(meta_key, 'started_at')
+        if started_at is None:
+            return 0
+        # Pings of one courier arrive in sequence: the last stored point is enough to filter
+        last = self._redis.getrange(points_key, -POINT_BYTES, -1)
+        trace = Trace(commande_id, livreur_id, float(started_at), array('d', last))
+        for lat, lon, timestamp in sorted(points, key=lambda point: point[2]):
+            if trace.accepts(lat, lon, timestamp):
+                trace.coords.extend((lat, lon, timestamp))
+        kept = array('d', trace.coords[len(last) // 8:])
+        if not kept:
+            return 0
+        length = self._redis.append(points_key, kept.tobytes())
+        if length // POINT_BYTES >= self.max_points:
+            self._compact(commande_id)
+        return len(kept) // 3
+
+    def _compact(self, commande_id):
+        import redis
+
+        meta_key, points_key = self._keys(commande_id)
+        with self._redis.pipeline() as pipeline:
+            try:
+                pipeline.watch(points_key)
+                trace = self._load(commande_id, pipeline)
+                if trace is None:
+                    return
+                trace.compact(self.max_points)
+                pipeline.multi()
+                pipeline.set(points_key, trace.coords.tobytes())
+                pipeline.hset(meta_key, 'folded_m', trace.folded_m)
+                pipeline.execute()
+            except redis.WatchError:
+                # Another worker appended meanwhile; the next append compacts again
+                pass
+
+    def pop(self, commande_id):
+        trace = self._load(commande_id)
+        if trace is None:
+            self._redis.delete(*self._keys(commande_id))
+            return None
+        # Watched like start: a claim arriving during a drop-off must not be dropped from the list
+        self._update_active(
+            trace.livreur_id, lambda active: [other for other in active if other != commande_id],
+            lambda pipeline: pipeline.delete(*self._keys(commande_id))
+        )
+        return trace
+
+
+def _build_recorder():
+    max_points = _setting('TRACE_MAX_POINTS', 1000)
+    if _setting('COURIER_POSITION_BUFFER', 'local') == 'redis':
+        return RedisTraceRecorder(
+            max_points,
+            _setting('COURIER_POSITION_REDIS_URL', settings.CELERY_BROKER_URL),
+            _setting('TRACE_REDIS_KEY', 'quickdeliver:traces'),
+        )
+    return LocalTraceRecorder(max_points)
+
+
+trace_recorder = _build_recorder()
+
+
+def start_trace(commande_ids, livreur_id):
+    """Open one trace per claimed order (several for a stacked lot)"""
+    trace_recorder.start(commande_ids, livreur_id, timezone.now().timestamp())
+
+
+def append_pings(livreur_id, points):
+    """Add (lat, lon, recorded_at) pings to the livreur's open trace, if any"""
+    return trace_recorder.append(livreur_id, [(lat, lon, recorded_at.timestamp()) for lat, lon, recorded_at in points])
+
+
+def discard_trace(commande_id):
+    trace_recorder.pop(commande_id)
+
+
+def finish_trace(commande):
+    """Store the trace of a delivered order as its TrajetLivraison; return the distance in km to credit, or None"""
+    from apps.geolocation.models import TrajetLivraison
+    from apps.livreurs.stacking import bundle_commande_ids
+
+    trace = trace_recorder.pop(commande.id)
+    if trace is None or commande.livreur_id is None:
+        return None
+    ended_at = commande.date_delivered or timezone.now()
+    route, distance_km, duration_minutes = trace.summary(ended_at.timestamp())
+    trajet, _ = TrajetLivraison.objects.update_or_create(
+        commande=commande,
+        defaults={
+            'livreur_id': commande.livreur_id,
+            'route': route,
+            'distance_km': distance_km,
+            'duration_minutes': duration_minutes,
+            'date_start': datetime.fromtimestamp(trace.started_at, tz=dt_timezone.utc),
+            'date_end': ended_at,
+        }
+    )
+    logger.info(f"[TRACES] Commande {commande.id}: {len(trace)} points, {distance_km} km")
+    if len(trace) < 2:
+        return None
+
+    # Within a lot, the ride up to the previous drop-off was already credited
+    siblings = [other for other in bundle_commande_ids(trajet.stops) if other != commande.id]
+    if siblings:
+        credited = TrajetLivraison.objects.filter(
+            commande_id__in=siblings, date_end__isnull=False
+        ).aggregate(credited=Max('distance_km'))['credited']
+        if credited is not None:
+            distance_km = max(0.0, round(distance_km - float(credited), 2))
+    return distance_km
@@ -1,19 +1,71 @@
+import logging
+from datetime import timedelta
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.db.models import Case, Count, DateField, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 from django.contrib.gis.geos import Point
-from django.contrib.gis.db.models.functions import Distance
-from django.contrib.gis.measure import D
-from apps.livreurs.models import Livreur, StatistiquesLivreur
+from apps.livreurs.models import Livreur
 from apps.livreurs.serializers import (
-    LivreurDetailSerializer, LivreurUpdateSerializer, LivreurPositionSerializer,
-    LivreurStatusUpdateSerializer, StatistiquesLivreurSerializer, RevenusLivreurSerializer
+    LivreurDetailSerializer, LivreurUpdateSerializer, LivreurPositionSerializer, LivreurPositionBatchSerializer,
+    LivreurStatusUpdateSerializer
 )
+from apps.livreurs.claims import claim_bundle, claim_commande
+from apps.livreurs.dispatch import current_offer
+from apps.livreurs.positions import apply_buffered_position, current_position, record_positions
+from apps.livreurs.rollups import get_statistiques
+from apps.livreurs.feed import EventStreamRenderer, async_event_stream, event_stream, snapshot_events
+from apps.livreurs.spatial_index import pickup_index
+from apps.livreurs.stacking import bundle_commande_ids, candidate_for, group_bundles
 from apps.orders.models import Commande
+from apps.orders.pagination import CommandeKeysetPagination
+from apps.orders.queries import commande_detail_queryset, filter_commandes
 from apps.users.permissions import IsDelivery, IsApproved
 
+logger = logging.getLogger(__name__)
+
+FRENCH_DAYS = {
+    'Monday': 'Lundi', 'Tuesday': 'Mardi', 'Wednesday': 'Mercredi',
+    'Thursday': 'Jeudi', 'Friday': 'Vendredi', 'Saturday': 'Samedi', 'Sunday': 'Dimanche'
+}
+
+
+def french_day_name(day):
+    day_name = day.strftime('%A')
+    return FRENCH_DAYS.get(day_name, day_name)
+
+
+def default_revenus_data(today):
+    """Zero earnings payload returned when no data can be computed"""
+    return {
+        'total_earnings_week': 0,
+        'total_earnings_month': 0,
+        'deliveries_week': 0,
+        'bonuses': 0,
+        'daily_breakdown': [
+            {
+                'date': str(today - timedelta(days=i)),
+                'day_name': french_day_name(today - timedelta(days=i)),
+                'earnings': 0,
+                'deliveries': 0
+            }
+            for i in range(7)
+        ],
+        'weekly_goal': 25,
+        'weekly_goal_progress': 0,
+        'average_rating': 4.5,
+        'average_delivery_time': 22,
+        'completion_rate': 0.95
+    }
+
+
 class LivreurViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated, IsDelivery]
     
@@ -21,7 +73,7 @@ class LivreurViewSet(viewsets.ViewSet):
     def me(self, request):
         """Get current user's delivery profile"""
         try:
-            livreur = request.user.livreur
+            livreur = apply_buffered_position(request.user.livreur)
             serializer = LivreurDetailSerializer(livreur, context={'request': request})
             return Response(serializer.data)
         except Livreur.DoesNotExist:
@@ -31,7 +83,7 @@ class LivreurViewSet(viewsets.ViewSet):
     def update_profile(self, request):
         """Update delivery profile"""
         try:
-            livreur = request.user.livreur
+            livreur = apply_buffered_position(request.user.livreur)
             serializer = LivreurUpdateSerializer(
                 livreur, data=request.data, partial=True
             )
@@ -44,16 +96,18 @@ class LivreurViewSet(viewsets.ViewSet):
     
     @action(detail=False, methods=['post'])
     def update_position(self, request):
-        """Update GPS position"""
+        """Update GPS position: one point, or a batch under 'points'"""
         try:
             livreur = request.user.livreur
-            serializer = LivreurPositionSerializer(data=request.data)
+            if 'points' in request.data:
+                serializer = LivreurPositionBatchSerializer(data=request.data)
+            else:
+                serializer = LivreurPositionSerializer(data=request.data)
             if serializer.is_valid():
-                livreur.current_latitude = serializer.validated_data['latitude']
-                livreur.current_longitude = serializer.validated_data['longitude']
-                livreur.last_position_update = timezone.now()
-                livreur.save()
-                return Response({'message': 'Position updated'})
+                # Buffered; the Livreur row is written in bulk by positions.write_positions
+                points = serializer.validated_data.get('points') or [serializer.validated_data]
+                record_positions(livreur.id, points)
+                return Response({'message': 'Position updated', 'points': len(points)})
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Livreur.DoesNotExist:
             return Response({'error': 'Delivery profile not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -67,7 +121,7 @@ class LivreurViewSet(viewsets.ViewSet):
             serializer = LivreurStatusUpdateSerializer(data=request.data)
             if serializer.is_valid():
                 livreur.status = serializer.validated_data['status']
-                livreur.save()
+                livreur.save(update_fields=['status'])
                 return Response({'status': livreur.status})
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Livreur.DoesNotExist:
@@ -98,6 +152,7 @@ class LivreurViewSet(viewsets.ViewSet):
             # Check if position is provided in request or use stored position
             latitude = request.query_params.get('latitude')
             longitude = request.query_params.get('longitude')
+            stored_position = None if latitude and longitude else current_position(livreur)
             
             if latitude and longitude:
                 # Use position from request and validate precision/format
@@ -116,13 +171,10 @@ class LivreurViewSet(viewsets.ViewSet):
                 user_location = Point(float(lon), float(lat), srid=4326)
 
                 # Keep the latest validated position on the profile
-                livreur.current_latitude = lat
-                livreur.current_longitude = lon
-                livreur.last_position_update = timezone.now()
-                livreur.save(update_fields=['current_latitude', 'current_longitude', 'last_position_update'])
-            elif livreur.current_latitude and livreur.current_longitude:
-                # Use stored position
-                user_location = Point(float(livreur.current_longitude), float(livreur.current_latitude), srid=4326)
+                record_positions(livreur.id, [position_serializer.validated_data])
+            elif stored_position:
+                # Use the buffered or stored position
+                user_location = Point(stored_position[1], stored_position[0], srid=4326)
             else:
                 # No position available
                 return Response({
@@ -131,49 +183,111 @@ class LivreurViewSet(viewsets.ViewSet):
                     'detail': 'Vous devez définir votre position GPS pour voir les commandes disponibles. Vous pouvez activer votre GPS ou autoriser l\'application à accéder à votre position.',
                     'action_required': 'update_position'
                 }, status=status.HTTP_400_BAD_REQUEST)
-            base_queryset = Commande.objects.filter(
-                status='PRETE',
-                livreur__isnull=True
+            # Nearby pickup points (restaurant, else supermarket) from the in-memory index
+            nearest = pickup_index.nearby(
+                user_location.y, user_location.x, livreur.action_radius_km, limit=20
             )
 
-            # Nearby pickup points: restaurant first, then supermarket when applicable.
-            nearby_restaurant_orders = list(
-                base_queryset
-                .filter(restaurant__position__isnull=False)
-                .annotate(distance=Distance('restaurant__position', user_location))
-                .filter(distance__lte=D(km=livreur.action_radius_km))
-            )
-            nearby_supermarket_orders = list(
-                base_queryset
-                .filter(supermarche__position__isnull=False)
-                .annotate(distance=Distance('supermarche__position', user_location))
-                .filter(distance__lte=D(km=livreur.action_radius_km))
-            )
+            # Re-check the candidates in one query: another process may have
+            # claimed or cancelled them since the index was last refreshed.
+            still_available = commande_detail_queryset().select_related('supermarche').filter(
+                id__in=[commande_id for commande_id, _ in nearest],
+                status='PRETE',
+                livreur__isnull=True
+            ).in_bulk()
 
-            deduped_orders = {}
-            for commande in nearby_restaurant_orders + nearby_supermarket_orders:
-                deduped_orders[str(commande.id)] = commande
+            commandes = []
+            distances = []
+            for commande_id, distance_km in nearest:
+                commande = still_available.get(commande_id)
+                if commande is None:
+                    pickup_index.remove(commande_id)
+                    continue
+                commandes.append(commande)
+                distances.append(distance_km)
 
-            commandes = sorted(
-                deduped_orders.values(),
-                key=lambda cmd: cmd.distance.m if getattr(cmd, 'distance', None) else float('inf')
-            )[:20]
-            
             from apps.orders.serializers import CommandeDetailSerializer
             serializer = CommandeDetailSerializer(commandes, many=True)
             serialized_orders = serializer.data
 
+            # Orders of the same merchant that one livreur can carry together
+            lots = {}
+            for bundle in group_bundles(filter(None, map(candidate_for, commandes))):
+                lot = {
+                    'commandes': bundle.commande_ids,
+                    'distance_km': round(bundle.cumulative_km[-1], 2),
+                }
+                lots.update((commande_id, lot) for commande_id in bundle.commande_ids)
+
             # Expose pickup distance in km for mobile list sorting/display.
-            for index, commande in enumerate(commandes):
-                distance_km = None
-                if getattr(commande, 'distance', None):
-                    distance_km = round(commande.distance.km, 2)
-                serialized_orders[index]['distance'] = distance_km
+            offered_id = current_offer(livreur.id)
+            for index, distance_km in enumerate(distances):
+                serialized_orders[index]['distance'] = round(distance_km, 2)
+                serialized_orders[index]['offered'] = commandes[index].id == offered_id
+                serialized_orders[index]['lot'] = lots.get(commandes[index].id)
 
+            # The order proposed by the dispatcher comes first
+            serialized_orders.sort(key=lambda order: not order['offered'])
             return Response(serialized_orders)
         except Livreur.DoesNotExist:
             return Response({'error': 'Delivery profile not found'}, status=status.HTTP_404_NOT_FOUND)
     
+    @action(
+        detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsDelivery, IsApproved],
+        renderer_classes=[EventStreamRenderer, JSONRenderer]
+    )
+    def flux(self, request):
+        """Server-Sent Events stream of new, claimed and cancelled pickups nearby"""
+        try:
+            livreur = request.user.livreur
+
+            latitude = request.query_params.get('latitude')
+            longitude = request.query_params.get('longitude')
+            stored_position = None if latitude and longitude else current_position(livreur)
+            if latitude and longitude:
+                position_serializer = LivreurPositionSerializer(
+                    data={'latitude': latitude, 'longitude': longitude}
+                )
+                if not position_serializer.is_valid():
+                    return Response({
+                        'error': 'invalid_position',
+                        'message': 'Coordonnées GPS invalides',
+                        'detail': position_serializer.errors
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                lat = float(position_serializer.validated_data['latitude'])
+                lon = float(position_serializer.validated_data['longitude'])
+            elif stored_position:
+                lat, lon = stored_position
+            else:
+                return Response({
+                    'error': 'position_not_set',
+                    'message': 'Position non définie',
+                    'action_required': 'update_position'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            radius_km = livreur.action_radius_km
+            asgi = isinstance(request._request, ASGIRequest)
+            if not asgi and not settings.COURIER_FEED_WSGI_STREAMS:
+                # Each stream would hold a WSGI worker thread for minutes (see apps.livreurs.feed)
+                return Response({
+                    'error': 'stream_unavailable',
+                    'message': 'Flux disponible uniquement via le serveur ASGI',
+                    'fallback': 'commandes_disponibles'
+                }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+            snapshot = list(snapshot_events(lat, lon, radius_km))
+            if asgi:
+                stream = async_event_stream(lat, lon, radius_km, snapshot, livreur_id=livreur.id)
+            else:
+                stream = event_stream(lat, lon, radius_km, snapshot, livreur_id=livreur.id)
+
+            response = StreamingHttpResponse(stream, content_type='text/event-stream')
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
+            return response
+        except Livreur.DoesNotExist:
+            return Response({'error': 'Delivery profile not found'}, status=status.HTTP_404_NOT_FOUND)
+
     @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsDelivery, IsApproved])
     def accepter_commande(self, request):
         """Accept a delivery order"""
@@ -182,34 +296,95 @@ class LivreurViewSet(viewsets.ViewSet):
             commande_id = request.data.get('commande_id')
             
             try:
-                commande = Commande.objects.get(id=commande_id, status='PRETE', livreur__isnull=True)
-            except Commande.DoesNotExist:
-                return Response({'error': 'Order not available'}, status=status.HTTP_404_NOT_FOUND)
-            
-            commande.livreur = livreur
-            commande.status = 'LIVREUR_ASSIGNE'
-            commande.save()
-            
+                commande_id = int(commande_id)
+            except (TypeError, ValueError):
+                return Response({'error': 'commande_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Losers of a concurrent claim fail fast, without reading the row
+            if not claim_commande(commande_id, livreur):
+                return Response({'error': 'Order not available'}, status=status.HTTP_409_CONFLICT)
+
+            commande = commande_detail_queryset().get(id=commande_id)
+
             from apps.orders.serializers import CommandeDetailSerializer
             return Response(CommandeDetailSerializer(commande).data)
         except Livreur.DoesNotExist:
             return Response({'error': 'Delivery profile not found'}, status=status.HTTP_404_NOT_FOUND)
     
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsDelivery, IsApproved])
+    def accepter_lot(self, request):
+        """Accept a lot of stacked orders picked up at the same merchant"""
+        try:
+            livreur = request.user.livreur
+            commande_ids = request.data.get('commande_ids')
+
+            try:
+                if not isinstance(commande_ids, list):
+                    raise TypeError
+                commande_ids = sorted({int(commande_id) for commande_id in commande_ids})
+            except (TypeError, ValueError):
+                return Response({'error': 'commande_ids is required'}, status=status.HTTP_400_BAD_REQUEST)
+            if len(commande_ids) < 2:
+                return Response({'error': 'A lot needs at least two orders'}, status=status.HTTP_400_BAD_REQUEST)
+
+            commandes = list(commande_detail_queryset().select_related('supermarche').filter(
+                id__in=commande_ids,
+                status='PRETE',
+                livreur__isnull=True
+            ))
+            if len(commandes) != len(commande_ids):
+                return Response({'error': 'Order not available'}, status=status.HTTP_409_CONFLICT)
+
+            # The lot is re-checked server side: same merchant, direction and detour limits
+            bundles = group_bundles(filter(None, map(candidate_for, commandes)))
+            if len(bundles) != 1 or sorted(bundles[0].commande_ids) != commande_ids:
+                return Response({'error': 'These orders cannot be stacked'}, status=status.HTTP_400_BAD_REQUEST)
+            bundle = bundles[0]
+
+            if not claim_bundle(bundle, livreur):
+                return Response({'error': 'Order not available'}, status=status.HTTP_409_CONFLICT)
+
+            commandes = commande_detail_queryset().in_bulk(bundle.commande_ids)
+            from apps.orders.serializers import CommandeDetailSerializer
+            return Response({
+                'commandes': CommandeDetailSerializer(
+                    [commandes[commande_id] for commande_id in bundle.commande_ids], many=True
+                ).data,
+                'distance_km': round(bundle.cumulative_km[-1], 2),
+            })
+        except Livreur.DoesNotExist:
+            return Response({'error': 'Delivery profile not found'}, status=status.HTTP_404_NOT_FOUND)
+
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsDelivery, IsApproved])
     def commande_active(self, request):
-        """Get current active delivery"""
+        """Get current active delivery (the next drop-off of a lot)"""
         try:
             livreur = request.user.livreur
-            commande = Commande.objects.filter(
+            commandes = list(commande_detail_queryset().select_related('trajet').filter(
                 livreur=livreur,
                 status__in=['LIVREUR_ASSIGNE', 'EN_ROUTE_COLLECTE', 'COLLECTEE', 'EN_LIVRAISON']
-            ).first()
+            ))
             
-            if not commande:
+            if not commandes:
                 return Response({'error': 'No active delivery'}, status=status.HTTP_404_NOT_FOUND)
-            
+
+            commande = commandes[0]
+            stops = getattr(getattr(commande, 'trajet', None), 'stops', None)
+            lot = bundle_commande_ids(stops)
+            active_ids = {other.id for other in commandes}
+            if lot:
+                # Follow the stop order of the lot
+                rank = {commande_id: index for index, commande_id in enumerate(lot)}
+                commande = min(commandes, key=lambda other: rank.get(other.id, len(rank)))
+
             from apps.orders.serializers import CommandeDetailSerializer
-            return Response(CommandeDetailSerializer(commande).data)
+            data = CommandeDetailSerializer(commande).data
+            if lot:
+                data['lot'] = {
+                    'commandes': [commande_id for commande_id in lot if commande_id in active_ids],
+                    'stops': stops,
+                }
+            return Response(data)
         except Livreur.DoesNotExist:
             return Response({'error': 'Delivery profile not found'}, status=status.HTTP_404_NOT_FOUND)
     
@@ -219,12 +394,12 @@ class LivreurViewSet(viewsets.ViewSet):
         try:
             livreur = request.user.livreur
             
-            # Get or create statistics record
-            stats, created = StatistiquesLivreur.objects.get_or_create(livreur=livreur)
+            # Rollups are maintained on delivery; only expired windows are reset here
+            stats = get_statistiques(livreur.id)
             
             # Get recent deliveries
             from apps.orders.serializers import CommandeDetailSerializer
-            recent_deliveries = Commande.objects.filter(
+            recent_deliveries = Commande.objects.select_related('restaurant').filter(
                 livreur=livreur,
                 status='LIVREE'
             ).order_by('-date_delivered')[:5]
@@ -291,154 +466,90 @@ class LivreurViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsDelivery])
     def revenus(self, request):
         """Get delivery earnings with daily breakdown"""
-        import traceback
-        import logging
-        logger = logging.getLogger(__name__)
-        
+        today = timezone.localdate()
+
         try:
             # Check if livreur profile exists first
             if not hasattr(request.user, 'livreur'):
                 logger.warning(f"[revenus] Aucun profil livreur pour l'utilisateur {request.user.id}")
-                # Create default response for missing profile
-                today = timezone.now().date()
-                french_days = {
-                    'Monday': 'Lundi', 'Tuesday': 'Mardi', 'Wednesday': 'Mercredi',
-                    'Thursday': 'Jeudi', 'Friday': 'Vendredi', 'Saturday': 'Samedi', 'Sunday': 'Dimanche'
-                }
-                daily_data = []
-                for i in range(7):
-                    day_date = today - timedelta(days=i)
-                    daily_data.append({
-                        'date': str(day_date),
-                        'day_name': french_days.get(day_date.strftime('%A'), day_date.strftime('%A')),
-                        'earnings': 0,
-                        'deliveries': 0
-                    })
-                return Response({
-                    'total_earnings_week': 0,
-                    'total_earnings_month': 0,
-                    'deliveries_week': 0,
-                    'bonuses': 0,
-                    'daily_breakdown': daily_data,
-                    'weekly_goal': 25,
-                    'weekly_goal_progress': 0,
-                    'average_rating': 4.5,
-                    'average_delivery_time': 22,
-                    'completion_rate': 0.95
-                })
-            
+                return Response(default_revenus_data(today))
+
             livreur = request.user.livreur
             logger.info(f"[revenus] Calcul des revenus pour livreur {livreur.id}")
-            
-            from datetime import datetime, timedelta
-            from django.db.models import Sum, Count, Avg
-            from django.db.models.functions import TruncDate
-            
-            # Get date range for this week (Monday to Sunday)
-            today = timezone.now().date()
-            start_of_week = today - timedelta(days=today.weekday())
-            end_of_week = start_of_week + timedelta(days=6)
-            
-            logger.info(f"[revenus] Semaine: {start_of_week} à {end_of_week}")
-            
-            # Calculate weekly earnings from delivered orders
-            weekly_deliveries = Commande.objects.filter(
-                livreur=livreur,
-                status='LIVREE',
-                date_delivered__date__gte=start_of_week,
-                date_delivered__date__lte=end_of_week
-            ).aggregate(
-                total_earnings=Sum('livreur_earnings'),
-                delivery_count=Count('id')
+
+            window_start = today - timedelta(days=6)
+
+            # Week and month totals come from the incrementally maintained rollups
+            stats = get_statistiques(livreur.id)
+
+            # One grouped query: delivered orders of the last 7 days are bucketed
+            # per delivery day, everything else (older deliveries, orders still in
+            # progress, cancellations) falls in a single NULL bucket that only
+            # feeds the lifetime completion rate and average delivery time.
+            delivered = Q(status='LIVREE')
+            rows = (
+                Commande.objects.filter(livreur=livreur)
+                .annotate(day=Case(
+                    When(delivered & Q(date_delivered__date__gte=window_start), then=TruncDate('date_delivered')),
+                    default=Value(None),
+                    output_field=DateField()
+                ))
+                .values('day')
+                .annotate(
+                    earnings=Sum('livreur_earnings', filter=delivered),
+                    delivered_count=Count('id', filter=delivered),
+                    accepted_count=Count('id', filter=~Q(status__in=['ANNULEE', 'REFUSEE'])),
+                    duration_total=Sum('estimated_duration_minutes', filter=delivered),
+                    # Orders without an estimate must not dilute the average
+                    timed_count=Count('estimated_duration_minutes', filter=delivered),
+                )
+                .order_by()
             )
-            
-            total_earnings_week = float(weekly_deliveries['total_earnings'] or 0)
-            deliveries_week = weekly_deliveries['delivery_count'] or 0
-            
+
+            per_day = {}
+            completed_orders = accepted_orders = duration_total = timed_orders = 0
+            for row in rows:
+                completed_orders += row['delivered_count']
+                accepted_orders += row['accepted_count']
+                duration_total += row['duration_total'] or 0
+                timed_orders += row['timed_count']
+                if row['day'] is not None:
+                    per_day[row['day']] = (float(row['earnings'] or 0), row['delivered_count'])
+
+            total_earnings_week = float(stats.earnings_week or 0)
+            total_earnings_month = float(stats.earnings_month or 0)
+            deliveries_week = stats.deliveries_week or 0
+
             logger.info(f"[revenus] Semaine: {deliveries_week} livraisons, {total_earnings_week} XOF")
-            
-            # Monthly earnings
-            start_of_month = today.replace(day=1)
-            monthly_deliveries = Commande.objects.filter(
-                livreur=livreur,
-                status='LIVREE',
-                date_delivered__date__gte=start_of_month
-            ).aggregate(
-                total_earnings=Sum('livreur_earnings')
-            )
-            total_earnings_month = float(monthly_deliveries['total_earnings'] or 0)
-            
-            # Bonuses (could be from a bonuses field or calculated separately)
-            bonuses = 0
-            
-            # Daily breakdown for the last 7 days
+
+            # Daily breakdown for the last 7 days, zero-filled
             daily_data = []
-            french_days = {
-                'Monday': 'Lundi',
-                'Tuesday': 'Mardi',
-                'Wednesday': 'Mercredi',
-                'Thursday': 'Jeudi',
-                'Friday': 'Vendredi',
-                'Saturday': 'Samedi',
-                'Sunday': 'Dimanche'
-            }
-            
             for i in range(7):
                 day_date = today - timedelta(days=i)
-                day_start = timezone.make_aware(datetime.combine(day_date, datetime.min.time()))
-                day_end = timezone.make_aware(datetime.combine(day_date, datetime.max.time()))
-                
-                day_deliveries = Commande.objects.filter(
-                    livreur=livreur,
-                    status='LIVREE',
-                    date_delivered__gte=day_start,
-                    date_delivered__lte=day_end
-                ).aggregate(
-                    earnings=Sum('livreur_earnings'),
-                    count=Count('id')
-                )
-                
-                day_name = day_date.strftime('%A')
-                
+                earnings, count = per_day.get(day_date, (0.0, 0))
                 daily_data.append({
                     'date': str(day_date),
-                    'day_name': french_days.get(day_name, day_name),
-                    'earnings': float(day_deliveries['earnings'] or 0),
-                    'deliveries': day_deliveries['count'] or 0
+                    'day_name': french_day_name(day_date),
+                    'earnings': earnings,
+                    'deliveries': count
                 })
-            
-            logger.info(f"[revenus] Daily breakdown: {len(daily_data)} jours")
-            
+
             # Weekly goal progress (25 deliveries per week)
             weekly_goal = 25
             weekly_goal_progress = min(deliveries_week / weekly_goal, 1.0)
-            
+
             # Performance stats - get from Livreur model or calculate
             avg_rating = float(livreur.average_rating) if livreur.average_rating else 4.5
-            
-            # Calculate completion rate from order statistics
-            completed_orders = Commande.objects.filter(
-                livreur=livreur,
-                status='LIVREE'
-            ).count()
-            accepted_orders = Commande.objects.filter(
-                livreur=livreur
-            ).exclude(status__in=['ANNULEE', 'REFUSEE']).count()
             completion_rate = completed_orders / accepted_orders if accepted_orders > 0 else 0.95
-            
-            # Calculate average delivery time (in minutes) from completed orders
-            avg_delivery_time_result = Commande.objects.filter(
-                livreur=livreur,
-                status='LIVREE',
-                estimated_duration_minutes__isnull=False
-            ).aggregate(avg_time=Avg('estimated_duration_minutes'))
-            avg_delivery_time = int(avg_delivery_time_result['avg_time'] or 22)
-            
+            avg_time = duration_total / timed_orders if timed_orders else None
+            avg_delivery_time = int(avg_time or 22)
+
             data = {
                 'total_earnings_week': total_earnings_week,
                 'total_earnings_month': total_earnings_month,
                 'deliveries_week': deliveries_week,
-                'bonuses': bonuses,
+                # Bonuses (could be from a bonuses field or calculated separately)
+                'bonuses': 0,
                 'daily_breakdown': daily_data,
                 'weekly_goal': weekly_goal,
                 'weekly_goal_progress': weekly_goal_progress,
@@ -446,85 +557,36 @@ class LivreurViewSet(viewsets.ViewSet):
                 'average_delivery_time': avg_delivery_time,
                 'completion_rate': completion_rate
             }
-            
+
             logger.info(f"[revenus] Réponse générée avec succès")
             return Response(data)
-            
+
         except Livreur.DoesNotExist:
             logger.warning(f"[revenus] Profil livreur non trouvé pour utilisateur {request.user.id}")
-            today = timezone.now().date()
-            french_days = {
-                'Monday': 'Lundi', 'Tuesday': 'Mardi', 'Wednesday': 'Mercredi',
-                'Thursday': 'Jeudi', 'Friday': 'Vendredi', 'Saturday': 'Samedi', 'Sunday': 'Dimanche'
-            }
-            daily_data = []
-            for i in range(7):
-                day_date = today - timedelta(days=i)
-                daily_data.append({
-                    'date': str(day_date),
-                    'day_name': french_days.get(day_date.strftime('%A'), day_date.strftime('%A')),
-                    'earnings': 0,
-                    'deliveries': 0
-                })
-            
-            return Response({
-                'total_earnings_week': 0,
-                'total_earnings_month': 0,
-                'deliveries_week': 0,
-                'bonuses': 0,
-                'daily_breakdown': daily_data,
-                'weekly_goal': 25,
-                'weekly_goal_progress': 0,
-                'average_rating': 4.5,
-                'average_delivery_time': 22,
-                'completion_rate': 0.95
-            })
+            return Response(default_revenus_data(today))
         except Exception as e:
-            # Log the error for debugging
-            logger.error(f"[revenus] Erreur: {str(e)}")
-            traceback.print_exc()
-            
-            # Return default data on error to avoid frontend crash
-            today = timezone.now().date()
-            french_days = {
-                'Monday': 'Lundi', 'Tuesday': 'Mardi', 'Wednesday': 'Mercredi',
-                'Thursday': 'Jeudi', 'Friday': 'Vendredi', 'Saturday': 'Samedi', 'Sunday': 'Dimanche'
-            }
-            daily_data = []
-            for i in range(7):
-                day_date = today - timedelta(days=i)
-                daily_data.append({
-                    'date': str(day_date),
-                    'day_name': french_days.get(day_date.strftime('%A'), day_date.strftime('%A')),
-                    'earnings': 0,
-                    'deliveries': 0
-                })
-            
-            return Response({
-                'total_earnings_week': 0,
-                'total_earnings_month': 0,
-                'deliveries_week': 0,
-                'bonuses': 0,
-                'daily_breakdown': daily_data,
-                'weekly_goal': 25,
-                'weekly_goal_progress': 0,
-                'average_rating': 4.5,
-                'average_delivery_time': 22,
-                'completion_rate': 0.95
-            })
+            # Log the error and return default data to avoid frontend crash
+            logger.exception(f"[revenus] Erreur: {str(e)}")
+            return Response(default_revenus_data(today))
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsDelivery])
     def historique(self, request):
-        """Get delivery history"""
+        """Delivery history, newest first (cursor pagination)"""
         try:
             livreur = request.user.livreur
-            commandes = Commande.objects.filter(
-                livreur=livreur,
-                status__in=['LIVREE', 'ANNULEE']
-            ).order_by('-date_delivered')[:50]
-            
-            from apps.orders.serializers import CommandeDetailSerializer
-            serializer = CommandeDetailSerializer(commandes, many=True)
-            return Response(serializer.data)
+
+            from apps.orders.serializers import CommandeDetailSerializer, CommandeHistoryFilterSerializer
+            filters = CommandeHistoryFilterSerializer(data=request.query_params)
+            if not filters.is_valid():
+                return Response(filters.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            commandes = filter_commandes(
+                commande_detail_queryset().filter(livreur=livreur, status__in=['LIVREE', 'ANNULEE']),
+                **filters.validated_data
+            )
+            paginator = CommandeKeysetPagination(page_size=50)
+            page = paginator.paginate_queryset(commandes, request, view=self)
+            serializer = CommandeDetailSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
         except Livreur.DoesNotExist:
             return Response({'error': 'Delivery profile not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-17
+
+from django.db import migrations, models
+
+
+def backfill_event_id(apps, schema_editor):
+    """Order notifications created before the column carry the event id in data"""
+    Notification = apps.get_model('notifications', 'Notification')
+    notifications = []
+    seen = set()
+    for notification in Notification.objects.filter(data__has_key='event_id').order_by('id').iterator():
+        event_id = notification.data.get('event_id')
+        if event_id is None or event_id in seen:
+            continue
+        seen.add(event_id)
+        notification.event_id = event_id
+        notifications.append(notification)
+    Notification.objects.bulk_update(notifications, ['event_id'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='event_id',
+            field=models.BigIntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_event_id, migrations.RunPython.noop),
+    ]
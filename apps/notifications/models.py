@@ -18,6 +18,8 @@ class Notification(models.Model):
     title = models.CharField(max_length=255)
     message = models.TextField()
     data = models.JSONField(default=dict, blank=True)
+    # Outbox event (apps.orders.outbox) this notification was created for; unique, so a re-relayed event is skipped
+    event_id = models.BigIntegerField(null=True, blank=True, unique=True)
     is_read = models.BooleanField(default=False)
     date_created = models.DateTimeField(auto_now_add=True)
     date_read = models.DateTimeField(null=True, blank=True)
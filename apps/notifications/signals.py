@@ -0,0 +1,49 @@
+from django.dispatch import receiver
+
+from apps.notifications.models import Notification
+from apps.orders.models import Commande, OrderEvent
+from apps.orders.outbox import EVENT_CREATED, order_events
+
+# outbox event -> (notification type, recipient, title, message)
+MESSAGES = {
+    EVENT_CREATED: ('NOUVELLE_COMMANDE', 'merchant', 'Nouvelle commande', 'La commande {numero} vient d\'être passée.'),
+    'accepter': ('COMMANDE_ACCEPTEE', 'client', 'Commande acceptée', 'Votre commande {numero} a été acceptée.'),
+    'assigner': ('LIVREUR_ASSIGNE', 'client', 'Livreur assigné', 'Un livreur va récupérer votre commande {numero}.'),
+    'livrer': ('LIVREE', 'client', 'Commande livrée', 'Votre commande {numero} a été livrée. Bon appétit !'),
+}
+
+
+@receiver(order_events, sender=OrderEvent)
+def notify_order_events(sender, events, **kwargs):
+    """One notification per relayed event; the unique event_id skips events already notified (at-least-once relay)"""
+    events = [event for event in events if event.event in MESSAGES]
+    if not events:
+        return
+
+    recipients = {
+        row['id']: row for row in Commande.objects.filter(
+            id__in={event.commande_id for event in events}
+        ).values('id', 'numero', 'client_id', 'restaurant__user_id', 'supermarche__user_id')
+    }
+
+    notifications = []
+    for event in events:
+        commande = recipients.get(event.commande_id)
+        if commande is None:
+            continue
+        notification_type, recipient, title, message = MESSAGES[event.event]
+        if recipient == 'client':
+            user_id = commande['client_id']
+        else:
+            user_id = commande['restaurant__user_id'] or commande['supermarche__user_id']
+        if user_id is None:
+            continue
+        notifications.append(Notification(
+            user_id=user_id,
+            notification_type=notification_type,
+            title=title,
+            message=message.format(numero=commande['numero']),
+            event_id=event.id,
+            data={'event_id': event.id, 'commande_id': event.commande_id, 'numero': commande['numero']},
+        ))
+    Notification.objects.bulk_create(notifications, ignore_conflicts=True)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from apps.orders.models import Commande, LigneCommande, Avis, Promotion
+from apps.orders.models import Commande, LigneCommande, Avis, Promotion, OrderEvent
 
 class LigneCommandeInline(admin.TabularInline):
     model = LigneCommande
@@ -36,7 +36,7 @@ class CommandeAdmin(admin.ModelAdmin):
             'fields': ('otp_code',)
         }),
         ('Dates', {
-            'fields': ('date_created', 'date_accepted', 'date_preparation', 'date_collected', 'date_delivered', 'date_updated')
+            'fields': ('date_created', 'date_accepted', 'date_preparation', 'date_ready', 'date_collected', 'date_delivered', 'date_updated')
         }),
     )
 
@@ -51,3 +51,10 @@ class PromotionAdmin(admin.ModelAdmin):
     list_display = ('code', 'title', 'promo_type', 'value', 'is_active')
     list_filter = ('promo_type', 'is_active', 'date_start')
     search_fields = ('code', 'title')
+
+@admin.register(OrderEvent)
+class OrderEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'commande_id', 'event', 'status', 'attempts', 'date_created', 'date_relayed')
+    list_filter = ('event', 'status')
+    search_fields = ('commande_id',)
+    readonly_fields = ('commande_id', 'event', 'status', 'previous_status', 'payload', 'date_created')
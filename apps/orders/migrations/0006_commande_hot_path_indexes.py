@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_commande_client_phone_and_client_delivery_address'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='commande',
+            index=models.Index(fields=['livreur', 'status', 'date_delivered'], name='cmd_livreur_statut_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commande',
+            index=models.Index(fields=['livreur', 'date_created', 'id'], name='cmd_livreur_hist_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commande',
+            index=models.Index(fields=['restaurant', 'date_created', 'id'], name='cmd_resto_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commande',
+            index=models.Index(fields=['restaurant', 'status'], name='cmd_resto_statut_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commande',
+            index=models.Index(condition=models.Q(('campay_reference__isnull', False)), fields=['campay_reference'], name='cmd_campay_ref_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_commande_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('commande_id', models.BigIntegerField()),
+                ('event', models.CharField(max_length=30)),
+                ('status', models.CharField(max_length=30)),
+                ('previous_status', models.CharField(blank=True, max_length=30)),
+                ('payload', models.JSONField(blank=True, default=dict)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('date_relayed', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [
+                    models.Index(condition=models.Q(('date_relayed__isnull', True)), fields=['id'], name='outbox_pending_idx'),
+                    models.Index(fields=['date_relayed'], name='outbox_relayed_idx'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-17
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_date_ready(apps, schema_editor):
+    """Orders already PRETE were last updated when they became ready, at best"""
+    Commande = apps.get_model('orders', 'Commande')
+    Commande.objects.filter(status='PRETE', date_ready__isnull=True).update(date_ready=F('date_updated'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_orderevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commande',
+            name='date_ready',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_date_ready, migrations.RunPython.noop),
+    ]
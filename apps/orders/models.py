@@ -81,12 +81,28 @@ class Commande(models.Model):
     date_created = models.DateTimeField(auto_now_add=True)
     date_accepted = models.DateTimeField(null=True, blank=True)
     date_preparation = models.DateTimeField(null=True, blank=True)
+    date_ready = models.DateTimeField(null=True, blank=True)
     date_collected = models.DateTimeField(null=True, blank=True)
     date_delivered = models.DateTimeField(null=True, blank=True)
     date_updated = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-date_created']
+        indexes = [
+            # Courier earnings, statistics and active delivery; with livreur IS NULL
+            # also the orders waiting for a livreur (pickup index rebuild)
+            models.Index(fields=['livreur', 'status', 'date_delivered'], name='cmd_livreur_statut_idx'),
+            # Courier history, keyset pagination on (date_created, id)
+            models.Index(fields=['livreur', 'date_created', 'id'], name='cmd_livreur_hist_idx'),
+            # Restaurant history and dashboard, keyset pagination on (date_created, id)
+            models.Index(fields=['restaurant', 'date_created', 'id'], name='cmd_resto_date_idx'),
+            models.Index(fields=['restaurant', 'status'], name='cmd_resto_statut_idx'),
+            # CamPay webhook lookup
+            models.Index(
+                fields=['campay_reference'], name='cmd_campay_ref_idx',
+                condition=models.Q(campay_reference__isnull=False)
+            ),
+        ]
     
     def __str__(self):
         return f"Commande {self.numero}"
@@ -165,3 +181,31 @@ class Promotion(models.Model):
     
     def __str__(self):
         return f"{self.code} - {self.title}"
+
+class OrderEvent(models.Model):
+    """Outbox row written in the transaction of an order creation or transition (apps.orders.outbox)"""
+    # Plain id: events outlive the order and are never joined
+    commande_id = models.BigIntegerField()
+    event = models.CharField(max_length=30)
+    status = models.CharField(max_length=30)
+    previous_status = models.CharField(max_length=30, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_relayed = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # Relay scan: pending events in write order
+            models.Index(
+                fields=['id'], name='outbox_pending_idx',
+                condition=models.Q(date_relayed__isnull=True)
+            ),
+            # Purge of relayed events
+            models.Index(fields=['date_relayed'], name='outbox_relayed_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.event} #{self.commande_id}"
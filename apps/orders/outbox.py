@@ -0,0 +1,137 @@
+"""
+Transactional outbox of order lifecycle events.
+
+Order creation and every transition (apps.orders.transitions) write an
+OrderEvent row in the same transaction as the order itself, so an event
+exists if and only if the change was committed. The relay
+(relay_order_events task, every OUTBOX_RELAY_SECONDS) reads the pending
+rows in id order, OUTBOX_BATCH_SIZE at a time, and sends them to the
+in-process subscribers of order_events; they are marked relayed once
+every receiver returned.
+
+Delivery is at least once: a batch whose delivery raised is retried
+event by event, and an order whose event failed is held back for the
+rest of the batch, so its events are never delivered out of order. An
+event that keeps failing is given up after OUTBOX_MAX_ATTEMPTS. Receivers
+must therefore tolerate duplicates (apps.notifications.signals skips
+events it already handled). A cache lock keeps one relay running at a
+time; relayed rows are purged after OUTBOX_RETENTION_DAYS.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils import timezone
+
+from apps.orders.models import OrderEvent
+
+logger = logging.getLogger(__name__)
+
+EVENT_CREATED = 'creee'
+RELAY_LOCK_KEY = 'orders:outbox:relay'
+
+# kwargs: events (OrderEvent list, in write order)
+order_events = Signal()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def record_events(commandes, event, previous=''):
+    """Write the outbox rows of an order change; call inside the transaction that makes it"""
+    OrderEvent.objects.bulk_create([
+        OrderEvent(
+            commande_id=commande.id,
+            event=event,
+            status=commande.status,
+            previous_status=previous or '',
+            payload={
+                'numero': commande.numero or None,
+                'client_id': commande.client_id,
+                'restaurant_id': commande.restaurant_id,
+                'supermarche_id': commande.supermarche_id,
+                'livreur_id': commande.livreur_id,
+            },
+        )
+        for commande in commandes
+    ])
+
+
+def pending_events(limit):
+    return list(
+        OrderEvent.objects.filter(
+            date_relayed__isnull=True, attempts__lt=_setting('OUTBOX_MAX_ATTEMPTS', 10)
+        ).order_by('id')[:limit]
+    )
+
+
+def _deliver_each(events):
+    """Deliver events one at a time; return (delivered, [(event, error)])"""
+    delivered, failed, held = [], [], set()
+    for event in events:
+        if event.commande_id in held:
+            continue
+        try:
+            order_events.send(sender=OrderEvent, events=[event])
+        except Exception as e:
+            logger.warning(f"[OUTBOX] event {event.id} ({event.event} #{event.commande_id}) failed: {e}")
+            failed.append((event, repr(e)))
+            held.add(event.commande_id)
+        else:
+            delivered.append(event)
+    return delivered, failed
+
+
+def relay_batch(batch_size=None):
+    """Deliver one batch of pending events; return (fetched, relayed)"""
+    events = pending_events(batch_size or _setting('OUTBOX_BATCH_SIZE', 500))
+    if not events:
+        return 0, 0
+
+    try:
+        order_events.send(sender=OrderEvent, events=events)
+        delivered, failed = events, []
+    except Exception:
+        logger.exception(f"[OUTBOX] batch of {len(events)} events failed, retrying one by one")
+        delivered, failed = _deliver_each(events)
+
+    if delivered:
+        OrderEvent.objects.filter(id__in=[event.id for event in delivered]).update(date_relayed=timezone.now())
+    max_attempts = _setting('OUTBOX_MAX_ATTEMPTS', 10)
+    for event, error in failed:
+        OrderEvent.objects.filter(id=event.id).update(attempts=F('attempts') + 1, last_error=error[:2000])
+        if event.attempts + 1 >= max_attempts:
+            logger.error(f"[OUTBOX] giving up event {event.id} ({event.event} #{event.commande_id}): {error}")
+    return len(events), len(delivered)
+
+
+def relay(batch_size=None, max_seconds=None):
+    """Drain the outbox until it is empty, a batch fails or max_seconds ran out; return events relayed"""
+    lock_seconds = _setting('OUTBOX_LOCK_SECONDS', 60)
+    if not cache.add(RELAY_LOCK_KEY, 1, lock_seconds):
+        return 0
+    deadline = time.monotonic() + (max_seconds or lock_seconds / 2)
+    total = 0
+    try:
+        while time.monotonic() < deadline:
+            fetched, relayed = relay_batch(batch_size)
+            total += relayed
+            if not fetched or relayed < fetched:
+                break
+    finally:
+        cache.delete(RELAY_LOCK_KEY)
+    if total:
+        logger.debug(f"[OUTBOX] relayed {total} events")
+    return total
+
+
+def purge_relayed(days=None):
+    """Delete events relayed more than OUTBOX_RETENTION_DAYS ago"""
+    cutoff = timezone.now() - timedelta(days=days or _setting('OUTBOX_RETENTION_DAYS', 7))
+    deleted, _ = OrderEvent.objects.filter(date_relayed__lt=cutoff).delete()
+    return deleted
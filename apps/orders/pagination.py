@@ -0,0 +1,95 @@
+"""
+Keyset (cursor) pagination for order histories.
+
+Pages are ordered by (date_created, id) descending and the cursor is the
+(date_created, id) of the last row of the previous page, so fetching a page
+is one index range scan however deep it is, unlike OFFSET which reads and
+discards every preceding row. Rows inserted while a client is scrolling do
+not shift the following pages.
+"""
+import base64
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CommandeKeysetPagination(BasePagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, page_size=None):
+        if page_size is not None:
+            self.page_size = page_size
+
+    def get_page_size(self, request):
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(requested, self.max_page_size))
+
+    def encode_cursor(self, commande):
+        raw = f'{commande.date_created.isoformat()}|{commande.id}'
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            date_created, pk = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+            position = (parse_datetime(date_created), int(pk))
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def keyset_queryset(self, queryset, position=None):
+        """queryset in page order, starting after the (date_created, id) position when given"""
+        queryset = queryset.order_by('-date_created', '-id')
+        if position is not None:
+            date_created, pk = position
+            queryset = queryset.filter(
+                Q(date_created__lt=date_created) | Q(date_created=date_created, id__lt=pk)
+            )
+        return queryset
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        position = self.decode_cursor(cursor) if cursor else None
+        queryset = self.keyset_queryset(queryset, position)
+
+        # One extra row tells whether a next page exists, without a COUNT
+        rows = list(queryset[:page_size + 1])
+        self.next_cursor = self.encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+        return rows[:page_size]
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'next_cursor': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
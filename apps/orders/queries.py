@@ -0,0 +1,59 @@
+"""
+Querysets shaped for CommandeDetailSerializer.
+
+The serializer reads restaurant.commercial_name, livreur.user's name and
+every item with its produit and the produit's restaurant/supermarche.
+Serializing a list straight from ``Commande.objects`` costs several
+queries per order; ``commande_detail_queryset`` loads the same data in
+three queries whatever the number of orders (orders with their restaurant
+and livreur, items with their produits and merchants).
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from apps.orders.models import Commande, LigneCommande
+
+# Columns read by LigneCommandeSerializer and ProduitSerializer
+ITEM_FIELDS = (
+    'id', 'commande', 'quantity', 'unit_price', 'line_total', 'special_instructions',
+    'produit__id', 'produit__name', 'produit__description', 'produit__price',
+    'produit__discount_percentage', 'produit__discounted_price', 'produit__image',
+    'produit__category', 'produit__unit', 'produit__available', 'produit__stock',
+    'produit__preparation_time', 'produit__sales_count',
+    'produit__restaurant__id', 'produit__restaurant__commercial_name',
+    'produit__supermarche__id', 'produit__supermarche__commercial_name',
+)
+
+
+def items_prefetch():
+    return Prefetch(
+        'items',
+        queryset=LigneCommande.objects.select_related(
+            'produit__restaurant', 'produit__supermarche'
+        ).only(*ITEM_FIELDS)
+    )
+
+
+def commande_detail_queryset(queryset=None):
+    """Add the joins and prefetches CommandeDetailSerializer needs to a Commande queryset"""
+    if queryset is None:
+        queryset = Commande.objects.all()
+    return queryset.select_related('restaurant', 'livreur__user').prefetch_related(items_prefetch())
+
+
+def filter_commandes(queryset, status=None, date_from=None, date_to=None):
+    """Apply validated CommandeHistoryFilterSerializer data as range filters on date_created"""
+    if status:
+        queryset = queryset.filter(status__in=status)
+    # Local day bounds as datetimes, so the date_created index can be used
+    if date_from:
+        queryset = queryset.filter(
+            date_created__gte=timezone.make_aware(datetime.combine(date_from, time.min))
+        )
+    if date_to:
+        queryset = queryset.filter(
+            date_created__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+        )
+    return queryset
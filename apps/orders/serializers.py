@@ -1,7 +1,12 @@
 from rest_framework import serializers
+from apps.geolocation.routing import routing_engine
 from apps.orders.models import Commande, LigneCommande, Avis, Promotion
+from apps.orders.outbox import EVENT_CREATED, record_events
+from apps.products.models import Produit
 from apps.products.serializers import ProduitSerializer
+from apps.products.stock import OutOfStock, reserve_stock
 from decimal import Decimal
+from django.db import transaction
 from django.utils import timezone
 
 class LigneCommandeSerializer(serializers.ModelSerializer):
@@ -13,6 +18,9 @@ class LigneCommandeSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'unit_price', 'line_total']
 
 class LigneCommandeCreateSerializer(serializers.ModelSerializer):
+    # Plain id: CommandeCreateSerializer resolves every line's produit with one query
+    produit = serializers.IntegerField(min_value=1)
+
     class Meta:
         model = LigneCommande
         fields = ['produit', 'quantity', 'special_instructions']
@@ -74,6 +82,8 @@ class CommandeCreateSerializer(serializers.ModelSerializer):
                     address_parts.append(address.postal_code)
                 address_parts.append(address.country)
                 attrs['delivery_address_text'] = ', '.join(filter(None, address_parts))
+                if address.position is not None:
+                    attrs['delivery_position'] = address.position
             except (Address.DoesNotExist, AttributeError):
                 pass  # Will use delivery_address_text if already provided
 
@@ -93,8 +103,39 @@ class CommandeCreateSerializer(serializers.ModelSerializer):
         if not attrs.get('client_delivery_address'):
             attrs['client_delivery_address'] = attrs.get('delivery_address_text', '')
 
+        self._resolve_items(attrs)
         return attrs
 
+    def _resolve_items(self, attrs):
+        """Replace produit ids with Produit rows (one query) and check they can be ordered here"""
+        items = attrs.get('items', [])
+        produits = Produit.objects.select_related('restaurant', 'supermarche').in_bulk(
+            {item['produit'] for item in items}
+        )
+        restaurant = attrs.get('restaurant')
+        supermarche = attrs.get('supermarche')
+
+        errors = []
+        for item in items:
+            produit = produits.get(item['produit'])
+            if produit is None:
+                errors.append({'produit': f"Produit {item['produit']} introuvable."})
+            elif (
+                (restaurant and produit.restaurant_id != restaurant.id)
+                or (not restaurant and supermarche and produit.supermarche_id != supermarche.id)
+            ):
+                errors.append({'produit': f"{produit.name} n'est pas vendu par ce commerce."})
+            elif not produit.available:
+                errors.append({'produit': f"{produit.name} n'est pas disponible."})
+            elif produit.stock is not None and produit.stock < item.get('quantity', 1):
+                # Early answer only: reserve_stock is the authoritative check
+                errors.append({'quantity': f"Stock insuffisant pour {produit.name} ({produit.stock} restant(s))."})
+            else:
+                errors.append({})
+                item['produit'] = produit
+        if any(errors):
+            raise serializers.ValidationError({'items': errors})
+
     def create(self, validated_data):
         items_data = validated_data.pop('items', [])
         requested_delivery_fee = validated_data.pop('delivery_fee', None)
@@ -112,6 +153,17 @@ class CommandeCreateSerializer(serializers.ModelSerializer):
 
         delivery_fee = default_delivery_fee
 
+        # Pickup -> delivery ETA on the road network (straight-line estimate without a graph)
+        merchant = restaurant or supermarche
+        delivery_position = validated_data.get('delivery_position')
+        if merchant is not None and merchant.position is not None and delivery_position is not None:
+            route = routing_engine.route(
+                (merchant.position.y, merchant.position.x),
+                (delivery_position.y, delivery_position.x)
+            )
+            validated_data['distance_km'] = Decimal(str(route['distance_km']))
+            validated_data['estimated_duration_minutes'] = route['duration_minutes']
+
         products_amount = Decimal('0')
         line_items = []
 
@@ -136,15 +188,24 @@ class CommandeCreateSerializer(serializers.ModelSerializer):
             )
         total_amount = Decimal(requested_total) if requested_total is not None else computed_total
 
-        commande = Commande.objects.create(
-            products_amount=products_amount,
-            delivery_fee=delivery_fee,
-            total_amount=total_amount,
-            **validated_data
-        )
-
-        for line_item in line_items:
-            LigneCommande.objects.create(commande=commande, **line_item)
+        with transaction.atomic():
+            commande = Commande.objects.create(
+                products_amount=products_amount,
+                delivery_fee=delivery_fee,
+                total_amount=total_amount,
+                **validated_data
+            )
+            LigneCommande.objects.bulk_create([
+                LigneCommande(commande=commande, **line_item) for line_item in line_items
+            ])
+            try:
+                reserve_stock((line['produit'], line['quantity']) for line in line_items)
+            except OutOfStock as e:
+                # Raised inside the atomic block: the order and its lines are rolled back
+                raise serializers.ValidationError({
+                    'items': [f"Stock insuffisant pour {produit.name}." for produit in e.produits]
+                })
+            record_events([commande], EVENT_CREATED)
 
         return commande
 
@@ -183,6 +244,25 @@ class CommandeDetailSerializer(serializers.ModelSerializer):
             return '#150*50#'
         return None
 
+class CommandeHistoryFilterSerializer(serializers.Serializer):
+    """Query parameters of the paginated order histories"""
+    status = serializers.CharField(required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+
+    def validate_status(self, value):
+        statuses = [item.strip().upper() for item in value.split(',') if item.strip()]
+        valid = {choice for choice, _ in Commande.STATUS_CHOICES}
+        unknown = [item for item in statuses if item not in valid]
+        if unknown:
+            raise serializers.ValidationError(f"Statut inconnu: {', '.join(unknown)}")
+        return statuses
+
+    def validate(self, attrs):
+        if attrs.get('date_from') and attrs.get('date_to') and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError({'date_to': 'date_to doit être postérieure à date_from.'})
+        return attrs
+
 class AvisSerializer(serializers.ModelSerializer):
     class Meta:
         model = Avis
@@ -0,0 +1,15 @@
+from celery import shared_task
+
+from apps.orders.outbox import purge_relayed, relay
+
+
+@shared_task
+def relay_order_events():
+    """Drain the order event outbox to the in-process subscribers"""
+    return relay()
+
+
+@shared_task
+def purge_order_events():
+    """Delete relayed outbox rows past OUTBOX_RETENTION_DAYS"""
+    return purge_relayed()
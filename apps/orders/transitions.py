@@ -0,0 +1,138 @@
+"""
+Order state machine.
+
+TRANSITIONS lists every status change an order can go through, with the
+statuses it may start from and the date column it stamps. A transition
+is a compare-and-set UPDATE (``WHERE id = ? AND status = <observed>``)
+that writes only the status, that date, date_updated and the caller's
+extra fields: of two concurrent requests on the same order exactly one
+wins, and the other gets TransitionNotAllowed with the status it lost to,
+instead of silently overwriting the whole row.
+
+Side effects are not coded here; each subsystem subscribes in its own
+signals module. Database writes that must not be lost with the status
+change (stock and sales in products) listen to commande_transitioning,
+sent inside the transaction right after the UPDATE: they commit or roll
+back with it. Everything else (pickup index, feed and traces in
+livreurs, dashboard cache in restaurants) listens to
+commande_transitioned, sent once the change is committed; a failing
+receiver there is logged and does not stop the others. Both carry
+the transition, the updated orders and their previous status
+(sender=Commande). The same transaction writes the outbox rows
+(apps.orders.outbox) that the relay hands to asynchronous subscribers.
+"""
+import logging
+from collections import namedtuple
+
+from django.dispatch import Signal
+from django.db import transaction
+from django.utils import timezone
+
+from apps.orders.models import Commande
+from apps.orders.outbox import record_events
+
+logger = logging.getLogger(__name__)
+
+Transition = namedtuple('Transition', 'name sources target date_field')
+
+DELIVERY_STATUSES = ('LIVREUR_ASSIGNE', 'EN_ROUTE_COLLECTE', 'COLLECTEE', 'EN_LIVRAISON')
+OPEN_STATUSES = ('EN_ATTENTE', 'ACCEPTEE', 'EN_PREPARATION', 'PRETE') + DELIVERY_STATUSES
+
+TRANSITIONS = {transition.name: transition for transition in [
+    Transition('accepter', ('EN_ATTENTE',), 'ACCEPTEE', 'date_accepted'),
+    Transition('refuser', ('EN_ATTENTE',), 'REFUSEE', None),
+    Transition('commencer_preparation', ('ACCEPTEE',), 'EN_PREPARATION', 'date_preparation'),
+    Transition('marquer_prete', ('EN_PREPARATION',), 'PRETE', 'date_ready'),
+    Transition('assigner', ('PRETE',), 'LIVREUR_ASSIGNE', None),
+    Transition('livrer', DELIVERY_STATUSES, 'LIVREE', 'date_delivered'),
+    Transition('annuler', OPEN_STATUSES, 'ANNULEE', None),
+]}
+
+# kwargs: transition, commandes (updated in memory), previous (status before)
+commande_transitioning = Signal()
+commande_transitioned = Signal()
+
+
+class TransitionNotAllowed(Exception):
+    def __init__(self, transition, status):
+        self.transition = transition
+        self.status = status
+        super().__init__(f'{transition.name}: impossible depuis le statut {status}')
+
+
+def _values(transition, fields):
+    now = timezone.now()
+    values = {'status': transition.target, 'date_updated': now, **fields}
+    if transition.date_field:
+        values[transition.date_field] = now
+    return values
+
+
+def _send_committed(transition, commandes, previous):
+    """commande_transitioned, with every receiver run even if one fails: the change is already committed"""
+    results = commande_transitioned.send_robust(
+        sender=Commande, transition=transition, commandes=commandes, previous=previous
+    )
+    for receiver, result in results:
+        if isinstance(result, Exception):
+            logger.error(
+                f"[TRANSITIONS] {transition.name} on {[commande.id for commande in commandes]}: "
+                f"{getattr(receiver, '__qualname__', receiver)} failed: {result!r}",
+                exc_info=(type(result), result, result.__traceback__)
+            )
+
+
+def _notify(transition, commandes, previous):
+    # A receiver error rolls the transition back with its own writes
+    commande_transitioning.send(sender=Commande, transition=transition, commandes=commandes, previous=previous)
+    transaction.on_commit(lambda: _send_committed(transition, commandes, previous))
+
+
+def apply_transition(commande, name, **fields):
+    """Move a loaded order through the named transition, from the status it was read with
+
+    Raises TransitionNotAllowed if that status is not a source of the
+    transition or if the order changed since it was read. On success the
+    instance carries the written values.
+    """
+    transition = TRANSITIONS[name]
+    previous = commande.status
+    if previous not in transition.sources:
+        raise TransitionNotAllowed(transition, previous)
+
+    values = _values(transition, fields)
+    with transaction.atomic():
+        if not Commande.objects.filter(pk=commande.pk, status=previous).update(**values):
+            current = Commande.objects.filter(pk=commande.pk).values_list('status', flat=True).first()
+            raise TransitionNotAllowed(transition, current)
+        for field, value in values.items():
+            setattr(commande, field, value)
+        record_events([commande], transition.name, previous)
+        _notify(transition, [commande], previous)
+    return commande
+
+
+def transition_ids(commande_ids, name, filters=None, **fields):
+    """Move every listed order through the transition, all or nothing, without reading them
+
+    Used for claims, where losers must fail fast: nothing is read before
+    the UPDATE. The won rows are then read back in the same transaction,
+    so the outbox payload and the hooks get complete orders. Returns True
+    on success.
+    """
+    transition = TRANSITIONS[name]
+    commande_ids = list(commande_ids)
+    values = _values(transition, fields)
+    with transaction.atomic():
+        updated = Commande.objects.filter(
+            id__in=commande_ids, status__in=transition.sources, **(filters or {})
+        ).update(**values)
+        if updated != len(commande_ids):
+            transaction.set_rollback(True)
+            return False
+        previous = transition.sources[0] if len(transition.sources) == 1 else None
+        rows = Commande.objects.in_bulk(commande_ids)
+        commandes = [rows[commande_id] for commande_id in commande_ids]
+        record_events(commandes, transition.name, previous)
+        _notify(transition, commandes, previous)
+    return True
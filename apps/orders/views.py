@@ -4,15 +4,19 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
-from django.utils import timezone
+from django.db.models import prefetch_related_objects
 from django.contrib.gis.geos import Point
 from geopy.distance import geodesic
+from apps.core.idempotency import idempotent, mark_side_effect
 from apps.orders.models import Commande, LigneCommande, Avis, Promotion
 from apps.orders.serializers import (
     CommandeCreateSerializer, CommandeDetailSerializer,
     LigneCommandeSerializer, AvisSerializer, PromotionSerializer
 )
 from apps.users.permissions import IsClient, IsRestaurantOwner
+from apps.orders.queries import commande_detail_queryset, items_prefetch
+from apps.orders.transitions import TransitionNotAllowed, apply_transition
+from apps.restaurants.stats import invalidate_dashboard_stats
 from apps.payments.services import payment_service, PaymentService
 from django.conf import settings
 import logging
@@ -49,20 +53,22 @@ class CommandeViewSet(viewsets.ModelViewSet):
         
         # If user is a client, return their orders
         if user.user_type == 'CLIENT':
-            return Commande.objects.filter(client=user)
+            return commande_detail_queryset().filter(client=user)
         
         # If user is a restaurant owner, return orders for their restaurant
         if hasattr(user, 'restaurant'):
-            return Commande.objects.filter(restaurant=user.restaurant)
+            return commande_detail_queryset().filter(restaurant=user.restaurant)
 
         # If user is a delivery person, return orders assigned to them.
         # This is required for actions like `marquer-livree`.
         if hasattr(user, 'livreur'):
-            return Commande.objects.filter(livreur=user.livreur)
+            return commande_detail_queryset().filter(livreur=user.livreur)
         
         # Default: return empty queryset
         return Commande.objects.none()
     
+    # Retries of the same Idempotency-Key get the first answer: no second order, no second USSD prompt
+    @idempotent('orders:create')
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
@@ -70,36 +76,42 @@ class CommandeViewSet(viewsets.ModelViewSet):
             payment_phone = serializer.validated_data.get('payment_phone')
             total_amount = serializer.validated_data.get('total_amount')
             phone = payment_phone
+            mobile_money = payment_mode == 'MOBILE_MONEY' and payment_phone
 
-            campay_reference = None
-            operator = None
             ussd_code = None
 
-            if payment_mode == 'MOBILE_MONEY' and payment_phone:
-                try:
-                    if total_amount is None:
-                        return Response(
-                            {'error': 'Le montant total est requis pour un paiement Mobile Money'},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
+            if mobile_money:
+                if total_amount is None:
+                    return Response(
+                        {'error': 'Le montant total est requis pour un paiement Mobile Money'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
 
-                    # Use the improved phone validation from PaymentService
-                    is_valid, phone, operator = PaymentService.validate_phone(payment_phone)
-                    if not is_valid:
-                        return Response(
-                            {'error': 'Numéro Mobile Money invalide. Utilisez un numéro MTN (650-679) ou Orange (655-699) Cameroun.'},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
-                    
-                    # Validate amount is above minimum
-                    is_valid, error_msg = PaymentService.validate_amount(total_amount)
-                    if not is_valid:
-                        return Response(
-                            {'error': error_msg},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
+                # Use the improved phone validation from PaymentService
+                is_valid, phone, _ = PaymentService.validate_phone(payment_phone)
+                if not is_valid:
+                    return Response(
+                        {'error': 'Numéro Mobile Money invalide. Utilisez un numéro MTN (650-679) ou Orange (655-699) Cameroun.'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                
+                # Validate amount is above minimum
+                is_valid, error_msg = PaymentService.validate_amount(total_amount)
+                if not is_valid:
+                    return Response(
+                        {'error': error_msg},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+            # Order, lines and stock reservation commit together before any payment is initiated:
+            # an order that cannot be created (out of stock) never sends a USSD prompt
+            commande = serializer.save(client=request.user, payment_phone=phone)
+            mark_side_effect(request)
+            invalidate_dashboard_stats(commande.restaurant_id)
 
-                    amount_str = str(Decimal(total_amount).quantize(Decimal('1.')))
+            if mobile_money:
+                try:
+                    amount_str = str(Decimal(commande.total_amount).quantize(Decimal('1.')))
                     external_reference = f"ORDER-{request.user.id}-{uuid.uuid4().hex[:12].upper()}"
                     
                     campay_result = payment_service.init_collect(
@@ -108,44 +120,42 @@ class CommandeViewSet(viewsets.ModelViewSet):
                         description=f"Order payment - {request.user.email}",
                         external_reference=external_reference
                     )
-
-                    if campay_result.get('success'):
-                        payment_api_status = campay_result.get('status')
-                        if payment_api_status == 'FAILED':
-                            logger.warning(f"CamPay payment failed, order not created: {campay_result}")
-                            return Response(
-                                {
-                                    'error': "Le paiement Mobile Money a échoué immédiatement. Vérifiez le numéro et réessayez.",
-                                    'payment_status': 'FAILED',
-                                    'campay_reference': campay_result.get('reference')
-                                },
-                                status=status.HTTP_400_BAD_REQUEST
-                            )
-                        else:
-                            campay_reference = campay_result.get('reference')
-                            operator = campay_result.get('operator')
-                            ussd_code = campay_result.get('ussd_code')
-                            logger.info(f"CamPay payment initiated: {campay_reference}, USSD: {ussd_code}")
-                    else:
-                        logger.error(f"CamPay payment failed, order not created: {campay_result}")
-                        return Response(
-                            {'error': campay_result.get('error', 'Échec de l’initiation du paiement CamPay')},
-                            status=status.HTTP_400_BAD_REQUEST
-                        )
                 except Exception as e:
                     logger.error(f"CamPay exception: {str(e)}")
+                    self._cancel_unpaid(commande, 'Exception lors de l’initiation du paiement Mobile Money')
                     return Response(
                         {'error': 'Erreur lors de l’initiation du paiement Mobile Money'},
                         status=status.HTTP_500_INTERNAL_SERVER_ERROR
                     )
+
+                if campay_result.get('success'):
+                    payment_api_status = campay_result.get('status')
+                    if payment_api_status == 'FAILED':
+                        logger.warning(f"CamPay payment failed, order {commande.id} cancelled: {campay_result}")
+                        self._cancel_unpaid(commande, 'Paiement Mobile Money échoué')
+                        return Response(
+                            {
+                                'error': "Le paiement Mobile Money a échoué immédiatement. Vérifiez le numéro et réessayez.",
+                                'payment_status': 'FAILED',
+                                'campay_reference': campay_result.get('reference')
+                            },
+                            status=status.HTTP_400_BAD_REQUEST
+                        )
+                    commande.campay_reference = campay_result.get('reference')
+                    commande.operator = campay_result.get('operator')
+                    commande.save(update_fields=['campay_reference', 'operator', 'date_updated'])
+                    ussd_code = campay_result.get('ussd_code')
+                    logger.info(f"CamPay payment initiated: {commande.campay_reference}, USSD: {ussd_code}")
+                else:
+                    logger.error(f"CamPay payment failed, order {commande.id} cancelled: {campay_result}")
+                    self._cancel_unpaid(commande, 'Échec de l’initiation du paiement Mobile Money')
+                    return Response(
+                        {'error': campay_result.get('error', 'Échec de l’initiation du paiement CamPay')},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
             
-            commande = serializer.save(
-                client=request.user,
-                campay_reference=campay_reference,
-                operator=operator,
-                payment_phone=phone if payment_mode == 'MOBILE_MONEY' else payment_phone
-            )
-            
+            # Items with their produits and merchants in one query, not three per line
+            prefetch_related_objects([commande], items_prefetch())
             response_data = CommandeDetailSerializer(commande).data
             
             if ussd_code:
@@ -155,18 +165,33 @@ class CommandeViewSet(viewsets.ModelViewSet):
             return Response(response_data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    @action(detail=True, methods=['post'])
-    def annuler(self, request, pk=None):
-        commande = self.get_object()
-        if commande.status in ['LIVREE', 'ANNULEE']:
+    def _cancel_unpaid(self, commande, reason):
+        """Cancel an order whose Mobile Money collect did not start; the annuler hooks give its stock back"""
+        try:
+            apply_transition(commande, 'annuler', cancellation_reason=reason)
+        except TransitionNotAllowed as e:
+            logger.warning(f"Order {commande.id} not cancelled after payment failure: {e}")
+    
+    def _transition(self, commande, name, error, **fields):
+        """Apply an order transition (apps.orders.transitions); return an error Response if it is not allowed"""
+        try:
+            apply_transition(commande, name, **fields)
+        except TransitionNotAllowed as e:
             return Response(
-                {'error': 'Cannot cancel this order'},
+                {'error': f'{error} Statut actuel: {e.status}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        commande.status = 'ANNULEE'
-        commande.cancellation_reason = request.data.get('reason', '')
-        commande.save()
+        return None
+    
+    @action(detail=True, methods=['post'])
+    def annuler(self, request, pk=None):
+        commande = self.get_object()
+        error = self._transition(
+            commande, 'annuler', 'Cannot cancel this order.',
+            cancellation_reason=request.data.get('reason', '')
+        )
+        if error:
+            return error
         
         return Response(CommandeDetailSerializer(commande).data)
     
@@ -192,15 +217,35 @@ class CommandeViewSet(viewsets.ModelViewSet):
             )
         
         # Only allow accepting if order is in waiting status
-        if commande.status != 'EN_ATTENTE':
+        error = self._transition(commande, 'accepter', 'Impossible d\'accepter cette commande.')
+        if error:
+            return error
+        
+        return Response(CommandeDetailSerializer(commande).data)
+
+    @action(detail=True, methods=['post'], url_path='refuser')
+    def refuser(self, request, pk=None):
+        """Refuse an order - changes status from EN_ATTENTE to REFUSEE and gives back its stock"""
+        if not hasattr(request.user, 'restaurant'):
             return Response(
-                {'error': f'Impossible d\'accepter cette commande. Statut actuel: {commande.status}'},
-                status=status.HTTP_400_BAD_REQUEST
+                {'error': 'Vous devez être propriétaire d\'un restaurant pour effectuer cette action.'},
+                status=status.HTTP_403_FORBIDDEN
             )
         
-        commande.status = 'ACCEPTEE'
-        commande.date_accepted = timezone.now()
-        commande.save()
+        commande = self.get_object()
+        
+        if commande.restaurant != request.user.restaurant:
+            return Response(
+                {'error': 'Cette commande ne appartient pas à votre restaurant.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        error = self._transition(
+            commande, 'refuser', 'Impossible de refuser cette commande.',
+            cancellation_reason=request.data.get('reason', '')
+        )
+        if error:
+            return error
         
         return Response(CommandeDetailSerializer(commande).data)
     
@@ -226,15 +271,9 @@ class CommandeViewSet(viewsets.ModelViewSet):
             )
         
         # Only allow starting preparation if order is accepted
-        if commande.status != 'ACCEPTEE':
-            return Response(
-                {'error': f'Impossible de commencer la préparation. Statut actuel: {commande.status}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        commande.status = 'EN_PREPARATION'
-        commande.date_preparation = timezone.now()
-        commande.save()
+        error = self._transition(commande, 'commencer_preparation', 'Impossible de commencer la préparation.')
+        if error:
+            return error
         
         return Response(CommandeDetailSerializer(commande).data)
     
@@ -260,14 +299,9 @@ class CommandeViewSet(viewsets.ModelViewSet):
             )
         
         # Only allow marking as ready if order is in preparation
-        if commande.status != 'EN_PREPARATION':
-            return Response(
-                {'error': f'Impossible de marquer cette commande comme prête. Statut actuel: {commande.status}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        commande.status = 'PRETE'
-        commande.save()
+        error = self._transition(commande, 'marquer_prete', 'Impossible de marquer cette commande comme prête.')
+        if error:
+            return error
         
         return Response(CommandeDetailSerializer(commande).data)
     
@@ -294,9 +328,11 @@ class CommandeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        commande.status = 'LIVREE'
-        commande.date_delivered = timezone.now()
-        commande.save()
+        # Validating twice is harmless: the hooks only ran the first time
+        if commande.status != 'LIVREE':
+            error = self._transition(commande, 'livrer', 'Impossible de valider cette livraison.')
+            if error:
+                return error
         
         return Response(CommandeDetailSerializer(commande).data)
 
@@ -318,21 +354,9 @@ class CommandeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        if commande.status in ['LIVREE', 'ANNULEE', 'REFUSEE']:
-            return Response(
-                {'error': f'Impossible de marquer cette commande comme livrée. Statut actuel: {commande.status}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        if commande.status not in ['LIVREUR_ASSIGNE', 'EN_ROUTE_COLLECTE', 'COLLECTEE', 'EN_LIVRAISON']:
-            return Response(
-                {'error': f'Statut non valide pour livraison: {commande.status}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        commande.status = 'LIVREE'
-        commande.date_delivered = timezone.now()
-        commande.save()
+        error = self._transition(commande, 'livrer', 'Impossible de marquer cette commande comme livrée.')
+        if error:
+            return error
 
         return Response(CommandeDetailSerializer(commande).data)
     
@@ -354,7 +378,7 @@ class CommandeViewSet(viewsets.ModelViewSet):
 
                 if payment_status == 'SUCCESSFUL' and commande.payment_status != 'PAYE':
                     commande.payment_status = 'PAYE'
-                    commande.save()
+                    commande.save(update_fields=['payment_status', 'date_updated'])
 
                 return Response({
                     'has_payment': True,
@@ -9,6 +9,7 @@ from rest_framework.response import Response
 from django.conf import settings
 import logging
 
+from apps.core.idempotency import idempotent, mark_side_effect
 from apps.payments.services import payment_service, PaymentService
 from apps.orders.models import Commande
 from django.views.decorators.csrf import csrf_exempt
@@ -18,6 +19,7 @@ logger = logging.getLogger(__name__)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('payments:initiate')
 def initiate_payment(request):
     """
     Initiate a CamPay payment collection (blocking - waits for completion)
@@ -57,6 +59,7 @@ def initiate_payment(request):
 
     try:
         # Use the SDK to collect payment (blocks until complete)
+        mark_side_effect(request)
         result = payment_service.collect(
             amount=amount,
             phone=cleaned_phone,
@@ -107,6 +110,7 @@ def initiate_payment(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('payments:initiate-collect')
 def initiate_payment_with_collect(request):
     """
     Initiate a CamPay payment collection using initCollect (non-blocking)
@@ -147,6 +151,7 @@ def initiate_payment_with_collect(request):
 
     try:
         # Use the SDK to initiate collect (non-blocking - returns reference immediately)
+        mark_side_effect(request)
         result = payment_service.init_collect(
             amount=amount,
             phone=cleaned_phone,
@@ -395,7 +400,8 @@ def webhook(request):
             if operator and not commande.operator:
                 commande.operator = operator
             
-            commande.save()
+            # Payment columns only: never write back a status read before a concurrent transition
+            commande.save(update_fields=['payment_status', 'operator', 'date_updated'])
             
             return Response({'status': 'ok'})
             
@@ -0,0 +1,78 @@
+"""
+Versioned menu caching with conditional GET.
+
+Every merchant has a catalog version (CatalogVersion row, 0 until the
+first write) bumped by the Produit post_save/post_delete signals and by
+saves of the merchant itself, whose name appears in the serialized
+products. Order-driven stock and sales_count updates only bump it when a
+product sells out or is back in stock (apps.products.stock). The version lives in the database, so every worker process
+agrees on it.
+
+A menu or product listing is served with ``ETag: "<scope>-v<version>"``:
+a client sending it back in If-None-Match gets a bodyless 304, and
+otherwise the serialized payload is taken from the cache under the same
+version, for MENU_CACHE_SECONDS. A bump changes the key, so a cached menu
+is never served after a product changed.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+from rest_framework.response import Response
+
+from apps.products.models import CatalogVersion
+
+
+def bump_catalog_version(restaurant_id=None, supermarche_id=None):
+    lookup = {'restaurant_id': restaurant_id} if restaurant_id else {'supermarche_id': supermarche_id}
+    if CatalogVersion.objects.filter(**lookup).update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            CatalogVersion.objects.create(**lookup)
+    except IntegrityError:
+        # Created by a concurrent writer in the meantime
+        CatalogVersion.objects.filter(**lookup).update(version=F('version') + 1)
+
+
+def catalog_version(restaurant_id=None, supermarche_id=None):
+    lookup = {'restaurant_id': restaurant_id} if restaurant_id else {'supermarche_id': supermarche_id}
+    return CatalogVersion.objects.filter(**lookup).values_list('version', flat=True).first() or 0
+
+
+def merchant_version(merchant):
+    """Version of a merchant loaded with select_related('catalog_version')"""
+    row = getattr(merchant, 'catalog_version', None)
+    return row.version if row is not None else 0
+
+
+def catalog_response(request, scope, version, build, variant=''):
+    """304, cached or freshly built Response for a catalog payload
+
+    scope names the merchant (``restaurant:12``); variant distinguishes
+    payloads of the same version (query string, host of absolute URLs).
+    build() returns the payload on a cache miss.
+    """
+    suffix = hashlib.md5(variant.encode(), usedforsecurity=False).hexdigest()[:12] if variant else ''
+    tag = f"{scope.replace(':', '-')}-v{version}{'-' + suffix if suffix else ''}"
+    etag = quote_etag(tag)
+
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified['ETag'] = etag
+        patch_cache_control(not_modified, no_cache=True)
+        return not_modified
+
+    key = f'catalog:{tag}'
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, getattr(settings, 'MENU_CACHE_SECONDS', 600))
+    response = Response(data)
+    response['ETag'] = etag
+    patch_cache_control(response, no_cache=True)
+    return response
@@ -45,3 +45,18 @@ class Produit(models.Model):
         if self.discount_percentage > 0:
             self.discounted_price = self.price * (1 - self.discount_percentage / 100)
         super().save(*args, **kwargs)
+
+class CatalogVersion(models.Model):
+    """Menu version of one merchant, bumped on every product write (apps.products.catalog)"""
+    restaurant = models.OneToOneField(
+        'restaurants.Restaurant', on_delete=models.CASCADE,
+        null=True, blank=True, related_name='catalog_version'
+    )
+    supermarche = models.OneToOneField(
+        'supermarches.Supermarche', on_delete=models.CASCADE,
+        null=True, blank=True, related_name='catalog_version'
+    )
+    version = models.PositiveIntegerField(default=1)
+    
+    def __str__(self):
+        return f"Catalogue {self.restaurant_id or self.supermarche_id} v{self.version}"
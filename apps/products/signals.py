@@ -0,0 +1,41 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.orders.models import Commande
+from apps.orders.transitions import commande_transitioning
+from apps.products.catalog import bump_catalog_version
+from apps.products.models import Produit
+from apps.products.stock import record_sales, release_stock
+from apps.restaurants.models import Restaurant
+from apps.supermarches.models import Supermarche
+
+
+@receiver(post_save, sender=Produit)
+@receiver(post_delete, sender=Produit)
+def produit_changed(sender, instance, **kwargs):
+    if instance.restaurant_id or instance.supermarche_id:
+        bump_catalog_version(instance.restaurant_id, instance.supermarche_id)
+
+
+@receiver(post_save, sender=Restaurant)
+def restaurant_saved(sender, instance, created, **kwargs):
+    """Serialized products embed the restaurant name"""
+    if not created:
+        bump_catalog_version(restaurant_id=instance.id)
+
+
+@receiver(post_save, sender=Supermarche)
+def supermarche_saved(sender, instance, created, **kwargs):
+    if not created:
+        bump_catalog_version(supermarche_id=instance.id)
+
+
+@receiver(commande_transitioning, sender=Commande)
+def commande_transitioning_stock(sender, transition, commandes, **kwargs):
+    """Inside the transition's transaction: a crash cannot keep the status and lose the stock"""
+    if transition.name in ('annuler', 'refuser'):
+        for commande in commandes:
+            release_stock(commande)
+    elif transition.name == 'livrer':
+        for commande in commandes:
+            record_sales(commande)
@@ -0,0 +1,109 @@
+"""
+Stock reservation for ordered products.
+
+Products with a stock (supermarket items; NULL means unlimited) are
+reserved when the order is created: one conditional UPDATE per product,
+``stock = stock - qty WHERE stock >= qty``, run inside the order
+transaction. A product whose row is not updated did not have enough
+units left, and OutOfStock rolls the whole order back, so concurrent
+orders during a promotion can never drive stock below zero.
+
+A cancelled or refused order gives its units back with release_stock; a
+delivered order adds its quantities to sales_count with record_sales, in
+a single UPDATE. Queryset updates skip the Produit signals. Bumping the
+catalog version on each of them would throw the cached menus away on
+every order, so stock and sales_count in a cached menu may lag: the
+version is only bumped when a product sells out or comes back from zero,
+which changes what the client can order. The order itself never relies
+on the menu's figure (reserve_stock is the check).
+"""
+from collections import defaultdict
+
+from django.db.models import Case, F, IntegerField, Value, When
+
+from apps.products.catalog import bump_catalog_version
+from apps.products.models import Produit
+
+
+class OutOfStock(Exception):
+    """Not enough units left for these produits"""
+
+    def __init__(self, produits):
+        self.produits = produits
+        super().__init__(', '.join(produit.name for produit in produits))
+
+
+def quantities(lines):
+    """Total quantity per Produit of (produit, quantity) pairs, in produit id order"""
+    totals = defaultdict(int)
+    produits = {}
+    for produit, quantity in lines:
+        totals[produit.id] += quantity
+        produits[produit.id] = produit
+    return [(produits[produit_id], totals[produit_id]) for produit_id in sorted(totals)]
+
+
+def _bump_merchants(produits):
+    for restaurant_id, supermarche_id in {(p.restaurant_id, p.supermarche_id) for p in produits}:
+        if restaurant_id or supermarche_id:
+            bump_catalog_version(restaurant_id, supermarche_id)
+
+
+def _bump_crossed_zero(tracked, released):
+    """Bump the merchants of produits that reached 0 (reserve) or left 0 (release) with these quantities"""
+    if not tracked:
+        return
+    threshold = {produit.pk: quantity if released else 0 for produit, quantity in tracked}
+    stocks = dict(Produit.objects.filter(pk__in=threshold).values_list('pk', 'stock'))
+    _bump_merchants(produit for produit, _ in tracked if stocks.get(produit.pk) == threshold[produit.pk])
+
+
+def reserve_stock(lines):
+    """Take the quantities of (produit, quantity) lines out of stock; call inside the order transaction
+
+    Produits without a stock are not tracked. Raises OutOfStock, after
+    trying every produit, if any of them is short; the caller's
+    transaction must then be rolled back.
+    """
+    # Fixed id order, so two orders never wait on each other's rows
+    tracked = [(produit, quantity) for produit, quantity in quantities(lines) if produit.stock is not None]
+    short = [
+        produit for produit, quantity in tracked
+        if not Produit.objects.filter(pk=produit.pk, stock__gte=quantity).update(stock=F('stock') - quantity)
+    ]
+    if short:
+        raise OutOfStock(short)
+    _bump_crossed_zero(tracked, released=False)
+    return len(tracked)
+
+
+def _order_lines(commande):
+    return quantities(
+        (item.produit, item.quantity)
+        for item in commande.items.select_related('produit').exclude(produit__isnull=True)
+    )
+
+
+def release_stock(commande):
+    """Give back the units reserved by a cancelled or refused order"""
+    tracked = [(produit, quantity) for produit, quantity in _order_lines(commande) if produit.stock is not None]
+    for produit, quantity in tracked:
+        Produit.objects.filter(pk=produit.pk, stock__isnull=False).update(stock=F('stock') + quantity)
+    _bump_crossed_zero(tracked, released=True)
+    return len(tracked)
+
+
+def record_sales(commande):
+    """Add the quantities of a delivered order to sales_count, in one UPDATE"""
+    lines = _order_lines(commande)
+    if not lines:
+        return 0
+    increment = Case(
+        *[When(pk=produit.pk, then=Value(quantity)) for produit, quantity in lines],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    Produit.objects.filter(pk__in=[produit.pk for produit, _ in lines]).update(
+        sales_count=F('sales_count') + increment
+    )
+    return len(lines)
@@ -2,6 +2,7 @@ from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from apps.products.catalog import catalog_response, catalog_version
 from apps.products.models import Produit
 from apps.products.serializers import ProduitSerializer, ProduitCreateUpdateSerializer
 from apps.users.permissions import IsApproved
@@ -128,6 +129,25 @@ class ProduitViewSet(viewsets.ModelViewSet):
         
         return obj
     
+    def list(self, request, *args, **kwargs):
+        """Product listing; a single merchant's listing is versioned and supports If-None-Match"""
+        restaurant = request.query_params.get('restaurant', '')
+        supermarche = request.query_params.get('supermarche', '')
+        if bool(restaurant) == bool(supermarche) or not (restaurant or supermarche).isdigit():
+            return super().list(request, *args, **kwargs)
+
+        if restaurant:
+            scope, version = f'restaurant:{restaurant}', catalog_version(restaurant_id=int(restaurant))
+        else:
+            scope, version = f'supermarche:{supermarche}', catalog_version(supermarche_id=int(supermarche))
+        # Image URLs are absolute and pages differ by query string
+        variant = f'{request.scheme}://{request.get_host()}{request.get_full_path()}'
+        return catalog_response(
+            request, scope, version,
+            lambda: super(ProduitViewSet, self).list(request, *args, **kwargs).data,
+            variant=variant,
+        )
+    
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return ProduitCreateUpdateSerializer
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+class RestaurantsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.restaurants'
+    
+    def ready(self):
+        import apps.restaurants.signals
@@ -1,12 +1,13 @@
 from rest_framework import serializers
 from rest_framework_gis.serializers import GeoFeatureModelSerializer
+from apps.geolocation.serializers import DistanceFieldMixin, DistanceListSerializer
 from apps.restaurants.models import Restaurant
 from apps.users.serializers import UserSerializer
 import logging
 
 logger = logging.getLogger(__name__)
 
-class RestaurantListSerializer(GeoFeatureModelSerializer):
+class RestaurantListSerializer(DistanceFieldMixin, GeoFeatureModelSerializer):
     distance_km = serializers.SerializerMethodField()
     
     class Meta:
@@ -17,47 +18,21 @@ class RestaurantListSerializer(GeoFeatureModelSerializer):
             'review_count', 'price_level', 'is_open', 'base_delivery_fee', 
             'distance_km', 'full_address', 'avg_preparation_time'
         ]
-    
-    def get_distance_km(self, obj):
-        """Calculate distance between user and restaurant with robust error handling"""
-        request = self.context.get('request')
-        
-        if not request or not hasattr(request, 'user_location'):
-            return None
-        
-        user_location = request.user_location
-        
-        # Validate user_location format
-        if not user_location or not isinstance(user_location, (tuple, list)) or len(user_location) != 2:
-            logger.warning(f"[SERIALIZER] Invalid user_location format: {user_location}")
-            return None
-        
-        try:
-            user_lat, user_lon = float(user_location[0]), float(user_location[1])
-            
-            # Get restaurant coordinates
-            if obj.latitude is None or obj.longitude is None:
-                logger.warning(f"[SERIALIZER] Restaurant {obj.id} has null coordinates")
-                return None
-            
-            rest_lat = float(obj.latitude)
-            rest_lon = float(obj.longitude)
-            
-            # Calculate distance using geopy
-            from geopy.distance import geodesic
-            distance = geodesic(
-                (user_lat, user_lon),
-                (rest_lat, rest_lon)
-            ).kilometers
-            
-            return round(distance, 2)
-            
-        except (ValueError, TypeError) as e:
-            logger.error(f"[SERIALIZER] Error calculating distance for restaurant {obj.id}: {e}")
-            return None
-        except Exception as e:
-            logger.exception(f"[SERIALIZER] Unexpected error calculating distance: {e}")
-            return None
+        list_serializer_class = DistanceListSerializer
+
+class RestaurantCompactSerializer(DistanceFieldMixin, serializers.ModelSerializer):
+    """Flat rows for the mobile app (nearby?compact=1), without the GeoJSON envelope"""
+    distance_km = serializers.SerializerMethodField()
+    latitude = serializers.FloatField(read_only=True)
+    longitude = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Restaurant
+        fields = [
+            'id', 'commercial_name', 'cuisine_type', 'logo', 'average_rating',
+            'price_level', 'is_open', 'base_delivery_fee', 'avg_preparation_time',
+            'latitude', 'longitude', 'distance_km'
+        ]
 
 class RestaurantDetailSerializer(GeoFeatureModelSerializer):
     user = UserSerializer(read_only=True)
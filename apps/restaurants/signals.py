@@ -0,0 +1,12 @@
+from django.dispatch import receiver
+
+from apps.orders.models import Commande
+from apps.orders.transitions import commande_transitioned
+from apps.restaurants.stats import invalidate_dashboard_stats
+
+
+@receiver(commande_transitioned, sender=Commande)
+def commande_transitioned_dashboard(sender, commandes, **kwargs):
+    """Every status change moves the restaurant's pending and revenue figures"""
+    for restaurant_id in {commande.restaurant_id for commande in commandes}:
+        invalidate_dashboard_stats(restaurant_id)
@@ -0,0 +1,73 @@
+"""
+Restaurant dashboard statistics.
+
+The four dashboard figures come from one conditional-aggregate query and
+are cached per restaurant. Order transitions call
+``invalidate_dashboard_stats`` so the next refresh recomputes them; the
+RESTAURANT_STATS_CACHE_SECONDS timeout bounds staleness when the cache is
+per process (the default local-memory backend).
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.utils import timezone
+
+from apps.orders.models import Commande
+
+CLOSED_STATUSES = ['LIVREE', 'ANNULEE', 'REFUSEE']
+
+
+def _cache_key(restaurant_id):
+    return f'restaurants:{restaurant_id}:dashboard_stats'
+
+
+def dashboard_queryset(restaurant, last_week):
+    """Orders aggregated by compute_dashboard_stats; rows outside the 7-day window only matter while pending"""
+    return Commande.objects.filter(restaurant=restaurant).filter(
+        Q(date_created__gte=last_week) | ~Q(status__in=CLOSED_STATUSES)
+    )
+
+
+def compute_dashboard_stats(restaurant):
+    """Today's orders, pending orders, today's revenue and 7-day average preparation time"""
+    today_start = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+    last_week = today_start - timedelta(days=7)
+    preparation = ExpressionWrapper(F('date_preparation') - F('date_accepted'), output_field=DurationField())
+
+    totals = dashboard_queryset(restaurant, last_week).aggregate(
+        today_orders=Count('id', filter=Q(date_created__gte=today_start)),
+        pending_orders=Count('id', filter=~Q(status__in=CLOSED_STATUSES)),
+        revenue=Sum('total_amount', filter=Q(date_created__gte=today_start, status='LIVREE')),
+        avg_preparation=Avg(preparation, filter=Q(
+            date_created__gte=last_week,
+            date_accepted__isnull=False,
+            date_preparation__isnull=False
+        )),
+    )
+
+    avg_preparation = totals['avg_preparation']
+    return {
+        'today_orders': totals['today_orders'],
+        'pending_orders': totals['pending_orders'],
+        'revenue': float(totals['revenue'] or 0),
+        'avg_preparation_time': (
+            round(avg_preparation.total_seconds() / 60) if avg_preparation is not None
+            else restaurant.avg_preparation_time
+        ),
+    }
+
+
+def get_dashboard_stats(restaurant):
+    key = _cache_key(restaurant.id)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_dashboard_stats(restaurant)
+        cache.set(key, stats, getattr(settings, 'RESTAURANT_STATS_CACHE_SECONDS', 60))
+    return stats
+
+
+def invalidate_dashboard_stats(restaurant_id):
+    if restaurant_id is not None:
+        cache.delete(_cache_key(restaurant_id))
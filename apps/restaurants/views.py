@@ -1,18 +1,18 @@
 import logging
+from django.conf import settings
 from rest_framework import viewsets, status
 from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from django.contrib.gis.geos import Point
-from django.contrib.gis.db.models.functions import Distance
-from django.contrib.gis.measure import D
-from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from apps.restaurants.models import Restaurant, CategorieRestaurant
 from apps.restaurants.serializers import (
-    RestaurantListSerializer, RestaurantDetailSerializer, 
+    RestaurantListSerializer, RestaurantCompactSerializer, RestaurantDetailSerializer, 
     RestaurantUpdateSerializer
 )
+from apps.geolocation.nearby import nearby_limit, nearby_queryset
+from apps.search.index import search_index
 from apps.users.permissions import IsRestaurantOwner, IsApproved
 
 logger = logging.getLogger(__name__)
@@ -21,6 +21,13 @@ class RestaurantViewSet(viewsets.ModelViewSet):
     queryset = Restaurant.objects.filter(is_active=True, user__is_approved=True)
     permission_classes = [AllowAny]
     
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'menu':
+            # The catalog version comes with the restaurant row
+            queryset = queryset.select_related('catalog_version')
+        return queryset
+    
     def get_serializer_class(self):
         if self.action == 'retrieve':
             return RestaurantDetailSerializer
@@ -38,30 +45,28 @@ class RestaurantViewSet(viewsets.ModelViewSet):
             logger.warning("[RESTAURANTS] Empty search query provided")
             return Response({'error': 'Search query is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        queryset = self.get_queryset()
-        restaurants = queryset.filter(
-            Q(commercial_name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(cuisine_type__icontains=query)
-        )
+        def visible(hits):
+            # Inactive or unapproved restaurants are dropped here; the index reads on to fill the page
+            ranked_ids = [object_id for _, object_id, _ in hits]
+            found = self.get_queryset().in_bulk(ranked_ids)
+            return [found[restaurant_id] for restaurant_id in ranked_ids if restaurant_id in found]
 
-        result_count = restaurants.count()
-        logger.info(f"[RESTAURANTS] Found {result_count} restaurants matching query '{query}'")
+        # BM25-ranked full-text index
+        restaurants = search_index.search_filtered(
+            query, visible, kinds=['restaurant'], limit=getattr(settings, 'SEARCH_MAX_RESULTS', 50)
+        )
+        logger.info(f"[RESTAURANTS] Found {len(restaurants)} restaurants matching query '{query}'")
 
         serializer = RestaurantListSerializer(restaurants, many=True, context={'request': request})
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def nearby(self, request):
-        """Get nearby restaurants with distance"""
-        logger.info(f"[RESTAURANTS] nearby endpoint called with params: {request.query_params}")
-        
+        """Nearest restaurants within radius km, in one query (?compact=1 for flat rows)"""
         lat = request.query_params.get('lat')
         lon = request.query_params.get('lon')
         radius_km = request.query_params.get('radius', 5)
         
-        logger.info(f"[RESTAURANTS] Parsed params - lat: {lat}, lon: {lon}, radius: {radius_km}")
-        
         if not lat or not lon:
             logger.warning(f"[RESTAURANTS] Missing coordinates - lat: {lat}, lon: {lon}")
             return Response({'error': 'Latitude and longitude required'}, status=status.HTTP_400_BAD_REQUEST)
@@ -70,8 +75,7 @@ class RestaurantViewSet(viewsets.ModelViewSet):
             lat_float = float(lat)
             lon_float = float(lon)
             radius_float = float(radius_km)
-            
-            logger.info(f"[RESTAURANTS] Converting to float - lat: {lat_float}, lon: {lon_float}, radius: {radius_float}")
+            limit = nearby_limit(request.query_params.get('limit'))
             
             # Validate coordinate ranges
             if not (-90 <= lat_float <= 90):
@@ -82,34 +86,19 @@ class RestaurantViewSet(viewsets.ModelViewSet):
                 logger.warning(f"[RESTAURANTS] Invalid longitude: {lon_float}")
                 return Response({'error': 'Invalid longitude value. Must be between -180 and 180.'}, status=status.HTTP_400_BAD_REQUEST)
             
-            # Create point with SRID 4326 (WGS84 - standard GPS coordinates)
-            user_location = Point(lon_float, lat_float, srid=4326)
-            
-            # Log queryset info
-            queryset = self.get_queryset()
-            total_restaurants = queryset.count()
-            logger.info(f"[RESTAURANTS] Total active/approved restaurants: {total_restaurants}")
-            
-            # Check how many have valid positions
-            restaurants_with_position = queryset.exclude(position__isnull=True).count()
-            logger.info(f"[RESTAURANTS] Restaurants with valid position: {restaurants_with_position}")
-            
-            restaurants = queryset.annotate(
-                distance=Distance('position', user_location)
-            ).filter(distance__lte=D(km=radius_float)).order_by('distance')
-            
-            result_count = restaurants.count()
-            logger.info(f"[RESTAURANTS] Restaurants found within {radius_float}km: {result_count}")
-            
-            if result_count == 0:
-                logger.info(f"[RESTAURANTS] No restaurants found in radius, returning empty list")
-                return Response([])
+            restaurants = list(nearby_queryset(
+                self.get_queryset(), lat_float, lon_float, radius_float, limit
+            ))
+            logger.debug(f"[RESTAURANTS] {len(restaurants)} restaurants within {radius_float}km of ({lat_float}, {lon_float})")
             
             request.user_location = (lat_float, lon_float)
+            if request.query_params.get('compact') in ('1', 'true'):
+                return Response(RestaurantCompactSerializer(restaurants, many=True).data)
+            if not restaurants:
+                return Response([])
             serializer = RestaurantListSerializer(
                 restaurants, many=True, context={'request': request}
             )
-            logger.info(f"[RESTAURANTS] Successfully serialized {result_count} restaurants")
             return Response(serializer.data)
         except ValueError as e:
             logger.error(f"[RESTAURANTS] ValueError in nearby endpoint: {e}")
@@ -128,12 +117,17 @@ class RestaurantViewSet(viewsets.ModelViewSet):
     def menu(self, request, pk=None):
         """Get restaurant menu - returns ALL products for clients to see full menu"""
         restaurant = self.get_object()
+        from apps.products.catalog import catalog_response, merchant_version
         from apps.products.models import Produit
-        # Show ALL products (including unavailable) so clients can see the full menu
-        products = Produit.objects.filter(restaurant=restaurant)
         from apps.products.serializers import ProduitSerializer
-        serializer = ProduitSerializer(products, many=True)
-        return Response(serializer.data)
+
+        def build():
+            # Show ALL products (including unavailable) so clients can see the full menu
+            products = Produit.objects.filter(restaurant=restaurant).select_related('restaurant', 'supermarche')
+            return list(ProduitSerializer(products, many=True).data)
+
+        # 304 when the client's ETag is current, else the menu cached for this catalog version
+        return catalog_response(request, f'restaurant:{restaurant.id}', merchant_version(restaurant), build)
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsRestaurantOwner])
     def my_restaurant(self, request):
@@ -295,58 +289,10 @@ class RestaurantViewSet(viewsets.ModelViewSet):
                 logger.info(f"[RESTAURANTS] Created restaurant profile: {restaurant.id} for user {request.user.id}")
             
             restaurant = request.user.restaurant
-            from django.utils import timezone
-            from django.db.models import Count, Sum, Avg
-            from datetime import timedelta
-            from apps.orders.models import Commande
-            
-            today = timezone.now().date()
-            today_start = timezone.make_aware(
-                timezone.datetime.combine(today, timezone.datetime.min.time())
-            )
-            
-            # Today's orders count
-            today_orders_count = Commande.objects.filter(
-                restaurant=restaurant,
-                date_created__gte=today_start
-            ).count()
-            
-            # Pending orders (not delivered or cancelled)
-            pending_orders_count = Commande.objects.filter(
-                restaurant=restaurant
-            ).exclude(
-                status__in=['LIVREE', 'ANNULEE', 'REFUSEE']
-            ).count()
-            
-            # Today's revenue (completed orders)
-            today_revenue = Commande.objects.filter(
-                restaurant=restaurant,
-                date_created__gte=today_start,
-                status='LIVREE'
-            ).aggregate(total=Sum('total_amount'))['total'] or 0
-            
-            # Average preparation time from completed orders in last 7 days
-            last_week = today_start - timedelta(days=7)
-            avg_prep_time = Commande.objects.filter(
-                restaurant=restaurant,
-                date_created__gte=last_week,
-                date_accepted__isnull=False,
-                date_preparation__isnull=False
-            ).annotate(
-                prep_time=Avg(
-                    expression=timezone.datetime.fromisoformat(
-                        str(date_preparation) - str(date_accepted)
-                    ) if False else 0
-                )
-            ).aggregate(avg=Avg('estimated_duration_minutes'))['avg'] or restaurant.avg_preparation_time
-            
-            return Response({
-                'today_orders': today_orders_count,
-                'pending_orders': pending_orders_count,
-                'revenue': float(today_revenue),
-                'avg_preparation_time': int(avg_prep_time),
-                'restaurant_name': restaurant.commercial_name,
-            })
+            from apps.restaurants.stats import get_dashboard_stats
+
+            # One aggregate query, cached until the next order transition
+            return Response(dict(get_dashboard_stats(restaurant), restaurant_name=restaurant.commercial_name))
         except Restaurant.DoesNotExist:
             return Response({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
@@ -377,12 +323,11 @@ class RestaurantViewSet(viewsets.ModelViewSet):
                 logger.info(f"[RESTAURANTS] Created restaurant profile: {restaurant.id} for user {request.user.id}")
 
             restaurant = request.user.restaurant
-            from django.utils import timezone
-            from apps.orders.models import Commande
+            from apps.orders.queries import commande_detail_queryset
             from apps.orders.serializers import CommandeDetailSerializer
 
             # Get last 10 orders
-            orders = Commande.objects.filter(
+            orders = commande_detail_queryset().filter(
                 restaurant=restaurant
             ).order_by('-date_created')[:10]
 
@@ -396,16 +341,28 @@ class RestaurantViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsRestaurantOwner])
     def orders(self, request):
-        """Get all orders for the restaurant"""
+        """Order history of the restaurant, newest first (cursor pagination)"""
         try:
             restaurant = request.user.restaurant
-            from apps.orders.models import Commande
-            from apps.orders.serializers import CommandeDetailSerializer
-            orders = Commande.objects.filter(restaurant=restaurant).order_by('-date_created')
-            serializer = CommandeDetailSerializer(orders, many=True)
-            return Response(serializer.data)
+            from apps.orders.pagination import CommandeKeysetPagination
+            from apps.orders.queries import commande_detail_queryset, filter_commandes
+            from apps.orders.serializers import CommandeDetailSerializer, CommandeHistoryFilterSerializer
+
+            filters = CommandeHistoryFilterSerializer(data=request.query_params)
+            if not filters.is_valid():
+                return Response(filters.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            orders = filter_commandes(
+                commande_detail_queryset().filter(restaurant=restaurant), **filters.validated_data
+            )
+            paginator = CommandeKeysetPagination()
+            page = paginator.paginate_queryset(orders, request, view=self)
+            serializer = CommandeDetailSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
         except Restaurant.DoesNotExist:
             return Response({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
+        except NotFound as e:
+            return Response({'error': str(e.detail)}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             logger.exception(f"[RESTAURANTS] Error getting orders: {e}")
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
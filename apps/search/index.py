@@ -0,0 +1,146 @@
+"""
+SQLite FTS5 full-text index of restaurants, supermarkets and products.
+
+One ``search_index`` virtual table holds a document per object: ``name``
+(commercial name or product name) and ``body`` (description, cuisine,
+category, address). The rowid encodes the object: ``id * 4 + kind code``,
+so a document is replaced or deleted by rowid without scanning the table.
+
+The unicode61 tokenizer with ``remove_diacritics 2`` folds accents on both
+sides ("europeen" finds "Européen"), and every query term is a prefix
+query backed by the 2- and 3-character prefix indexes. Results are ranked
+with BM25, a name match weighing SEARCH_NAME_WEIGHT times a body match.
+
+post_save/post_delete signals keep the index in sync; bulk writes, which
+send no signals, are followed by ``rebuild_search_index``. Inactive
+merchants are left out of the index; approval and availability are
+filtered when results are loaded: ``search_filtered`` pages through the
+ranking until enough hits survive that filter.
+"""
+import logging
+import re
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'search_index'
+KINDS = {'restaurant': 1, 'supermarche': 2, 'produit': 3}
+KIND_BY_CODE = {code: kind for kind, code in KINDS.items()}
+TOKEN_RE = re.compile(r'\w+')
+MAX_TERMS = 8
+
+
+def rowid(kind, object_id):
+    return object_id * 4 + KINDS[kind]
+
+
+def match_expression(text):
+    """FTS5 query matching every word of text as a prefix, or None when there is no word"""
+    terms = TOKEN_RE.findall(text or '')[:MAX_TERMS]
+    if not terms:
+        return None
+    # Quoted terms: FTS5 operators (AND, OR, NEAR, column filters) in user input stay plain words
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def document(kind, obj):
+    """(name, body) of an object, or None when it must not be indexed"""
+    if kind == 'produit':
+        return obj.name, ' '.join(filter(None, [obj.description, obj.category]))
+    if not obj.is_active:
+        return None
+    parts = [obj.description, obj.full_address]
+    if kind == 'restaurant':
+        labels = dict(obj._meta.get_field('cuisine_type').flatchoices)
+        parts.append(str(labels.get(obj.cuisine_type, obj.cuisine_type)))
+    return obj.commercial_name, ' '.join(filter(None, parts))
+
+
+class SearchIndex:
+    def __init__(self, using='default'):
+        self.using = using
+
+    def _cursor(self):
+        return connections[self.using].cursor()
+
+    def update(self, kind, obj):
+        doc = document(kind, obj)
+        if doc is None:
+            self.remove(kind, obj.pk)
+            return
+        with self._cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {TABLE}(rowid, name, body) VALUES (%s, %s, %s)',
+                [rowid(kind, obj.pk), *doc]
+            )
+
+    def remove(self, kind, object_id):
+        with self._cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [rowid(kind, object_id)])
+
+    def rebuild(self, batch_size=2000):
+        """Reindex every object"""
+        from apps.products.models import Produit
+        from apps.restaurants.models import Restaurant
+        from apps.supermarches.models import Supermarche
+        models = {'restaurant': Restaurant, 'supermarche': Supermarche, 'produit': Produit}
+
+        count = 0
+        with self._cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+            for kind, model in models.items():
+                rows = []
+                for obj in model._default_manager.using(self.using).iterator(chunk_size=batch_size):
+                    doc = document(kind, obj)
+                    if doc is not None:
+                        rows.append((rowid(kind, obj.pk), *doc))
+                    if len(rows) >= batch_size:
+                        cursor.executemany(f'INSERT INTO {TABLE}(rowid, name, body) VALUES (%s, %s, %s)', rows)
+                        count += len(rows)
+                        rows = []
+                if rows:
+                    cursor.executemany(f'INSERT INTO {TABLE}(rowid, name, body) VALUES (%s, %s, %s)', rows)
+                    count += len(rows)
+            cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+        logger.info(f"[SEARCH] Index rebuilt with {count} documents")
+        return count
+
+    def search(self, text, kinds=None, limit=20, offset=0):
+        """[(kind, object_id, rank)] best first, skipping the first offset hits; a lower rank is a better BM25 score"""
+        expression = match_expression(text)
+        if expression is None:
+            return []
+        name_weight = getattr(settings, 'SEARCH_NAME_WEIGHT', 10.0)
+        sql = f'SELECT rowid, bm25({TABLE}, %s, 1.0) AS rank FROM {TABLE} WHERE {TABLE} MATCH %s'
+        params = [name_weight, expression]
+        if kinds:
+            codes = [KINDS[kind] for kind in kinds]
+            sql += f" AND rowid %% 4 IN ({', '.join(['%s'] * len(codes))})"
+            params += codes
+        sql += ' ORDER BY rank LIMIT %s OFFSET %s'
+        params += [limit, offset]
+        with self._cursor() as cursor:
+            cursor.execute(sql, params)
+            return [(KIND_BY_CODE[row_id % 4], row_id // 4, rank) for row_id, rank in cursor.fetchall()]
+
+    def search_filtered(self, text, keep, kinds=None, limit=20, max_batches=5):
+        """Up to limit items of keep(hits), which maps a batch of hits to the visible items, in rank order
+
+        Hits are read in batches of 2 x limit, so hidden objects are replaced
+        by the next ranked ones instead of shortening the page.
+        """
+        batch_size = limit * 2
+        items = []
+        offset = 0
+        for _ in range(max_batches):
+            hits = self.search(text, kinds=kinds, limit=batch_size, offset=offset)
+            offset += len(hits)
+            items += keep(hits)
+            if len(items) >= limit or len(hits) < batch_size:
+                break
+        return items[:limit]
+
+
+search_index = SearchIndex()
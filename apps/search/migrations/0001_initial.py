@@ -0,0 +1,62 @@
+# Generated by Django 4.2 on 2026-10-17
+
+from django.db import migrations
+
+# Frozen copy of apps.search.index at the time of this migration: the
+# migration must keep running the same SQL whatever the runtime index becomes.
+CREATE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+    "name, body, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+DROP_SQL = 'DROP TABLE IF EXISTS search_index'
+INSERT_SQL = 'INSERT INTO search_index(rowid, name, body) VALUES (%s, %s, %s)'
+KINDS = {'restaurant': 1, 'supermarche': 2, 'produit': 3}
+BATCH_SIZE = 2000
+
+
+def document(kind, obj):
+    if kind == 'produit':
+        return obj.name, ' '.join(filter(None, [obj.description, obj.category]))
+    if not obj.is_active:
+        return None
+    parts = [obj.description, obj.full_address]
+    if kind == 'restaurant':
+        labels = dict(obj._meta.get_field('cuisine_type').flatchoices)
+        parts.append(str(labels.get(obj.cuisine_type, obj.cuisine_type)))
+    return obj.commercial_name, ' '.join(filter(None, parts))
+
+
+def build_index(apps, schema_editor):
+    models = {
+        'restaurant': apps.get_model('restaurants', 'Restaurant'),
+        'supermarche': apps.get_model('supermarches', 'Supermarche'),
+        'produit': apps.get_model('products', 'Produit'),
+    }
+    alias = schema_editor.connection.alias
+    with schema_editor.connection.cursor() as cursor:
+        for kind, model in models.items():
+            rows = []
+            for obj in model._default_manager.using(alias).iterator(chunk_size=BATCH_SIZE):
+                doc = document(kind, obj)
+                if doc is not None:
+                    rows.append((obj.pk * 4 + KINDS[kind], *doc))
+                if len(rows) >= BATCH_SIZE:
+                    cursor.executemany(INSERT_SQL, rows)
+                    rows = []
+            if rows:
+                cursor.executemany(INSERT_SQL, rows)
+        cursor.execute("INSERT INTO search_index(search_index) VALUES ('optimize')")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0004_alter_restaurant_latitude_alter_restaurant_longitude'),
+        ('supermarches', '0001_initial'),
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SQL, DROP_SQL),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+from rest_framework import serializers
+
+from apps.products.models import Produit
+from apps.restaurants.models import Restaurant
+from apps.search.index import KINDS
+from apps.supermarches.models import Supermarche
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200, trim_whitespace=True)
+    types = serializers.MultipleChoiceField(choices=list(KINDS), required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+    def to_internal_value(self, data):
+        # ?types=restaurant,produit as well as repeated ?types=
+        if hasattr(data, 'getlist'):
+            types = [kind for value in data.getlist('types') for kind in value.split(',') if kind]
+            data = {key: data.get(key) for key in data}
+            if types:
+                data['types'] = types
+        return super().to_internal_value(data)
+
+
+class RestaurantHitSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Restaurant
+        fields = [
+            'id', 'commercial_name', 'cuisine_type', 'logo', 'average_rating',
+            'price_level', 'is_open', 'base_delivery_fee'
+        ]
+
+
+class SupermarcheHitSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Supermarche
+        fields = ['id', 'commercial_name', 'logo', 'average_rating', 'is_open', 'base_delivery_fee']
+
+
+class ProduitHitSerializer(serializers.ModelSerializer):
+    restaurant_name = serializers.CharField(source='restaurant.commercial_name', default=None)
+    supermarche_name = serializers.CharField(source='supermarche.commercial_name', default=None)
+
+    class Meta:
+        model = Produit
+        fields = [
+            'id', 'name', 'price', 'discounted_price', 'image', 'category', 'available',
+            'restaurant', 'restaurant_name', 'supermarche', 'supermarche_name'
+        ]
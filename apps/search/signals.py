@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.products.models import Produit
+from apps.restaurants.models import Restaurant
+from apps.search.index import search_index
+from apps.supermarches.models import Supermarche
+
+KIND_BY_MODEL = {Restaurant: 'restaurant', Supermarche: 'supermarche', Produit: 'produit'}
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_save, sender=Supermarche)
+@receiver(post_save, sender=Produit)
+def indexed_object_saved(sender, instance, **kwargs):
+    search_index.update(KIND_BY_MODEL[sender], instance)
+
+
+@receiver(post_delete, sender=Restaurant)
+@receiver(post_delete, sender=Supermarche)
+@receiver(post_delete, sender=Produit)
+def indexed_object_deleted(sender, instance, **kwargs):
+    search_index.remove(KIND_BY_MODEL[sender], instance.pk)
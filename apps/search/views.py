@@ -0,0 +1,73 @@
+import logging
+from django.db.models import Q
+from rest_framework import status
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from apps.products.models import Produit
+from apps.restaurants.models import Restaurant
+from apps.search.index import search_index
+from apps.search.serializers import (
+    ProduitHitSerializer, RestaurantHitSerializer, SearchQuerySerializer, SupermarcheHitSerializer
+)
+from apps.supermarches.models import Supermarche
+
+logger = logging.getLogger(__name__)
+
+# kind -> (visible objects, hit serializer)
+SOURCES = {
+    'restaurant': (
+        lambda: Restaurant.objects.filter(is_active=True, user__is_approved=True),
+        RestaurantHitSerializer,
+    ),
+    'supermarche': (
+        lambda: Supermarche.objects.filter(is_active=True, user__is_approved=True),
+        SupermarcheHitSerializer,
+    ),
+    'produit': (
+        lambda: Produit.objects.filter(available=True).filter(
+            Q(restaurant__is_active=True, restaurant__user__is_approved=True) |
+            Q(supermarche__is_active=True, supermarche__user__is_approved=True)
+        ).select_related('restaurant', 'supermarche'),
+        ProduitHitSerializer,
+    ),
+}
+
+
+def load_hits(hits, context=None):
+    """Serialized objects of (kind, object_id, rank) hits, in rank order, skipping hidden ones"""
+    ids_by_kind = {}
+    for kind, object_id, _ in hits:
+        ids_by_kind.setdefault(kind, []).append(object_id)
+
+    data = {}
+    for kind, ids in ids_by_kind.items():
+        queryset, serializer_class = SOURCES[kind]
+        for obj in queryset().filter(id__in=ids):
+            data[kind, obj.id] = serializer_class(obj, context=context).data
+
+    results = []
+    for kind, object_id, rank in hits:
+        item = data.get((kind, object_id))
+        if item is not None:
+            results.append({'type': kind, 'score': round(-rank, 6), **item})
+    return results
+
+
+class SearchView(APIView):
+    """Full-text search over restaurants, supermarkets and products, best match first"""
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        serializer = SearchQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        query = serializer.validated_data['q']
+        limit = serializer.validated_data['limit']
+
+        results = search_index.search_filtered(
+            query, lambda hits: load_hits(hits, context={'request': request}),
+            kinds=serializer.validated_data.get('types'), limit=limit
+        )
+        logger.debug(f"[SEARCH] '{query}': {len(results)} visible results")
+        return Response({'query': query, 'count': len(results), 'results': results})
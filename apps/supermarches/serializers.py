@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from rest_framework_gis.serializers import GeoFeatureModelSerializer
+from apps.geolocation.serializers import DistanceFieldMixin, DistanceListSerializer
 from apps.supermarches.models import Supermarche, CategorieSupermarche
 from apps.users.serializers import UserSerializer
 
@@ -8,7 +9,7 @@ class CategorieSupermarceSerializer(serializers.ModelSerializer):
         model = CategorieSupermarche
         fields = ['id', 'name', 'slug', 'icon', 'color']
 
-class SupermarcheListSerializer(GeoFeatureModelSerializer):
+class SupermarcheListSerializer(DistanceFieldMixin, GeoFeatureModelSerializer):
     distance_km = serializers.SerializerMethodField()
     
     class Meta:
@@ -18,17 +19,7 @@ class SupermarcheListSerializer(GeoFeatureModelSerializer):
             'id', 'commercial_name', 'logo', 'average_rating', 'review_count',
             'base_delivery_fee', 'product_count', 'is_open', 'distance_km'
         ]
-    
-    def get_distance_km(self, obj):
-        request = self.context.get('request')
-        if request and hasattr(request, 'user_location'):
-            from geopy.distance import geodesic
-            dist = geodesic(
-                request.user_location,
-                (float(obj.latitude), float(obj.longitude))
-            ).kilometers
-            return round(dist, 2)
-        return None
+        list_serializer_class = DistanceListSerializer
 
 class SupermarcheDetailSerializer(GeoFeatureModelSerializer):
     user = UserSerializer(read_only=True)
@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_init
 from celery.schedules import crontab
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.development')
@@ -8,6 +9,16 @@ app = Celery('quickdeliver')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
+
+@worker_init.connect
+def run_system_checks(**kwargs):
+    """A worker must not start on an incomplete deployment (e.g. no road graph in production)"""
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command('check')
+
 app.conf.beat_schedule = {
     'check-document-expiry': {
         'task': 'apps.verification.tasks.check_documents_expiring_soon',
@@ -17,4 +28,24 @@ app.conf.beat_schedule = {
         'task': 'apps.verification.tasks.suspend_accounts_with_expired_docs',
         'schedule': crontab(hour=1, minute=0),
     },
+    'rollover-statistiques-livreurs': {
+        'task': 'apps.livreurs.tasks.rollover_statistiques',
+        'schedule': crontab(hour=0, minute=0),
+    },
+    'dispatch-commandes': {
+        'task': 'apps.livreurs.tasks.dispatch_commandes',
+        'schedule': 15.0,  # DISPATCH_INTERVAL_SECONDS
+    },
+    'relay-order-events': {
+        'task': 'apps.orders.tasks.relay_order_events',
+        'schedule': 2.0,  # OUTBOX_RELAY_SECONDS
+    },
+    'purge-order-events': {
+        'task': 'apps.orders.tasks.purge_order_events',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'purge-idempotency-keys': {
+        'task': 'apps.core.tasks.purge_idempotency_keys',
+        'schedule': crontab(hour=3, minute=30),
+    },
 }
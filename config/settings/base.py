@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'apps.notifications',
     'apps.core',
     'apps.payments',
+    'apps.search',
 ]
 
 MIDDLEWARE = [
@@ -206,3 +207,85 @@ CAMPAY_ENVIRONMENT = config('CAMPAY_ENVIRONMENT', default='PROD')
 # Minimum amounts for Campay transactions (in XAF)
 CAMPAY_MIN_COLLECT_AMOUNT = 100  # Minimum for collection
 CAMPAY_MIN_WITHDRAW_AMOUNT = 100  # Minimum for withdrawal
+
+# Courier pickup index (apps.livreurs.spatial_index)
+PICKUP_INDEX_CELL_SIZE_DEG = 0.01  # ~1.1 km grid cells
+PICKUP_INDEX_REFRESH_SECONDS = config('PICKUP_INDEX_REFRESH_SECONDS', default=10, cast=int)
+
+# Courier push feed (apps.livreurs.feed): 'local' or 'redis'
+COURIER_FEED_BROKER = config('COURIER_FEED_BROKER', default='local')
+COURIER_FEED_REDIS_URL = config('COURIER_FEED_REDIS_URL', default=CELERY_BROKER_URL)
+COURIER_FEED_HEARTBEAT_SECONDS = 15
+COURIER_FEED_MAX_DURATION_SECONDS = 300
+# SSE streams hold a worker thread under WSGI: serve them from the ASGI app only
+COURIER_FEED_WSGI_STREAMS = config('COURIER_FEED_WSGI_STREAMS', default=False, cast=bool)
+
+# Courier GPS ingestion (apps.livreurs.positions): 'local' or 'redis'
+COURIER_POSITION_BUFFER = config('COURIER_POSITION_BUFFER', default='local')
+COURIER_POSITION_REDIS_URL = config('COURIER_POSITION_REDIS_URL', default=CELERY_BROKER_URL)
+COURIER_POSITION_FLUSH_SECONDS = 2
+
+# Restaurant dashboard (apps.restaurants.stats)
+RESTAURANT_STATS_CACHE_SECONDS = config('RESTAURANT_STATS_CACHE_SECONDS', default=60, cast=int)
+
+# Geocoding (apps.geolocation.geocoding)
+GEOCODING_LRU_SIZE = 2048
+GEOCODING_REVERSE_PRECISION = 4  # ~11 m cache cells for reverse geocoding
+GEOCODING_NEGATIVE_TTL_HOURS = 24
+GEOCODING_BATCH_REMOTE_LIMIT = 5  # Nominatim calls per verifier_zones request; other misses are deferred
+GEOCODING_TIMEOUT_SECONDS = config('GEOCODING_TIMEOUT_SECONDS', default=5, cast=int)
+
+# Delivery zone index (apps.geolocation.zone_index)
+ZONE_INDEX_CELL_SIZE_DEG = 0.05  # ~5.5 km grid cells
+ZONE_INDEX_REFRESH_SECONDS = config('ZONE_INDEX_REFRESH_SECONDS', default=300, cast=int)
+
+# Offline road routing (apps.geolocation.routing), graph built by build_routing_graph
+ROUTING_GRAPH_FILE = config('ROUTING_GRAPH_FILE', default=str(BASE_DIR / 'yaounde_roads.npz'))
+ROUTING_MAX_SNAP_KM = 1.0
+# Missing graph: system check error (apps.geolocation.checks) instead of a warning
+ROUTING_REQUIRE_GRAPH = config('ROUTING_REQUIRE_GRAPH', default=False, cast=bool)
+ROUTING_CACHE_SIZE = 10000
+
+# Delivery GPS traces (apps.livreurs.traces)
+TRACE_MAX_POINTS = 1000  # per open trace; ~24 KB of packed points
+TRACE_MIN_MOVE_M = 5
+TRACE_MAX_SPEED_KMH = 120
+TRACE_COMPACT_TOLERANCE_M = 5
+TRACE_SIMPLIFY_TOLERANCE_M = 10
+
+# Batch dispatch (apps.livreurs.dispatch): 'off', 'offer' or 'assign'
+# 'offer' requires COURIER_FEED_BROKER='redis' and a shared cache (apps.livreurs.checks)
+DISPATCH_MODE = config('DISPATCH_MODE', default='off')
+DISPATCH_INTERVAL_SECONDS = 15  # beat schedule in celeryconfig.py
+DISPATCH_OFFER_SECONDS = 30
+
+# Multi-order stacking (apps.livreurs.stacking)
+STACKING_MAX_ORDERS = 3
+STACKING_WINDOW_MINUTES = 10
+STACKING_MAX_BEARING_DEG = 45
+STACKING_MAX_DETOUR_KM = 2.0
+
+# Nearby merchant lookups (apps.geolocation.nearby)
+NEARBY_DEFAULT_LIMIT = 50
+NEARBY_MAX_LIMIT = 200
+
+# Full-text search (apps.search.index)
+SEARCH_NAME_WEIGHT = 10.0  # BM25 weight of a name match relative to the body
+SEARCH_MAX_RESULTS = 50  # restaurant search endpoint
+
+# Versioned menu cache (apps.products.catalog)
+MENU_CACHE_SECONDS = 600
+
+# Order event outbox (apps.orders.outbox)
+OUTBOX_RELAY_SECONDS = 2  # beat schedule in celeryconfig.py
+OUTBOX_BATCH_SIZE = 500
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_LOCK_SECONDS = 60
+OUTBOX_RETENTION_DAYS = 7
+
+# Idempotency-Key handling (apps.core.idempotency): 'db', 'redis' or 'local'
+IDEMPOTENCY_STORE = config('IDEMPOTENCY_STORE', default='db')
+IDEMPOTENCY_REDIS_URL = config('IDEMPOTENCY_REDIS_URL', default=CELERY_BROKER_URL)
+IDEMPOTENCY_TTL_SECONDS = 86400  # stored answers
+IDEMPOTENCY_LOCK_SECONDS = 300  # in-flight lease; covers a blocking CamPay collect
+IDEMPOTENCY_WAIT_SECONDS = 15  # a retry waits this long for the first answer, then gets a 409
@@ -3,6 +3,7 @@ from .base import *
 DEBUG = True
 ALLOWED_HOSTS = ['*']
 SECRET_KEY = 'django-insecure-development-key-change-in-production'
+COURIER_FEED_WSGI_STREAMS = True  # runserver is WSGI
 
 DATABASES = {
     'default': {
@@ -3,6 +3,7 @@ from .base import *
 DEBUG = False
 ALLOWED_HOSTS = config('ALLOWED_HOSTS', cast=Csv())
 SECRET_KEY = config('SECRET_KEY')
+ROUTING_REQUIRE_GRAPH = True
 
 DATABASES = {
     'default': {
@@ -20,6 +20,7 @@ urlpatterns = [
     path('api/livreurs/', include('apps.livreurs.urls')),
     path('api/notifications/', include('apps.notifications.urls')),
     path('api/payments/', include('apps.payments.urls')),
+    path('api/search/', include('apps.search.urls')),
 ]
 
 if settings.DEBUG:
@@ -59,8 +59,12 @@ const OrderDetailScreen: React.FC<Props> = ({ route }) => {
     try {
       setLoading(true)
       setError(null)
-      const orders = await restaurantService.getOrders()
-      const target = orders.find((o: any) => String(o?.id) === String(id) || String(o?.numero) === String(id))
+      // Order history is paginated: fetch numeric ids directly, look up numeros in the latest page
+      const target = /^\d+$/.test(String(id))
+        ? await restaurantService.getOrder(String(id)).catch(() => null)
+        : (await restaurantService.getOrders({ page_size: 100 })).find(
+            (o: any) => String(o?.numero) === String(id)
+          )
       if (!target) {
         setError("Commande introuvable.")
         setOrder(null)
@@ -177,8 +177,33 @@ export const restaurantService = {
     return response.data
   },
 
-  async getOrders(): Promise<RestaurantOrder[]> {
-    const response = await api.get<RestaurantOrder[]>(ENDPOINTS.RESTAURANTS_ORDERS)
+  async getOrders(params?: {
+    cursor?: string
+    status?: string
+    date_from?: string
+    date_to?: string
+    page_size?: number
+  }): Promise<RestaurantOrder[]> {
+    const page = await restaurantService.getOrdersPage(params)
+    return page.results
+  },
+
+  async getOrdersPage(params?: {
+    cursor?: string
+    status?: string
+    date_from?: string
+    date_to?: string
+    page_size?: number
+  }): Promise<{ results: RestaurantOrder[]; next_cursor: string | null }> {
+    const response = await api.get<{ results: RestaurantOrder[]; next_cursor: string | null }>(
+      ENDPOINTS.RESTAURANTS_ORDERS,
+      { params }
+    )
+    return response.data
+  },
+
+  async getOrder(id: string): Promise<RestaurantOrder> {
+    const response = await api.get<RestaurantOrder>(ENDPOINTS.ORDERS_DETAIL(id))
     return response.data
   },
 